@@ -1,31 +1,17 @@
 from flask import Flask
 from dotenv import load_dotenv
 import os
+import time
 
 load_dotenv()
 from flask_cors import CORS
 from flask_mail import Mail
-from application.database import db
-from celery import Celery
+from application.database import db, migrate
+from application import pool, metrics, querycheck, dashboard
 import application.config as config
 
-def make_celery(app):
-    celery = Celery(
-        app.import_name,
-        backend=app.config['CELERY_RESULT_BACKEND'],
-        broker=app.config['CELERY_BROKER_URL']
-    )
-    celery.conf.update(app.config)
-
-    class ContextTask(celery.Task):
-        def __call__(self, *args, **kwargs):
-            with app.app_context():
-                return self.run(*args, **kwargs)
-
-    celery.Task = ContextTask
-    return celery
-
 def create_app():
+    started = time.perf_counter()
     app = Flask(__name__)
     
     # Database configuration - use PostgreSQL on Render, SQLite locally
@@ -39,8 +25,8 @@ def create_app():
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hms.db'
     
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['CELERY_BROKER_URL'] = config.CELERY_BROKER_URL
-    app.config['CELERY_RESULT_BACKEND'] = config.CELERY_RESULT_BACKEND
+    # Pool sizing, recycling and timeouts for this process's role (web or worker)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = pool.engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
     
     # Flask-Mail configuration
     app.config['MAIL_SERVER'] = config.MAIL_SERVER
@@ -49,9 +35,18 @@ def create_app():
     app.config['MAIL_USERNAME'] = config.MAIL_USERNAME
     app.config['MAIL_PASSWORD'] = config.MAIL_PASSWORD
     app.config['MAIL_DEFAULT_SENDER'] = config.MAIL_DEFAULT_SENDER
+    app.config['MAIL_SUPPRESS_SEND'] = config.MAIL_SUPPRESS_SEND
+    app.config['MAIL_MAX_EMAILS'] = config.MAIL_MAX_EMAILS
 
-    CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True, allow_headers=["Content-Type", "Authorization"], methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
+    CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True, allow_headers=["Content-Type", "Authorization"], expose_headers=["X-Next-Cursor", "Content-Disposition", "Server-Timing"], methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
     db.init_app(app)
+    migrate.init_app(app, db)
+    with app.app_context():
+        pool.init_pool(db.engine)
+        dashboard.init_invalidation(db.engine)
+        # Before init_auth, so request timings include authentication
+        metrics.init_metrics(app, db.engine)
+    querycheck.init_query_check(app)
     
     # Initialize Flask-Mail
     mail = Mail(app)
@@ -60,20 +55,16 @@ def create_app():
     import application.tasks as tasks
     tasks.init_mail(app)
 
-    celery = make_celery(app)
+    # `celery -A app.celery` runs the tasks' own Celery app: its AppContextTask
+    # shares one app context per worker process and it carries the beat schedule
+    celery = tasks.celery
 
-    with app.app_context():
-        # Import models to ensure they are registered
-        from application.models import User, Doctor, Patient, Appointment, Treatment
-        db.create_all()
+    # Import models to ensure they are registered; the schema itself is
+    # managed by migrations (`flask --app app init-db`), not at import time
+    import application.models
 
-        # Create admin user if not exists
-        if not User.query.filter_by(role='admin').first():
-            admin = User(username='admin', role='admin', email='admin@hms.com')
-            admin.set_password('admin123')
-            db.session.add(admin)
-            db.session.commit()
-            print("Admin user created.")
+    from application.commands import register_commands
+    register_commands(app)
 
     # Register Blueprints
     from application.routes.auth import auth_bp
@@ -86,6 +77,15 @@ def create_app():
     app.register_blueprint(doctor_bp, url_prefix='/doctor')
     app.register_blueprint(patient_bp, url_prefix='/patient')
 
+    from application.events import init_events
+    init_events(app)
+
+    from application.auth_dacorator import init_auth
+    init_auth(app)
+
+    from application.worker import record_app_build
+    record_app_build(time.perf_counter() - started)
+
     return app, celery
 
 app, celery = create_app()
@@ -0,0 +1,176 @@
+"""Hot/cold storage of appointment history.
+
+Finished appointments (anything but 'Booked') older than ARCHIVE_AFTER_DAYS
+are moved with their treatments from `appointment`/`treatment` into
+`appointment_archive`/`treatment_archive`, in batches. The hot tables and
+their indexes then cover only recent history, whatever the age of the
+system. On PostgreSQL the appointment archive is partitioned by year and a
+partition is created the first time a year is archived.
+
+Reads that need all of a patient's history (history views, treatment
+exports, bulk export) select from both with a UNION ALL.
+"""
+import re
+from datetime import date, timedelta
+from sqlalchemy import select, insert, delete, func, literal, text, union_all
+from application.models import Appointment, Treatment, AppointmentArchive, TreatmentArchive, Doctor, Patient
+from application.database import db
+import application.config as config
+
+APPOINTMENT_COLUMNS = ('id', 'date', 'doctor_id', 'patient_id', 'time', 'status', 'reason')
+TREATMENT_COLUMNS = ('id', 'appointment_id', 'diagnosis', 'prescription', 'notes')
+
+PARTITION_NAME = re.compile(r'^appointment_archive_y\d{4}$')
+
+
+def is_partition(name):
+    """True for the per-year partitions, which are created at run time rather than by migrations"""
+    return bool(name and PARTITION_NAME.match(name))
+
+
+def archive_cutoff(today=None):
+    return (today or date.today()) - timedelta(days=config.ARCHIVE_AFTER_DAYS)
+
+
+def _ensure_partitions(first, last):
+    """Create the yearly archive partitions covering first..last (PostgreSQL only)"""
+    if db.session.connection().dialect.name != 'postgresql':
+        return
+    for year in range(first.year, last.year + 1):
+        db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS appointment_archive_y{year} PARTITION OF appointment_archive "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+        ))
+
+
+def _move(ids):
+    """Copy one batch of appointments and their treatments into the archive, then delete them"""
+    first, last = db.session.execute(
+        select(func.min(Appointment.date), func.max(Appointment.date)).where(Appointment.id.in_(ids))
+    ).one()
+    _ensure_partitions(first, last)
+    db.session.execute(insert(AppointmentArchive).from_select(
+        APPOINTMENT_COLUMNS,
+        select(*[getattr(Appointment, c) for c in APPOINTMENT_COLUMNS]).where(Appointment.id.in_(ids))
+    ))
+    db.session.execute(insert(TreatmentArchive).from_select(
+        TREATMENT_COLUMNS,
+        select(*[getattr(Treatment, c) for c in TREATMENT_COLUMNS]).where(Treatment.appointment_id.in_(ids))
+    ))
+    db.session.execute(delete(Treatment).where(Treatment.appointment_id.in_(ids))
+                       .execution_options(synchronize_session=False))
+    db.session.execute(delete(Appointment).where(Appointment.id.in_(ids))
+                       .execution_options(synchronize_session=False))
+
+
+def archive_appointments(batch_size=None, today=None, progress=None):
+    """Move finished appointments older than the cutoff to the archive; returns how many.
+
+    Each batch is copied, deleted and committed in one transaction, so a
+    row is always in exactly one of the two stores.
+    """
+    batch_size = batch_size or config.ARCHIVE_BATCH_SIZE
+    cutoff = archive_cutoff(today)
+    moved = 0
+    while True:
+        ids = db.session.execute(
+            select(Appointment.id)
+            .where(Appointment.date < cutoff, Appointment.status != 'Booked')
+            .order_by(Appointment.date)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return moved
+        _move(ids)
+        db.session.commit()
+        moved += len(ids)
+        if progress:
+            progress(moved)
+
+
+def storage_stats():
+    """Row counts of the hot and cold stores"""
+    def count(model):
+        return db.session.execute(select(func.count()).select_from(model)).scalar()
+    return {
+        'hot': {'appointments': count(Appointment), 'treatments': count(Treatment)},
+        'cold': {'appointments': count(AppointmentArchive), 'treatments': count(TreatmentArchive)},
+        'cutoff': str(archive_cutoff()),
+    }
+
+
+def treatment_history(patient_id):
+    """Completed appointments with a treatment, hot and archived, oldest first.
+
+    Rows have date, doctor, diagnosis, prescription, notes, treatment id,
+    appointment id and whether the record is archived (read-only).
+    """
+    def part(appointment, treatment, archived):
+        return (
+            select(appointment.date, appointment.time, func.coalesce(Doctor.name, 'N/A').label('doctor'),
+                   treatment.diagnosis, treatment.prescription, treatment.notes,
+                   treatment.id.label('treatment_id'), appointment.id.label('appointment_id'),
+                   literal(archived).label('archived'))
+            .select_from(treatment)
+            .join(appointment, appointment.id == treatment.appointment_id)
+            .outerjoin(Doctor, Doctor.id == appointment.doctor_id)
+            .where(appointment.patient_id == patient_id, appointment.status == 'Completed')
+        )
+
+    history = union_all(part(AppointmentArchive, TreatmentArchive, True),
+                        part(Appointment, Treatment, False)).subquery()
+    return db.session.execute(
+        select(history).order_by(history.c.date, history.c.time, history.c.treatment_id)
+    ).all()
+
+
+def treatment_rows(patient_id=None):
+    """Every treatment as export rows (see exports.EXPORT_HEADER), hot and archived"""
+    def part(appointment, treatment):
+        stmt = (
+            select(
+                Patient.id.label('patient_id'),
+                Patient.name.label('patient_name'),
+                func.coalesce(Doctor.name, 'N/A').label('doctor_name'),
+                appointment.date.label('date'),
+                appointment.time.label('time'),
+                func.coalesce(treatment.diagnosis, '').label('diagnosis'),
+                func.coalesce(treatment.prescription, '').label('prescription'),
+                func.coalesce(treatment.notes, '').label('notes'),
+                treatment.id.label('treatment_id'),
+            )
+            .select_from(treatment)
+            .join(appointment, appointment.id == treatment.appointment_id)
+            .join(Patient, Patient.id == appointment.patient_id)
+            .outerjoin(Doctor, Doctor.id == appointment.doctor_id)
+        )
+        if patient_id is not None:
+            stmt = stmt.where(appointment.patient_id == patient_id)
+        return stmt
+
+    rows = union_all(part(AppointmentArchive, TreatmentArchive), part(Appointment, Treatment)).subquery()
+    return (
+        select(*[c for c in rows.c if c.name != 'treatment_id'])
+        .order_by(rows.c.patient_id, rows.c.date, rows.c.time, rows.c.treatment_id)
+    )
+
+
+def appointment_rows():
+    """Every appointment, hot and archived, as bulk export columns ordered by id"""
+    def part(model):
+        return select(model.id, model.doctor_id, model.patient_id, model.date,
+                      model.time, model.status, model.reason)
+    rows = union_all(part(AppointmentArchive), part(Appointment)).subquery()
+    return select(rows).order_by(rows.c.id)
+
+
+def purge(criteria):
+    """Delete archived appointments matching criteria (on AppointmentArchive) and their treatments"""
+    db.session.execute(
+        delete(TreatmentArchive)
+        .where(TreatmentArchive.appointment_id.in_(select(AppointmentArchive.id).where(criteria)))
+        .execution_options(synchronize_session=False)
+    )
+    return db.session.execute(
+        delete(AppointmentArchive).where(criteria).execution_options(synchronize_session=False)
+    ).rowcount
@@ -1,29 +1,223 @@
 from functools import wraps
-from flask import request, jsonify
-#import jwt
+from collections import OrderedDict
+from flask import request, jsonify, g
+import hashlib
+import logging
 import os
+import threading
+import time
+import jwt
+import application.config as config
 
 SECRET_KEY = os.environ.get('secret','This_is_my_secret')
 
-def token_required(f):
-    @wraps(f)
-    def decorator(*args,**kwargs):
-        auth_header = request.headers.get('Authrization')
+logger = logging.getLogger(__name__)
+
+# Endpoints reachable without a token
+# /metrics is checked against METRICS_TOKEN by its own view
+PUBLIC_ENDPOINTS = {'auth.login', 'auth.register', 'auth.verify', 'static', 'metrics'}
+
+# Endpoints that also accept the token as ?token=, since EventSource cannot send headers
+QUERY_TOKEN_ENDPOINTS = {'events'}
+
+# Roles allowed per blueprint; blueprints not listed accept any signed-in user
+BLUEPRINT_ROLES = {
+    'admin': {'admin'},
+    'doctor': {'doctor', 'admin'},
+    'patient': {'patient'},
+}
+
+# Endpoints any signed-in role may use despite their blueprint: the doctor
+# catalog and availability, which the doctor dashboard reads as well
+SHARED_ENDPOINTS = {
+    'patient.get_departments',
+    'patient.get_doctors',
+    'patient.search_doctors',
+    'patient.get_doctors_by_department',
+    'patient.get_doctor_availability',
+    'patient.get_department_availability',
+}
+
+
+class AuthError(Exception):
+    pass
+
+
+class TokenCache:
+    """Bounded LRU of verified tokens, keyed by token hash.
 
-        if not auth_header:
-            return jsonify({'message': 'Token is missing'}),401
+    An entry lives until the token's `exp`, capped at AUTH_CACHE_MAX_AGE so
+    that a revocation missed while Redis is unreachable still takes effect.
+    Entries are dropped per user through `revoke`; a lookup that raced with
+    a revocation is not cached.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()  # key -> (user_id, role, expires_at)
+        self.by_user = {}             # user_id -> set of keys
+        self.lock = threading.Lock()
+        self.generation = 0           # bumped on every revocation
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[2] <= time.time():
+                self.misses += 1
+                if entry is not None:
+                    self._drop(key)
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, user_id, role, exp, generation):
+        expires_at = min(exp, time.time() + config.AUTH_CACHE_MAX_AGE)
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = (user_id, role, expires_at)
+            self.entries.move_to_end(key)
+            self.by_user.setdefault(user_id, set()).add(key)
+            while len(self.entries) > self.size:
+                self._drop(next(iter(self.entries)))
+
+    def revoke(self, user_id):
+        with self.lock:
+            self.generation += 1
+            for key in self.by_user.pop(user_id, set()):
+                self.entries.pop(key, None)
+
+    def _drop(self, key):
+        user_id = self.entries.pop(key)[0]
+        keys = self.by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.by_user[user_id]
+
+
+token_cache = TokenCache(config.AUTH_CACHE_SIZE)
+_subscriber_pid = None
+
+
+def _listen_for_revocations():
+    import redis
+    while True:
         try:
-            token = auth_header.split(' ')[1]
-            payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            request.user_id = payload['user_id']
-            request.user_role = payload['role']
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'message': 'Invalid token'}), 401
+            client = redis.Redis.from_url(config.AUTH_REVOCATION_REDIS_URL, socket_connect_timeout=2)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(config.AUTH_REVOCATION_CHANNEL)
+            for message in pubsub.listen():
+                token_cache.revoke(int(message['data']))
         except Exception as e:
-            return jsonify({'message': 'Token validation failed'}), 401
-        
+            logger.warning("Token revocation channel unavailable: %s", e)
+            time.sleep(30)
+
+
+def _ensure_subscriber():
+    """One revocation listener thread per process, started on first use"""
+    global _subscriber_pid
+    if _subscriber_pid != os.getpid():
+        _subscriber_pid = os.getpid()
+        threading.Thread(target=_listen_for_revocations, daemon=True,
+                         name='auth-revocations').start()
+
+
+def revoke_user_tokens(user_id):
+    """Drop cached tokens of a user here and, through Redis, in every other process"""
+    token_cache.revoke(user_id)
+    try:
+        import redis
+        redis.Redis.from_url(config.AUTH_REVOCATION_REDIS_URL, socket_connect_timeout=2).publish(
+            config.AUTH_REVOCATION_CHANNEL, user_id)
+    except Exception as e:
+        logger.warning("Could not publish token revocation for user %s: %s", user_id, e)
+
+
+def verify_token(token):
+    """Return (user_id, role) for a valid token of an allowed user, else raise AuthError.
+
+    Cache hits cost a hash and a dict lookup; misses pay the HMAC check and
+    one User lookup, then are cached.
+    """
+    _ensure_subscriber()
+    key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    entry = token_cache.get(key)
+    if entry is not None:
+        return entry[0], entry[1]
+    generation = token_cache.generation
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        raise AuthError('Token has expired')
+    except jwt.InvalidTokenError:
+        raise AuthError('Invalid token')
+
+    from application.models import User
+    from application.database import db
+    user = db.session.get(User, payload['user_id'])
+    if user is None or user.is_blacklisted or not user.active:
+        raise AuthError('Account is not allowed to sign in')
+
+    token_cache.put(key, user.id, payload['role'], payload['exp'], generation)
+    return user.id, payload['role']
+
+
+def authenticate():
+    """Verify the bearer token and set request.user_id / request.user_role.
+
+    Returns an error response, or None when the request may proceed.
+    """
+    auth_header = request.headers.get('Authorization')
+    if not auth_header and request.endpoint in QUERY_TOKEN_ENDPOINTS and request.args.get('token'):
+        auth_header = f"Bearer {request.args['token']}"
+
+    if not auth_header:
+        return jsonify({'message': 'Token is missing'}),401
+    try:
+        token = auth_header.split(' ')[1]
+        request.user_id, request.user_role = verify_token(token)
+    except AuthError as e:
+        return jsonify({'message': str(e)}), 401
+    except Exception as e:
+        return jsonify({'message': 'Token validation failed'}), 401
+    return None
+
+
+def init_auth(app):
+    """Require a valid token on every blueprint route except PUBLIC_ENDPOINTS"""
+
+    @app.before_request
+    def require_token():
+        if request.method == 'OPTIONS' or request.endpoint in PUBLIC_ENDPOINTS or request.endpoint is None:
+            return None
+        started = time.perf_counter()
+        error = authenticate()
+        g.auth_ms = (time.perf_counter() - started) * 1000
+        if error:
+            return error
+        allowed = BLUEPRINT_ROLES.get(request.blueprint)
+        if allowed and request.user_role not in allowed and request.endpoint not in SHARED_ENDPOINTS:
+            return jsonify({'message': 'Insufficient permissions'}), 403
+        return None
+
+    @app.after_request
+    def report_auth_time(response):
+        if 'auth_ms' in g:
+            response.headers.add('Server-Timing', f"auth;dur={g.auth_ms:.3f}")
+        return response
+
+
+def token_required(f):
+    @wraps(f)
+    def decorator(*args,**kwargs):
+        error = authenticate()
+        if error:
+            return error
         return f(*args, **kwargs)
     return decorator
 
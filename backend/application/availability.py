@@ -0,0 +1,81 @@
+from flask import request
+from datetime import date, datetime, timedelta
+from sqlalchemy import select
+from application.models import Availability
+from application import schedule
+from application.database import db
+import application.config as config
+
+# Columns returned for each slot, in response order
+SLOT_COLUMNS = ('id', 'date', 'start_time', 'end_time', 'is_booked')
+
+
+class InvalidWindow(ValueError):
+    pass
+
+
+def _parse_date(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise InvalidWindow(f'Invalid {name} date: {value}')
+
+
+def get_window():
+    """(from, to, only_free) from the query string.
+
+    `from` defaults to today and `to` to AVAILABILITY_DEFAULT_DAYS later;
+    windows longer than AVAILABILITY_MAX_DAYS are rejected.
+    """
+    start = _parse_date('from', date.today())
+    end = _parse_date('to', start + timedelta(days=config.AVAILABILITY_DEFAULT_DAYS - 1))
+    if end < start:
+        raise InvalidWindow('to must not be before from')
+    if (end - start).days + 1 > config.AVAILABILITY_MAX_DAYS:
+        raise InvalidWindow(f'Window is limited to {config.AVAILABILITY_MAX_DAYS} days')
+    only_free = request.args.get('only_free', '0').lower() in ('1', 'true')
+    return start, end, only_free
+
+
+def _columnar(rows, names):
+    """Parallel arrays, one per column, instead of a dict per row"""
+    columns = {name: [] for name in names}
+    for row in rows:
+        for name, value in zip(names, row):
+            columns[name].append(value if isinstance(value, (int, bool)) or value is None else str(value))
+    return columns
+
+
+def _slots(doctor_ids, start, end, only_free):
+    """Stored and scheduled slots as (doctor_id, id, date, start_time, end_time, is_booked).
+
+    Scheduled slots have no id until they are booked or materialized; a
+    stored row for the same time replaces the scheduled one.
+    """
+    rows = [tuple(row) for row in db.session.execute(
+        select(Availability.doctor_id, *[getattr(Availability, c) for c in SLOT_COLUMNS])
+        .where(Availability.doctor_id.in_(doctor_ids), Availability.date.between(start, end))
+    )]
+    stored = {(row[0], row[2], row[3]) for row in rows}
+    rows.extend(
+        (doctor_id, None, day, slot_start, slot_end, False)
+        for doctor_id, day, slot_start, slot_end in schedule.expand(doctor_ids, start, end)
+        if (doctor_id, day, slot_start) not in stored
+    )
+    if only_free:
+        rows = [row for row in rows if not row[5]]
+    rows.sort(key=lambda row: (row[0], row[2], row[3]))
+    return rows
+
+
+def doctor_slots(doctor_id, start, end, only_free=False):
+    """One doctor's slots in the window; stored rows come from ix_availability_doctor_date_start"""
+    return _columnar((row[1:] for row in _slots([doctor_id], start, end, only_free)), SLOT_COLUMNS)
+
+
+def department_slots(doctor_ids, start, end, only_free=False):
+    """Slots of several doctors (a department) at once, ordered by doctor"""
+    return _columnar(_slots(doctor_ids, start, end, only_free), ('doctor_id',) + SLOT_COLUMNS)
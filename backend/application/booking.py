@@ -0,0 +1,86 @@
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from application.models import Appointment, Availability
+from application.database import db
+from application import schedule
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+def _claim(*criteria):
+    """Flip one free Availability row to booked with a single conditional UPDATE.
+
+    Returns (doctor_id, date, start_time) of the claimed slot, or None when no
+    free row matched. Concurrent claimers race on the row itself, so at most
+    one of them sees it as free.
+    """
+    stmt = (
+        update(Availability)
+        .where(*criteria, Availability.is_booked == False)
+        .values(is_booked=True)
+        .execution_options(synchronize_session=False)
+    )
+    if db.engine.dialect.update_returning:
+        row = db.session.execute(
+            stmt.returning(Availability.doctor_id, Availability.date, Availability.start_time)
+        ).first()
+        return tuple(row) if row else None
+
+    if db.session.execute(stmt).rowcount != 1:
+        return None
+    slot = Availability.query.filter(*criteria).first()
+    return slot.doctor_id, slot.date, slot.start_time
+
+
+def _create_appointment(doctor_id, patient_id, date, time, reason):
+    appointment = Appointment(
+        doctor_id=doctor_id,
+        patient_id=patient_id,
+        date=date,
+        time=time,
+        reason=reason
+    )
+    db.session.add(appointment)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # uq_appointment_live_slot: someone else holds a live booking for this time
+        db.session.rollback()
+        raise SlotUnavailable('Slot already booked')
+    return appointment
+
+
+def book_slot(slot_id, patient_id, reason=''):
+    """Book an Availability slot by id; raises SlotUnavailable if it is taken"""
+    claimed = _claim(Availability.id == slot_id)
+    if not claimed:
+        db.session.rollback()
+        raise SlotUnavailable('Slot already booked')
+    doctor_id, date, time = claimed
+    return _create_appointment(doctor_id, patient_id, date, time, reason)
+
+
+def book_time(doctor_id, patient_id, date, time, reason=''):
+    """Book a doctor at a date and time.
+
+    If the doctor published a slot for that time it is claimed atomically.
+    A slot that only exists in the doctor's weekly schedule is stored now,
+    already booked. Either way the unique live-appointment index is what
+    finally prevents a double booking.
+    """
+    slot_criteria = (
+        Availability.doctor_id == doctor_id,
+        Availability.date == date,
+        Availability.start_time == time,
+    )
+    if not _claim(*slot_criteria):
+        if Availability.query.filter(*slot_criteria).first():
+            db.session.rollback()
+            raise SlotUnavailable('Slot already booked')
+        scheduled = schedule.scheduled_slot(doctor_id, date, time)
+        if scheduled:
+            db.session.add(Availability(doctor_id=doctor_id, date=date, start_time=scheduled[0],
+                                        end_time=scheduled[1], is_booked=True))
+    return _create_appointment(doctor_id, patient_id, date, time, reason)
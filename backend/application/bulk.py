@@ -0,0 +1,296 @@
+"""Bulk import and export of doctors, patients and appointments.
+
+Records are read as a stream of CSV rows or NDJSON lines and processed in
+chunks of BULK_CHUNK_SIZE. Each chunk is validated with a few set-based
+lookups, its passwords are hashed in a process pool, and it is inserted
+with multi-row INSERTs in one transaction. A bad record is reported by its
+row number and skipped; it never aborts the rest of the chunk.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from application.models import User, Doctor, Patient, Appointment
+from application.database import db
+from application import passwords, archive
+from application.maintenance import NO_SHOW
+import application.config as config
+
+# Columns written by export and accepted by import, per kind. Imports of
+# doctors and patients also take `password` or an existing bcrypt `password_hash`.
+FIELDS = {
+    'doctors': ('id', 'username', 'email', 'name', 'specialization', 'department'),
+    'patients': ('id', 'username', 'email', 'name', 'dob', 'contact'),
+    'appointments': ('id', 'doctor_id', 'patient_id', 'date', 'time', 'status', 'reason'),
+}
+
+APPOINTMENT_STATUSES = ('Booked', 'Completed', 'Cancelled', NO_SHOW)
+
+
+class RecordError(ValueError):
+    pass
+
+
+def detect_format(filename=None, content_type=None):
+    """'csv' or 'ndjson' from a file extension or a Content-Type"""
+    if (filename or '').endswith('.csv') or 'csv' in (content_type or ''):
+        return 'csv'
+    return 'ndjson'
+
+
+def read_records(stream, fmt):
+    """Yield (row_number, record or RecordError) from a text stream of CSV or NDJSON"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for number, row in enumerate(reader, start=1):
+            yield number, {k: (v if v != '' else None) for k, v in row.items() if k}
+        return
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('not an object')
+        except ValueError as e:
+            record = RecordError(f'Invalid JSON: {e}')
+        yield number, record
+
+
+def _required(record, *names):
+    missing = [name for name in names if not record.get(name)]
+    if missing:
+        raise RecordError(f"Missing {', '.join(missing)}")
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d').date()
+    except ValueError:
+        raise RecordError(f'Invalid {name}: {value}')
+
+
+def _parse_time(value):
+    for fmt in ('%H:%M', '%H:%M:%S'):
+        try:
+            return datetime.strptime(str(value), fmt).time()
+        except ValueError:
+            pass
+    raise RecordError(f'Invalid time: {value}')
+
+
+def _profile_fields(kind, record):
+    if kind == 'doctors':
+        _required(record, 'name', 'specialization')
+        return {'name': record['name'], 'specialization': record['specialization'],
+                'department': record.get('department')}
+    _required(record, 'name')
+    return {'name': record['name'], 'contact': record.get('contact'),
+            'dob': _parse_date(record['dob'], 'dob') if record.get('dob') else None}
+
+
+def _validate_people(kind, chunk, errors):
+    """Check a chunk of doctor/patient records; returns the valid ones as (row, record, profile)"""
+    usernames = {r.get('username') for _, r in chunk if isinstance(r, dict)}
+    emails = {r.get('email') for _, r in chunk if isinstance(r, dict) and r.get('email')}
+    taken_usernames = set(db.session.execute(
+        select(User.username).where(User.username.in_(usernames))).scalars())
+    taken_emails = set(db.session.execute(
+        select(User.email).where(User.email.in_(emails))).scalars()) if emails else set()
+
+    valid = []
+    for row, record in chunk:
+        try:
+            if isinstance(record, RecordError):
+                raise record
+            _required(record, 'username')
+            if not record.get('password') and not record.get('password_hash'):
+                raise RecordError('Missing password or password_hash')
+            if record.get('password_hash') and not passwords.is_bcrypt_hash(record['password_hash']):
+                raise RecordError('password_hash is not a bcrypt hash')
+            if record['username'] in taken_usernames:
+                raise RecordError(f"Username already exists: {record['username']}")
+            if record.get('email') and record['email'] in taken_emails:
+                raise RecordError(f"Email already exists: {record['email']}")
+            profile = _profile_fields(kind, record)
+        except RecordError as e:
+            errors.append({'row': row, 'message': str(e)})
+            continue
+        taken_usernames.add(record['username'])
+        if record.get('email'):
+            taken_emails.add(record['email'])
+        valid.append((row, record, profile))
+    return valid
+
+
+def _insert_people(kind, valid):
+    role, model = ('doctor', Doctor) if kind == 'doctors' else ('patient', Patient)
+    plain = [record['password'] for _, record, _ in valid if not record.get('password_hash')]
+    hashed = iter(passwords.hash_passwords(plain, rounds=config.BULK_IMPORT_BCRYPT_ROUNDS,
+                                         workers=config.BULK_HASH_WORKERS or None))
+    users = [{
+        'username': record['username'],
+        'email': record.get('email'),
+        'role': role,
+        'password_hash': record.get('password_hash') or next(hashed),
+        'is_blacklisted': False,
+        'active': True,
+    } for _, record, _ in valid]
+    user_ids = db.session.execute(
+        insert(User).returning(User.id, sort_by_parameter_order=True), users
+    ).scalars().all()
+    db.session.execute(insert(model), [
+        dict(profile, user_id=user_id) for (_, _, profile), user_id in zip(valid, user_ids)
+    ])
+
+
+def _parse_id(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RecordError(f'Invalid {name}: {value}')
+
+
+def _validate_appointments(chunk, errors):
+    parsed = []
+    for row, record in chunk:
+        try:
+            if isinstance(record, RecordError):
+                raise record
+            _required(record, 'doctor_id', 'patient_id', 'date', 'time')
+            status = record.get('status') or 'Booked'
+            if status not in APPOINTMENT_STATUSES:
+                raise RecordError(f'Invalid status: {status}')
+            parsed.append((row, record, {
+                'doctor_id': _parse_id(record['doctor_id'], 'doctor_id'),
+                'patient_id': _parse_id(record['patient_id'], 'patient_id'),
+                'date': _parse_date(record['date'], 'date'),
+                'time': _parse_time(record['time']),
+                'status': status,
+                'reason': record.get('reason'),
+            }))
+        except RecordError as e:
+            errors.append({'row': row, 'message': str(e)})
+
+    doctor_ids = {values['doctor_id'] for _, _, values in parsed}
+    patient_ids = {values['patient_id'] for _, _, values in parsed}
+    known_doctors = set(db.session.execute(select(Doctor.id).where(Doctor.id.in_(doctor_ids))).scalars())
+    known_patients = set(db.session.execute(select(Patient.id).where(Patient.id.in_(patient_ids))).scalars())
+    valid = []
+    for entry in parsed:
+        row, _, values = entry
+        if values['doctor_id'] not in known_doctors:
+            errors.append({'row': row, 'message': f"Unknown doctor_id: {values['doctor_id']}"})
+        elif values['patient_id'] not in known_patients:
+            errors.append({'row': row, 'message': f"Unknown patient_id: {values['patient_id']}"})
+        else:
+            valid.append(entry)
+    return valid
+
+
+def _insert_appointments(valid):
+    db.session.execute(insert(Appointment), [values for _, _, values in valid])
+
+
+def _insert(kind, valid):
+    if kind == 'appointments':
+        _insert_appointments(valid)
+    else:
+        _insert_people(kind, valid)
+
+
+def _import_chunk(kind, chunk, errors):
+    if kind == 'appointments':
+        valid = _validate_appointments(chunk, errors)
+    else:
+        valid = _validate_people(kind, chunk, errors)
+    if not valid:
+        return 0
+    try:
+        _insert(kind, valid)
+        db.session.commit()
+        return len(valid)
+    except IntegrityError:
+        # A constraint the validation cannot see (a concurrent insert, a
+        # double booking): retry row by row to find the offenders
+        db.session.rollback()
+    inserted = 0
+    for entry in valid:
+        try:
+            with db.session.begin_nested():
+                _insert(kind, [entry])
+            inserted += 1
+        except IntegrityError as e:
+            errors.append({'row': entry[0], 'message': f'Rejected by the database: {e.orig}'})
+    db.session.commit()
+    return inserted
+
+
+def import_records(kind, records, chunk_size=None, progress=None):
+    """Import (row, record) pairs; returns {'inserted', 'failed', 'errors'}.
+
+    Only the first BULK_MAX_REPORTED_ERRORS errors are listed, but all are
+    counted in 'failed'. `progress` is called with the report after each chunk.
+    """
+    if kind not in FIELDS:
+        raise ValueError(f'Unknown kind: {kind}')
+    chunk_size = chunk_size or config.BULK_CHUNK_SIZE
+    report = {'inserted': 0, 'failed': 0, 'errors': []}
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        errors = []
+        report['inserted'] += _import_chunk(kind, chunk, errors)
+        report['failed'] += len(errors)
+        room = config.BULK_MAX_REPORTED_ERRORS - len(report['errors'])
+        report['errors'].extend(errors[:max(room, 0)])
+        if progress:
+            progress(report)
+
+    if kind == 'doctors' and report['inserted']:
+        from application.cache import catalog_cache
+        catalog_cache.invalidate()
+    return report
+
+
+def export_query(kind):
+    if kind == 'doctors':
+        return (select(Doctor.id, User.username, User.email, Doctor.name, Doctor.specialization, Doctor.department)
+                .join(User, User.id == Doctor.user_id).order_by(Doctor.id))
+    if kind == 'patients':
+        return (select(Patient.id, User.username, User.email, Patient.name, Patient.dob, Patient.contact)
+                .join(User, User.id == Patient.user_id).order_by(Patient.id))
+    if kind == 'appointments':
+        return archive.appointment_rows()
+    raise ValueError(f'Unknown kind: {kind}')
+
+
+def _jsonable(value):
+    return value if value is None or isinstance(value, (int, str)) else str(value)
+
+
+def stream_export(kind, fmt):
+    """Yield the export of a kind as CSV or NDJSON text, one chunk of rows at a time"""
+    from application.exports import stream_rows
+
+    fields = FIELDS[kind]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(fields)
+    for chunk in stream_rows(export_query(kind)):
+        for row in chunk:
+            if fmt == 'csv':
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps({f: _jsonable(v) for f, v in zip(fields, row)}) + '\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, Response, make_response
+import application.config as config
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """TTL LRU of rendered JSON responses, with an optional shared Redis tier.
+
+    Entries are tagged with the cache version they were built under.
+    `invalidate` bumps the version, locally and (with Redis) in a shared
+    key every process reads, so stale entries are never served anywhere.
+    """
+
+    def __init__(self, name, size, ttl, redis_url=None):
+        self.name = name
+        self.size = size
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self._redis = None
+        self.entries = OrderedDict()  # key -> (version, expires_at, etag, body)
+        self.lock = threading.Lock()
+        self.local_version = 0
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _client(self):
+        if self.redis_url and self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(self.redis_url, socket_connect_timeout=1, socket_timeout=1)
+        return self._redis
+
+    def _redis_call(self, method, *args, **kwargs):
+        """Run a Redis command, or return None when the Redis tier is off or down"""
+        client = self._client()
+        if client is None:
+            return None
+        try:
+            return getattr(client, method)(*args, **kwargs)
+        except Exception as e:
+            logger.warning("Response cache %s: Redis unavailable: %s", self.name, e)
+            return None
+
+    def version(self):
+        shared = self._redis_call('get', f'hms:cache:{self.name}:version')
+        return (int(shared) if shared else 0, self.local_version)
+
+    def get(self, key):
+        """(etag, body) for key, or None on a miss"""
+        version = self.version()
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] == version and entry[1] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[2], entry[3]
+
+        shared = self._redis_call('hmget', self._redis_key(version, key), 'etag', 'body')
+        if shared and shared[0] is not None:
+            etag, body = shared[0].decode('utf-8'), shared[1]
+            self._store(key, version, etag, body)
+            with self.lock:
+                self.redis_hits += 1
+            return etag, body
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, body, version):
+        etag = hashlib.sha1(body).hexdigest()
+        self._store(key, version, etag, body)
+        redis_key = self._redis_key(version, key)
+        if self._redis_call('hset', redis_key, mapping={'etag': etag, 'body': body}) is not None:
+            self._redis_call('expire', redis_key, self.ttl)
+        return etag
+
+    def invalidate(self):
+        with self.lock:
+            self.local_version += 1
+            self.entries.clear()
+        self._redis_call('incr', f'hms:cache:{self.name}:version')
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+        }
+
+    def _redis_key(self, version, key):
+        # Only the shared part of the version: other processes never see local bumps
+        return f'hms:cache:{self.name}:{version[0]}:{key}'
+
+    def _store(self, key, version, etag, body):
+        with self.lock:
+            self.entries[key] = (version, time.time() + self.ttl, etag, body)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+catalog_cache = ResponseCache(
+    'catalog',
+    config.CATALOG_CACHE_SIZE,
+    config.CATALOG_CACHE_TTL,
+    config.CATALOG_CACHE_REDIS_URL or None
+)
+
+dashboard_cache = ResponseCache(
+    'dashboard',
+    config.DASHBOARD_CACHE_SIZE,
+    config.DASHBOARD_CACHE_TTL,
+    config.DASHBOARD_CACHE_REDIS_URL or None
+)
+
+
+def cached_response(cache):
+    """Serve a GET view's JSON from cache, keyed by path and query string.
+
+    Responses carry an ETag and are revalidated by browsers, which get a
+    304 with no body while the cached entry is unchanged.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            key = request.full_path
+            cached = cache.get(key)
+            if cached:
+                etag, body = cached
+            else:
+                version = cache.version()
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                etag = cache.set(key, body, version)
+            response = Response(body, mimetype='application/json')
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response.make_conditional(request)
+        return decorated
+    return decorator
@@ -0,0 +1,261 @@
+import click
+from flask_migrate import upgrade, stamp
+from sqlalchemy import inspect, text
+from werkzeug.exceptions import HTTPException
+from application.database import db
+
+# Revision that matches the schema db.create_all() used to build
+BASELINE_REVISION = '0001_initial'
+
+
+def register_commands(app):
+
+    @app.cli.command('init-db')
+    def init_db():
+        """Apply migrations and create the admin user if missing"""
+        from application.models import User
+
+        tables = inspect(db.engine).get_table_names()
+        if 'user' in tables and 'alembic_version' not in tables:
+            # Database created by db.create_all() before migrations existed
+            stamp(revision=BASELINE_REVISION)
+            click.echo(f"Stamped existing schema at {BASELINE_REVISION}.")
+        upgrade()
+
+        if not User.query.filter_by(role='admin').first():
+            admin = User(username='admin', role='admin', email='admin@hms.com')
+            admin.set_password('admin123')
+            db.session.add(admin)
+            db.session.commit()
+            click.echo("Admin user created.")
+
+    @app.cli.command('import-records')
+    @click.argument('kind', type=click.Choice(['doctors', 'patients', 'appointments']))
+    @click.argument('source', type=click.File('r', encoding='utf-8'))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+                  help='Defaults to csv for .csv files, ndjson otherwise')
+    @click.option('--chunk-size', type=int, help='Records per transaction (BULK_CHUNK_SIZE)')
+    def import_records(kind, source, fmt, chunk_size):
+        """Bulk-import records from a CSV or NDJSON file ('-' for stdin)"""
+        from application import bulk
+
+        fmt = fmt or bulk.detect_format(filename=source.name)
+
+        def progress(report):
+            click.echo(f"{report['inserted']} inserted, {report['failed']} failed", err=True)
+
+        report = bulk.import_records(kind, bulk.read_records(source, fmt), chunk_size, progress)
+        for error in report['errors']:
+            click.echo(f"row {error['row']}: {error['message']}")
+        if report['failed'] > len(report['errors']):
+            click.echo(f"... and {report['failed'] - len(report['errors'])} more errors")
+        click.echo(f"Imported {report['inserted']} {kind}, {report['failed']} rejected.")
+
+    @app.cli.command('export-records')
+    @click.argument('kind', type=click.Choice(['doctors', 'patients', 'appointments']))
+    @click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='ndjson')
+    def export_records(kind, target, fmt):
+        """Export every record of a kind as CSV or NDJSON (stdout by default)"""
+        from application import bulk
+
+        for text in bulk.stream_export(kind, fmt):
+            target.write(text)
+
+    @app.cli.command('archive-appointments')
+    @click.option('--batch-size', type=int, help='Appointments per transaction (ARCHIVE_BATCH_SIZE)')
+    def archive_appointments(batch_size):
+        """Move finished appointments older than ARCHIVE_AFTER_DAYS to the archive tables"""
+        from application import archive
+
+        moved = archive.archive_appointments(batch_size, progress=lambda n: click.echo(f"{n} moved", err=True))
+        stats = archive.storage_stats()
+        click.echo(f"Archived {moved} appointments (before {stats['cutoff']}).")
+        click.echo(f"hot: {stats['hot']}  cold: {stats['cold']}")
+
+    @app.cli.command('check-queries')
+    def check_queries():
+        """Request each endpoint in QUERY_BUDGETS and fail if one exceeds its budget or repeats a statement"""
+        client = app.test_client()
+        ids, headers = budget_fixtures(client)
+
+        failed = 0
+        for path, budget in QUERY_BUDGETS:
+            path = path.format(**ids)
+            ok, status, count, repeated = check_budget(client, path, budget, headers)
+            failed += not ok
+            click.echo(f"[{'ok  ' if ok else 'FAIL'}] {count:3d}/{budget:<3d} {status} {path}")
+            for shape, n in repeated:
+                click.echo(f"    {n} x {shape[:200]}")
+        for endpoint in unbudgeted_endpoints(app, ids):
+            failed += 1
+            click.echo(f"[FAIL] no budget for GET endpoint {endpoint}")
+        if failed:
+            raise SystemExit(1)
+
+    @app.cli.command('explain-indexes')
+    def explain_indexes():
+        """Show the query plan of each hot lookup and whether it uses an index"""
+        failed = 0
+        for name, sql, params in HOT_QUERIES:
+            plan = explain(sql, params)
+            uses_index = plan_uses_index(plan)
+            failed += not uses_index
+            click.echo(f"[{'index' if uses_index else 'SCAN '}] {name}")
+            for line in plan:
+                click.echo(f"    {line}")
+        if failed:
+            raise SystemExit(1)
+
+
+# (path, most statements allowed) for the GET endpoints, each requested by its blueprint's role
+# (token checks are cached, so authentication adds no statements)
+QUERY_BUDGETS = [
+    ('/admin/doctors', 2),
+    ('/admin/patients', 2),
+    ('/admin/appointments', 2),
+    ('/admin/search?q=a', 3),
+    ('/admin/dashboard', 5),
+    ('/admin/archive-stats', 4),
+    ('/admin/cache-stats', 0),
+    ('/admin/pool-stats', 0),
+    ('/admin/export/appointments', 1),
+    ('/admin/tasks/{task_id}', 0),
+    ('/admin/download-export/{bulk_filename}', 1),
+    ('/doctor/appointments/{doctor_id}', 2),
+    ('/doctor/assigned_patients/{doctor_id}', 2),
+    ('/doctor/dashboard/{doctor_id}', 6),
+    ('/doctor/patient_history/{patient_id}', 1),
+    ('/doctor/schedule/{doctor_id}', 2),
+    ('/patient/appointments/{patient_id}', 2),
+    ('/patient/history/{patient_id}', 2),
+    ('/patient/profile/{patient_id}', 3),
+    ('/patient/export-treatments/{patient_id}/stream', 3),
+    ('/patient/export-status/{task_id}', 0),
+    ('/patient/download-export/{filename}', 2),
+    ('/patient/doctors', 2),
+    ('/patient/departments', 1),
+    ('/patient/search?q=a', 2),
+    ('/patient/department/{department}/doctors', 1),
+    ('/patient/doctor/{doctor_id}/availability', 3),
+    ('/patient/department/{department}/availability', 4),
+]
+
+
+def budget_fixtures(client):
+    """Format ids for QUERY_BUDGETS and request headers per role, from the first admin, doctor and patient.
+
+    The patient's treatments, and everyone's, are exported first, so the download endpoints have files to serve.
+    """
+    from application.models import User, Doctor, Patient
+    from application.routes.auth import generate_token
+    from application.tasks import export_all_treatments, export_patient_treatments
+
+    admin = User.query.filter_by(role='admin').first()
+    doctor, patient = Doctor.query.first(), Patient.query.first()
+    if not (admin and doctor and patient):
+        raise click.ClickException('Needs an admin, a doctor and a patient in the database')
+    export = export_patient_treatments.apply(args=(patient.id,)).result
+    bulk_export = export_all_treatments.apply().result
+    for result in (export, bulk_export):
+        if 'filename' not in result:
+            raise click.ClickException(f"Could not export treatments: {result.get('message')}")
+    ids = {'doctor_id': doctor.id, 'patient_id': patient.id, 'department': doctor.department or 'General',
+           'task_id': 'check-queries', 'filename': export['filename'], 'bulk_filename': bulk_export['filename']}
+
+    # Each path is requested by a user of its blueprint's role
+    headers = {}
+    for role, user_id in (('admin', admin.id), ('doctor', doctor.user_id), ('patient', patient.user_id)):
+        headers[role] = {'Authorization': f"Bearer {generate_token(user_id, role)}"}
+        client.get('/auth/verify', headers=headers[role])  # caches the token
+    return ids, headers
+
+
+def check_budget(client, path, budget, headers):
+    """(ok, status, statements run, repeated shapes) for one GET of a formatted QUERY_BUDGETS path"""
+    from application.querycheck import record_queries
+
+    db.session.remove()  # requests share the caller's app context; start each with an empty identity map
+    with record_queries() as queries:
+        status = client.get(path, headers=headers[path.split('/')[1]]).status_code
+    repeated = queries.repeated()
+    return status < 400 and queries.count <= budget and not repeated, status, queries.count, repeated
+
+
+def unbudgeted_endpoints(app, ids):
+    """GET endpoints of the admin, doctor and patient blueprints with no path in QUERY_BUDGETS"""
+    adapter = app.url_map.bind('localhost')
+    budgeted = set()
+    for path, _ in QUERY_BUDGETS:
+        try:
+            budgeted.add(adapter.match(path.format(**ids).split('?')[0], method='GET')[0])
+        except HTTPException:
+            pass  # a route that no longer exists; its request fails the check
+    return sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                  if 'GET' in rule.methods and rule.endpoint.split('.')[0] in ('admin', 'doctor', 'patient')
+                  and rule.endpoint not in budgeted)
+
+# (name, sql, params) for every lookup the indexes are meant to serve
+HOT_QUERIES = [
+    ('doctor appointments by status',
+     "SELECT * FROM appointment WHERE doctor_id = :doctor_id AND status = 'Booked' ORDER BY date",
+     {'doctor_id': 1}),
+    ('live appointments by day',
+     "SELECT id FROM appointment WHERE date = :date AND status = 'Booked' ORDER BY id",
+     {'date': '2025-01-01'}),
+    ('past-due live appointments',
+     "SELECT id FROM appointment WHERE status = 'Booked' AND date < :date ORDER BY date LIMIT 1000",
+     {'date': '2025-01-01'}),
+    ('patient appointments by status',
+     "SELECT * FROM appointment WHERE patient_id = :patient_id AND status = 'Completed'",
+     {'patient_id': 1}),
+    ('availability slot lookup',
+     "SELECT * FROM availability WHERE doctor_id = :doctor_id AND date = :date "
+     "AND start_time = :start_time AND is_booked = :is_booked",
+     {'doctor_id': 1, 'date': '2025-01-01', 'start_time': '09:00:00', 'is_booked': False}),
+    ('availability window',
+     "SELECT id, date, start_time, end_time, is_booked FROM availability "
+     "WHERE doctor_id = :doctor_id AND date BETWEEN :start AND :end AND is_booked = :is_booked "
+     "ORDER BY date, start_time",
+     {'doctor_id': 1, 'start': '2025-01-01', 'end': '2025-01-14', 'is_booked': False}),
+    ('archived patient history',
+     "SELECT * FROM appointment_archive WHERE patient_id = :patient_id AND status = 'Completed'",
+     {'patient_id': 1}),
+    ('archived treatment by appointment',
+     "SELECT * FROM treatment_archive WHERE appointment_id = :appointment_id",
+     {'appointment_id': 1}),
+    ('treatment by appointment',
+     "SELECT * FROM treatment WHERE appointment_id = :appointment_id",
+     {'appointment_id': 1}),
+    ('doctor by user',
+     "SELECT * FROM doctor WHERE user_id = :user_id",
+     {'user_id': 1}),
+    ('patient by user',
+     "SELECT * FROM patient WHERE user_id = :user_id",
+     {'user_id': 1}),
+    ('doctors by department',
+     "SELECT * FROM doctor WHERE department = :department",
+     {'department': 'Cardiology'}),
+    ('user by email',
+     "SELECT * FROM \"user\" WHERE email = :email",
+     {'email': 'admin@hms.com'}),
+]
+
+
+def explain(sql, params):
+    """Return the query plan as a list of lines for SQLite or PostgreSQL"""
+    if db.engine.dialect.name == 'sqlite':
+        rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).fetchall()
+        return [row[-1] for row in rows]
+    # Tiny dev tables make the planner prefer seq scans; ask what it would do otherwise
+    db.session.execute(text("SET LOCAL enable_seqscan = off"))
+    rows = db.session.execute(text(f"EXPLAIN {sql}"), params).fetchall()
+    db.session.rollback()
+    return [row[0] for row in rows]
+
+
+def plan_uses_index(plan):
+    plan_text = '\n'.join(plan).upper()
+    return 'INDEX' in plan_text and 'SEQ SCAN' not in plan_text and not any(
+        line.upper().startswith('SCAN') and 'INDEX' not in line.upper() for line in plan
+    )
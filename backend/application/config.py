@@ -1,4 +1,5 @@
 import os
+from celery.schedules import crontab
 
 # Email Configuration
 MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
@@ -7,6 +8,17 @@ MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'True') == 'True'
 MAIL_USERNAME = os.getenv('MAIL_USERNAME', '22f3001834@ds.study.iitm.ac.in')
 MAIL_PASSWORD = os.getenv('MAIL_PASSWORD', os.getenv('app_pass'))
 MAIL_DEFAULT_SENDER = os.getenv('MAIL_USERNAME', '22f3001834@ds.study.iitm.ac.in')
+MAIL_SUPPRESS_SEND = os.getenv('MAIL_SUPPRESS_SEND', 'False') == 'True'
+# Batched delivery: messages per Celery subtask (one SMTP connection each),
+# messages per connection before reconnecting, and provider send-rate quota
+MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', 100))
+MAIL_MAX_EMAILS = int(os.getenv('MAIL_MAX_EMAILS', 100))
+MAIL_MAX_PER_SECOND = float(os.getenv('MAIL_MAX_PER_SECOND', 5))
+# The quota is a token bucket in Redis shared by every worker, since batches run in parallel
+MAIL_RATE_REDIS_URL = os.getenv('MAIL_RATE_REDIS_URL', os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0'))
+MAIL_RATE_KEY = os.getenv('MAIL_RATE_KEY', 'hms:mail:quota')
+MAIL_MAX_RETRIES = int(os.getenv('MAIL_MAX_RETRIES', 5))
+MAIL_RETRY_BACKOFF = int(os.getenv('MAIL_RETRY_BACKOFF', 30))
 
 # Celery Configuration
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
@@ -16,8 +28,136 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TIMEZONE = 'Asia/Kolkata'
 CELERY_ENABLE_UTC = False
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
+CELERY_BEAT_SCHEDULE = {
+    'send-daily-reminders': {
+        'task': 'tasks.send_daily_reminders',
+        'schedule': crontab(hour=9, minute=0),
+    },
+    'send-monthly-reports': {
+        'task': 'tasks.send_monthly_reports',
+        'schedule': crontab(day_of_month=1, hour=8, minute=0),
+    },
+    'close-past-appointments': {
+        'task': 'tasks.close_past_appointments',
+        'schedule': crontab(minute=5),  # hourly
+    },
+    'archive-appointments': {
+        'task': 'tasks.archive_appointments',
+        'schedule': crontab(hour=3, minute=30),  # nightly
+    },
+    'sweep-exports': {
+        'task': 'tasks.sweep_exports',
+        'schedule': crontab(minute=15),  # hourly
+    },
+}
 
 # Export Configuration
 basedir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
-EXPORT_FOLDER = os.path.join(basedir, 'exports')
+EXPORT_FOLDER = os.getenv('EXPORT_FOLDER', os.path.join(basedir, 'exports'))
 EXPORT_FILE_RETENTION_HOURS = 24
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 1000))  # rows fetched and written per chunk
+EXPORT_STREAM_MAX_ROWS = int(os.getenv('EXPORT_STREAM_MAX_ROWS', 5000))  # smaller exports stream directly, skipping Celery
+EXPORT_PATIENT_QUOTA_BYTES = int(os.getenv('EXPORT_PATIENT_QUOTA_BYTES', 50 * 1024 * 1024))
+EXPORT_TOTAL_QUOTA_BYTES = int(os.getenv('EXPORT_TOTAL_QUOTA_BYTES', 2 * 1024 * 1024 * 1024))
+# Storage backend for export artifacts: 'local' (EXPORT_FOLDER) or 's3' (S3-compatible, e.g. MinIO)
+EXPORT_STORAGE_BACKEND = os.getenv('EXPORT_STORAGE_BACKEND', 'local')
+EXPORT_S3_BUCKET = os.getenv('EXPORT_S3_BUCKET', 'hms-exports')
+EXPORT_S3_ENDPOINT_URL = os.getenv('EXPORT_S3_ENDPOINT_URL')  # e.g. http://localhost:9000 for MinIO
+EXPORT_S3_URL_EXPIRY = int(os.getenv('EXPORT_S3_URL_EXPIRY', 300))
+
+# Password Hashing Configuration
+BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+BCRYPT_POOL_SIZE = int(os.getenv('BCRYPT_POOL_SIZE', 2))  # hashing processes per worker; 0 hashes inline
+
+# Auth Configuration
+AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', 10000))  # verified tokens kept per process
+AUTH_CACHE_MAX_AGE = int(os.getenv('AUTH_CACHE_MAX_AGE', 300))  # seconds; bounds staleness if a revocation is missed
+AUTH_REVOCATION_REDIS_URL = os.getenv('AUTH_REVOCATION_REDIS_URL', CELERY_BROKER_URL)
+AUTH_REVOCATION_CHANNEL = os.getenv('AUTH_REVOCATION_CHANNEL', 'hms:auth:revocations')
+
+# Bulk Import Configuration
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', 1000))  # records validated and inserted per transaction
+BULK_MAX_REPORTED_ERRORS = int(os.getenv('BULK_MAX_REPORTED_ERRORS', 1000))
+BULK_HASH_WORKERS = int(os.getenv('BULK_HASH_WORKERS', 0))  # hashing processes for imports; 0 uses every CPU
+# Cost for imported passwords; a lower one is raised to BCRYPT_LOG_ROUNDS at each user's first login
+BULK_IMPORT_BCRYPT_ROUNDS = int(os.getenv('BULK_IMPORT_BCRYPT_ROUNDS', BCRYPT_LOG_ROUNDS))
+
+# Appointment Maintenance
+NO_SHOW_GRACE_HOURS = int(os.getenv('NO_SHOW_GRACE_HOURS', 12))  # booked appointments this far in the past become no-shows
+MAINTENANCE_BATCH_SIZE = int(os.getenv('MAINTENANCE_BATCH_SIZE', 1000))
+
+# Archival of Appointment History
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 365))  # finished appointments older than this move to the archive tables
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))
+
+# Deleting Doctors and Patients
+DELETE_INLINE_MAX_APPOINTMENTS = int(os.getenv('DELETE_INLINE_MAX_APPOINTMENTS', 20000))  # larger histories are purged by a task
+DELETE_BATCH_SIZE = int(os.getenv('DELETE_BATCH_SIZE', 2000))  # rows per transaction in that task
+
+# Catalog Response Cache (departments and doctor listings)
+CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', 512))  # responses kept per process
+CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', 600))  # seconds
+CATALOG_CACHE_REDIS_URL = os.getenv('CATALOG_CACHE_REDIS_URL', '')  # e.g. redis://localhost:6379/1 to share across workers
+
+# Dashboard Response Cache (/doctor/dashboard, /admin/dashboard)
+# Dropped whenever a write to a table they show commits; without Redis, other
+# processes only notice once their entries expire
+DASHBOARD_CACHE_SIZE = int(os.getenv('DASHBOARD_CACHE_SIZE', 1024))  # responses kept per process
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 30))  # seconds
+DASHBOARD_CACHE_REDIS_URL = os.getenv('DASHBOARD_CACHE_REDIS_URL', CATALOG_CACHE_REDIS_URL)
+
+# Live Updates (server-sent events at /events, fed through Redis pub/sub)
+EVENTS_REDIS_URL = os.getenv('EVENTS_REDIS_URL', CELERY_BROKER_URL)
+EVENTS_CHANNEL = os.getenv('EVENTS_CHANNEL', 'hms:events')
+EVENTS_STREAM_SECONDS = int(os.getenv('EVENTS_STREAM_SECONDS', 300))  # streams end after this; browsers reconnect with a fresh token check
+EVENTS_HEARTBEAT_SECONDS = int(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))  # comment lines that keep proxies from closing idle streams
+EVENTS_RETRY_MS = int(os.getenv('EVENTS_RETRY_MS', 3000))  # reconnect delay sent to browsers
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 256))  # undelivered events per stream before its client is told to refetch
+EVENTS_MAX_STREAMS = int(os.getenv('EVENTS_MAX_STREAMS', 8))  # per process; each holds a gunicorn thread, so keep below --threads
+
+# Availability Windows
+AVAILABILITY_DEFAULT_DAYS = int(os.getenv('AVAILABILITY_DEFAULT_DAYS', 14))
+AVAILABILITY_MAX_DAYS = int(os.getenv('AVAILABILITY_MAX_DAYS', 92))
+
+# Database Connection Pools (PostgreSQL; SQLite keeps SQLAlchemy's defaults)
+# Each process picks a profile: 'worker' under the celery command, 'web' otherwise.
+# Peak connections = web processes * (web size + overflow) + Celery concurrency * (worker size + overflow);
+# keep that below the server's max_connections (Render's free Postgres allows 97).
+DB_POOL_PROFILE = os.getenv('DB_POOL_PROFILE', '')  # force 'web' or 'worker'
+DB_POOL_PROFILES = {
+    'web': {
+        'pool_size': int(os.getenv('DB_WEB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_WEB_MAX_OVERFLOW', 5)),
+        'pool_timeout': int(os.getenv('DB_WEB_POOL_TIMEOUT', 10)),  # seconds to wait for a free connection
+        'statement_timeout_ms': int(os.getenv('DB_WEB_STATEMENT_TIMEOUT_MS', 15000)),
+    },
+    'worker': {
+        'pool_size': int(os.getenv('DB_WORKER_POOL_SIZE', 2)),  # per prefork child
+        'max_overflow': int(os.getenv('DB_WORKER_MAX_OVERFLOW', 1)),
+        'pool_timeout': int(os.getenv('DB_WORKER_POOL_TIMEOUT', 30)),
+        'statement_timeout_ms': int(os.getenv('DB_WORKER_STATEMENT_TIMEOUT_MS', 600000)),  # exports, purges
+    },
+}
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # seconds; replace connections before idle disconnects
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'True') == 'True'
+# Connect through PgBouncer in transaction mode: no client-side pool, and the
+# statement timeout is set per transaction since startup options are not passed on
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'False') == 'True'
+
+# Instrumentation (/metrics)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # bearer token required to scrape /metrics; open when empty outside production
+METRICS_HIDDEN_WITHOUT_TOKEN = os.getenv('FLASK_ENV', '') == 'production'  # /metrics answers 404 until METRICS_TOKEN is set
+METRICS_REDIS_URL = os.getenv('METRICS_REDIS_URL', CELERY_BROKER_URL)  # Celery task metrics shared by workers
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 200))  # log statements at least this slow; 0 disables
+
+# N+1 Detection (development)
+QUERY_CHECK = os.getenv('QUERY_CHECK', 'False') == 'True'  # log statement shapes repeated within a request
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 3))  # runs of one shape that count as repeated
+
+# Search
+SEARCH_FUZZY_SCAN_LIMIT = int(os.getenv('SEARCH_FUZZY_SCAN_LIMIT', 5000))  # rows SQLite rescores for a query with a typo
+
+# Pagination Configuration
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 200))
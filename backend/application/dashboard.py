@@ -0,0 +1,82 @@
+"""Queries behind the doctor and admin dashboards.
+
+Each dashboard is one response: counts plus the first page of each list,
+built in the request's session. Responses go through `dashboard_cache`,
+which `init_invalidation` drops after every commit that wrote to a table
+a dashboard shows, so an unchanged dashboard costs a version check and
+comes back as a 304 to a browser holding its ETag.
+"""
+import re
+from sqlalchemy import case, distinct, event, func, select
+from sqlalchemy.orm import joinedload
+from application.models import Appointment, Doctor, Patient
+from application.database import db
+from application.cache import dashboard_cache
+
+# Tables whose rows appear in, or are counted by, a dashboard
+TABLES = {'user', 'doctor', 'patient', 'appointment', 'treatment', 'availability',
+          'schedule_rule', 'schedule_exception', 'appointment_archive', 'treatment_archive'}
+
+_WRITE = re.compile(r'\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+"?(\w+)', re.IGNORECASE)
+
+
+def booked_appointments(doctor_id):
+    """A doctor's booked appointments, soonest first (pages with date_id_cursor)"""
+    return (Appointment.query.options(joinedload(Appointment.patient))
+            .filter_by(doctor_id=doctor_id, status='Booked')
+            .order_by(Appointment.date, Appointment.id))
+
+
+def assigned_patients(doctor_id):
+    """Patients with at least one appointment with the doctor (pages with id_cursor)"""
+    seen = select(Appointment.patient_id).where(Appointment.doctor_id == doctor_id)
+    return Patient.query.filter(Patient.id.in_(seen)).order_by(Patient.id)
+
+
+def doctor_counts(doctor_id):
+    booked, patients = db.session.execute(
+        select(func.coalesce(func.sum(case((Appointment.status == 'Booked', 1), else_=0)), 0),
+               func.count(distinct(Appointment.patient_id)))
+        .where(Appointment.doctor_id == doctor_id)
+    ).one()
+    return {'booked': booked, 'patients': patients}
+
+
+def admin_counts():
+    """Totals in one statement, instead of the lengths of the first pages"""
+    def count(model, *where):
+        return select(func.count()).select_from(model).where(*where).scalar_subquery()
+
+    doctors, patients, appointments, booked = db.session.execute(select(
+        count(Doctor), count(Patient), count(Appointment), count(Appointment, Appointment.status == 'Booked')
+    )).one()
+    return {'doctors': doctors, 'patients': patients, 'appointments': appointments, 'booked': booked}
+
+
+def init_invalidation(engine):
+    """Invalidate dashboard_cache once a transaction that wrote to TABLES is committed.
+
+    Writes are noted per connection and the cache is dropped when the
+    connection goes back to the pool, after the commit, so a concurrent
+    request cannot cache what it read just before it.
+    """
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def note_write(conn, cursor, statement, parameters, context, executemany):
+        match = _WRITE.match(statement)
+        if match and match.group(1).lower() in TABLES:
+            conn.info['dashboard_written'] = True
+
+    @event.listens_for(engine, 'commit')
+    def note_commit(conn):
+        if conn.info.pop('dashboard_written', False):
+            conn.info['dashboard_committed'] = True
+
+    @event.listens_for(engine, 'rollback')
+    def forget_write(conn):
+        conn.info.pop('dashboard_written', None)
+
+    @event.listens_for(engine, 'checkin')
+    def invalidate(dbapi_connection, connection_record):
+        if connection_record.info.pop('dashboard_committed', False):
+            dashboard_cache.invalidate()
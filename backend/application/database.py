@@ -1,3 +1,4 @@
-
 from flask_sqlalchemy import SQLAlchemy
-db=SQLAlchemy()
\ No newline at end of file
+from flask_migrate import Migrate
+db=SQLAlchemy()
+migrate=Migrate()
@@ -0,0 +1,91 @@
+"""Set-based deletion of doctors and patients with everything that references them.
+
+Each dependent table is cleared with one DELETE ... WHERE, so removing a
+doctor takes the same handful of statements whatever their history. Very
+large histories are purged by a Celery task in batches instead, so no
+single transaction holds its locks for long.
+"""
+from sqlalchemy import select, delete, func
+from application.models import (User, Doctor, Patient, Appointment, Availability, Treatment,
+                                AppointmentArchive, ScheduleRule, ScheduleException, ExportArtifact)
+from application.database import db
+from application import exports, archive
+import application.config as config
+
+
+def _delete(model, criteria):
+    """One DELETE statement; the session is not searched for the deleted objects"""
+    return db.session.execute(
+        delete(model).where(criteria).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def appointment_count(criteria):
+    return db.session.execute(select(func.count()).select_from(Appointment).where(criteria)).scalar()
+
+
+def _purge_appointments(criteria, batch_size=None, progress=None):
+    """Delete matching appointments and their treatments; returns how many appointments went.
+
+    Without batch_size this is two statements in the caller's transaction.
+    With it, batches of that many appointments are deleted and committed
+    one at a time.
+    """
+    if not batch_size:
+        _delete(Treatment, Treatment.appointment_id.in_(select(Appointment.id).where(criteria)))
+        return _delete(Appointment, criteria)
+
+    deleted = 0
+    while True:
+        ids = db.session.execute(select(Appointment.id).where(criteria).limit(batch_size)).scalars().all()
+        if not ids:
+            return deleted
+        _delete(Treatment, Treatment.appointment_id.in_(ids))
+        _delete(Appointment, Appointment.id.in_(ids))
+        db.session.commit()
+        deleted += len(ids)
+        if progress:
+            progress(deleted)
+
+
+def _purge_rows(model, criteria, batch_size=None):
+    if not batch_size:
+        _delete(model, criteria)
+        return
+    while True:
+        ids = db.session.execute(select(model.id).where(criteria).limit(batch_size)).scalars().all()
+        if not ids:
+            return
+        _delete(model, model.id.in_(ids))
+        db.session.commit()
+
+
+def purge_doctor(doctor, batch_size=None, progress=None):
+    """Delete a doctor, their user, appointments (hot and archived), treatments, slots and schedule"""
+    doctor_id, user_id = doctor.id, doctor.user_id
+    deleted = _purge_appointments(Appointment.doctor_id == doctor_id, batch_size, progress)
+    deleted += archive.purge(AppointmentArchive.doctor_id == doctor_id)
+    _purge_rows(Availability, Availability.doctor_id == doctor_id, batch_size)
+    _delete(ScheduleRule, ScheduleRule.doctor_id == doctor_id)
+    _delete(ScheduleException, ScheduleException.doctor_id == doctor_id)
+    _delete(Doctor, Doctor.id == doctor_id)
+    _delete(User, User.id == user_id)
+    db.session.commit()
+    return deleted
+
+
+def purge_patient(patient, batch_size=None, progress=None):
+    """Delete a patient, their user, appointments (hot and archived), treatments and stored exports"""
+    patient_id, user_id = patient.id, patient.user_id
+    exports.delete_artifacts(ExportArtifact.query.filter_by(patient_id=patient_id).all())
+    deleted = _purge_appointments(Appointment.patient_id == patient_id, batch_size, progress)
+    deleted += archive.purge(AppointmentArchive.patient_id == patient_id)
+    _delete(Patient, Patient.id == patient_id)
+    _delete(User, User.id == user_id)
+    db.session.commit()
+    return deleted
+
+
+def needs_background(criteria):
+    """True when a history is too large to delete within one request"""
+    return appointment_count(criteria) > config.DELETE_INLINE_MAX_APPOINTMENTS
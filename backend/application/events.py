@@ -0,0 +1,221 @@
+"""Live updates: small JSON deltas sent to the dashboards as server-sent events.
+
+Routes call `publish` once their change is committed. Events go through
+Redis pub/sub on EVENTS_CHANNEL, so every web process hears every write.
+Each process runs one subscriber thread, which hands events to the
+streams it serves. Every stream only gets what its user may see.
+
+Streams end after EVENTS_STREAM_SECONDS, and EventSource reconnects by
+itself. Events published while a client was away are not replayed; the
+client refetches once when it reconnects.
+
+Each open stream holds a worker thread, so a process serves at most
+EVENTS_MAX_STREAMS of them and answers 503 beyond that; those clients
+poll instead. Keep it well below gunicorn's --threads.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from flask import Response, jsonify, request
+from application.models import Appointment, Availability, Doctor, Patient
+from application.database import db
+from application import schedule
+import application.config as config
+
+logger = logging.getLogger(__name__)
+
+_streams = set()
+_streams_lock = threading.Lock()
+_listener_pid = None
+_redis = None
+_redis_down_until = 0
+
+
+class Stream:
+    """One open /events response: its user's scope and the events waiting to be sent"""
+
+    def __init__(self, role, doctor_id=None, patient_id=None):
+        self.role = role
+        self.doctor_id = doctor_id
+        self.patient_id = patient_id
+        self.queue = queue.Queue(maxsize=config.EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, event):
+        if self.role == 'admin':
+            return True
+        if event['type'] in ('slot', 'schedule'):
+            # Availability is public to patients; doctors see their own
+            return self.role == 'patient' or event['doctor_id'] == self.doctor_id
+        if event['type'] == 'appointment':
+            if self.role == 'doctor':
+                return event['doctor_id'] == self.doctor_id
+            return event['patient_id'] == self.patient_id
+        return False
+
+    def offer(self, event):
+        if not self.wants(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+
+def _dispatch(event):
+    with _streams_lock:
+        streams = list(_streams)
+    for stream in streams:
+        stream.offer(event)
+
+
+def _listen():
+    import redis
+    while True:
+        try:
+            client = redis.Redis.from_url(config.EVENTS_REDIS_URL, socket_connect_timeout=2)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(config.EVENTS_CHANNEL)
+            for message in pubsub.listen():
+                _dispatch(json.loads(message['data']))
+        except Exception as e:
+            logger.warning("Event channel unavailable: %s", e)
+            time.sleep(5)
+
+
+def _ensure_listener():
+    """One event listener thread per process, started by the first stream"""
+    global _listener_pid
+    if _listener_pid != os.getpid():
+        _listener_pid = os.getpid()
+        threading.Thread(target=_listen, daemon=True, name='live-events').start()
+
+
+def _client():
+    global _redis
+    if _redis is None:
+        import redis
+        _redis = redis.Redis.from_url(config.EVENTS_REDIS_URL, socket_connect_timeout=0.5, socket_timeout=1)
+    return _redis
+
+
+def publish(*events):
+    """Send events to every process's streams; call after the change is committed.
+
+    Without Redis the events still reach this process's streams, and
+    publishing is skipped for 30s so writes do not wait on timeouts.
+    """
+    global _redis_down_until
+    for event in events:
+        if time.time() >= _redis_down_until:
+            try:
+                _client().publish(config.EVENTS_CHANNEL, json.dumps(event))
+                continue
+            except Exception as e:
+                logger.warning("Could not publish %s event: %s", event['type'], e)
+                _redis_down_until = time.time() + 30
+        _dispatch(event)
+
+
+def appointment_event(appointment):
+    return {
+        'type': 'appointment',
+        'id': appointment.id,
+        'doctor_id': appointment.doctor_id,
+        'patient_id': appointment.patient_id,
+        'doctor': appointment.doctor.name,
+        'specialization': appointment.doctor.specialization,
+        'patient': appointment.patient.name,
+        'date': str(appointment.date),
+        'time': str(appointment.time),
+        'status': appointment.status,
+        'reason': appointment.reason or 'Not specified'
+    }
+
+
+def slot_event(doctor_id, day, start_time):
+    """Current state of one slot: its stored row, else the scheduled slot, else removed"""
+    event = {'type': 'slot', 'doctor_id': doctor_id, 'date': str(day), 'start_time': str(start_time)}
+    slot = Availability.query.filter_by(doctor_id=doctor_id, date=day, start_time=start_time).first()
+    if slot:
+        return dict(event, id=slot.id, end_time=str(slot.end_time), is_booked=bool(slot.is_booked))
+    scheduled = schedule.scheduled_slot(doctor_id, day, start_time)
+    if scheduled:
+        return dict(event, id=None, end_time=str(scheduled[1]), is_booked=False)
+    return dict(event, removed=True)
+
+
+def schedule_event(doctor_id):
+    """Many slots changed at once (weekly rules, exceptions); clients reload the doctor's window"""
+    return {'type': 'schedule', 'doctor_id': doctor_id}
+
+
+def user_event(user):
+    return {'type': 'user', 'user_id': user.id, 'is_blacklisted': bool(user.is_blacklisted)}
+
+
+def appointment_changed(appointment):
+    """Publish a booked, cancelled or completed appointment along with its slot"""
+    publish(appointment_event(appointment),
+            slot_event(appointment.doctor_id, appointment.date, appointment.time))
+
+
+def _format(stream):
+    yield f'retry: {config.EVENTS_RETRY_MS}\n\n'
+    deadline = time.monotonic() + config.EVENTS_STREAM_SECONDS
+    while time.monotonic() < deadline:
+        if stream.overflowed:
+            yield 'event: reset\ndata: {}\n\n'
+            return
+        try:
+            event = stream.queue.get(timeout=config.EVENTS_HEARTBEAT_SECONDS)
+        except queue.Empty:
+            yield ': keep-alive\n\n'
+            continue
+        yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def _reserve(stream):
+    """Register a stream unless EVENTS_MAX_STREAMS are already open in this process"""
+    with _streams_lock:
+        if len(_streams) >= config.EVENTS_MAX_STREAMS:
+            return False
+        _streams.add(stream)
+        return True
+
+
+def _release(stream):
+    with _streams_lock:
+        _streams.discard(stream)
+
+
+def open_streams():
+    return len(_streams)
+
+
+def events_view():
+    """Server-sent events for the signed-in user (token as ?token=, since EventSource cannot send headers)"""
+    doctor_id = patient_id = None
+    if request.user_role == 'doctor':
+        doctor_id = db.session.query(Doctor.id).filter_by(user_id=request.user_id).scalar()
+    elif request.user_role == 'patient':
+        patient_id = db.session.query(Patient.id).filter_by(user_id=request.user_id).scalar()
+    # The stream outlives the request; give its database connection back now
+    db.session.remove()
+    stream = Stream(request.user_role, doctor_id, patient_id)
+    if not _reserve(stream):
+        # Every stream holds a worker thread; past the cap clients poll instead
+        return jsonify({'message': 'Too many live streams'}), 503
+    _ensure_listener()
+    response = Response(_format(stream), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs even if the body was never started, unlike a finally in the generator
+    response.call_on_close(lambda: _release(stream))
+    return response
+
+
+def init_events(app):
+    app.add_url_rule('/events', 'events', events_view)
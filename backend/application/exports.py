@@ -0,0 +1,236 @@
+import csv
+import gzip
+import hashlib
+import io
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+from application.models import ExportArtifact
+from application.database import db
+from application.storage import get_storage
+from application import archive
+import application.config as config
+
+
+class QuotaExceeded(Exception):
+    pass
+
+EXPORT_HEADER = (
+    'Patient ID', 'Patient Name', 'Doctor Name',
+    'Appointment Date', 'Appointment Time', 'Diagnosis',
+    'Prescription', 'Notes'
+)
+
+
+def treatment_rows(patient_id=None):
+    """Select treatment, appointment and doctor columns in one joined pass.
+
+    Rows come back as tuples in EXPORT_HEADER order, from the hot tables and
+    the archive alike. Without a patient_id every patient's treatments are
+    selected, ordered by patient.
+    """
+    return archive.treatment_rows(patient_id)
+
+
+def stream_rows(stmt):
+    """Execute with a server-side cursor, yielding lists of EXPORT_CHUNK_SIZE rows"""
+    result = db.session.execute(stmt.execution_options(yield_per=config.EXPORT_CHUNK_SIZE))
+    yield from result.partitions()
+
+
+def open_export(filepath, compress=False):
+    if compress:
+        return gzip.open(filepath, 'wt', newline='', encoding='utf-8')
+    return open(filepath, 'w', newline='', encoding='utf-8')
+
+
+def write_csv(stmt, filepath, compress=False, progress=None):
+    """Stream the query into a CSV file in chunks; returns the row count.
+
+    The file is written under a temporary name and moved into place once
+    complete, so a half-written export is never served. `progress` is
+    called with the running row count after every chunk.
+    """
+    partial = filepath + '.part'
+    rows = 0
+    try:
+        with open_export(partial, compress) as fileobj:
+            writer = csv.writer(fileobj)
+            writer.writerow(EXPORT_HEADER)
+            for chunk in stream_rows(stmt):
+                writer.writerows(chunk)
+                rows += len(chunk)
+                if progress:
+                    progress(rows)
+        os.replace(partial, filepath)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return rows
+
+
+def fingerprint(stmt):
+    """Content digest and row count of an export, without formatting or writing it.
+
+    Exports are named after this digest, so an unchanged export maps to a
+    file that already exists and need not be generated again.
+    """
+    digest = hashlib.sha256()
+    rows = 0
+    for chunk in stream_rows(stmt):
+        for row in chunk:
+            digest.update(repr(tuple(row)).encode('utf-8'))
+        rows += len(chunk)
+    return digest.hexdigest()[:32], rows
+
+
+def export_filename(prefix, digest, compress=False):
+    return f'{prefix}_{digest}.csv' + ('.gz' if compress else '')
+
+
+def digest_from_filename(filename):
+    """The content digest embedded by export_filename, used as the ETag"""
+    stem = filename.split('.', 1)[0]
+    return stem.rsplit('_', 1)[-1]
+
+
+def stream_csv(stmt):
+    """Yield the export as CSV text, one chunk of rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADER)
+    for chunk in stream_rows(stmt):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def count_rows(stmt):
+    return db.session.execute(
+        select(func.count()).select_from(stmt.order_by(None).subquery())
+    ).scalar()
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _expiry_cutoff():
+    return datetime.utcnow() - timedelta(hours=config.EXPORT_FILE_RETENTION_HOURS)
+
+
+def find_artifact(filename):
+    """Indexed, unexpired artifact with this name, or None"""
+    return ExportArtifact.query.filter(
+        ExportArtifact.filename == filename,
+        ExportArtifact.created_at >= _expiry_cutoff()
+    ).first()
+
+
+def serve_artifact(artifact):
+    """Download response for a found artifact, cacheable until it expires"""
+    expires_at = artifact.created_at + timedelta(hours=config.EXPORT_FILE_RETENTION_HOURS)
+    max_age = max(0, int((expires_at - datetime.utcnow()).total_seconds()))
+    return get_storage().serve(artifact.filename, digest_from_filename(artifact.filename), max_age)
+
+
+def delete_artifacts(artifacts):
+    storage = get_storage()
+    for artifact in artifacts:
+        storage.delete(artifact.filename)
+        db.session.delete(artifact)
+    db.session.commit()
+
+
+def _evict(criteria, quota, incoming):
+    """Delete the oldest artifacts matching criteria until incoming bytes fit in quota"""
+    if incoming > quota:
+        raise QuotaExceeded(f'Export of {incoming} bytes exceeds the {quota} byte quota')
+    used = db.session.query(func.coalesce(func.sum(ExportArtifact.size), 0)).filter(*criteria).scalar()
+    while used + incoming > quota:
+        oldest = ExportArtifact.query.filter(*criteria).order_by(ExportArtifact.created_at).limit(50).all()
+        if not oldest:
+            break
+        victims = []
+        for artifact in oldest:
+            victims.append(artifact)
+            used -= artifact.size
+            if used + incoming <= quota:
+                break
+        delete_artifacts(victims)
+
+
+def store_artifact(local_path, filename, patient_id, row_count):
+    """Move a finished export into storage and record it in the index.
+
+    Older artifacts are evicted first so the patient stays within
+    EXPORT_PATIENT_QUOTA_BYTES and all exports within EXPORT_TOTAL_QUOTA_BYTES.
+    """
+    size = os.path.getsize(local_path)
+    try:
+        if patient_id is not None:
+            _evict([ExportArtifact.patient_id == patient_id], config.EXPORT_PATIENT_QUOTA_BYTES, size)
+        _evict([], config.EXPORT_TOTAL_QUOTA_BYTES, size)
+    except QuotaExceeded:
+        os.remove(local_path)
+        raise
+
+    artifact = ExportArtifact(
+        filename=filename,
+        patient_id=patient_id,
+        size=size,
+        row_count=row_count,
+        checksum=file_checksum(local_path)
+    )
+    get_storage().save(local_path, filename)
+    # An expired row of the same name may still wait for sweep_expired; the file it
+    # indexed was just overwritten, so the new row replaces it
+    ExportArtifact.query.filter(
+        ExportArtifact.filename == filename,
+        ExportArtifact.created_at < _expiry_cutoff()
+    ).delete(synchronize_session=False)
+    db.session.add(artifact)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # The same content was exported concurrently and is already indexed
+        db.session.rollback()
+        artifact = ExportArtifact.query.filter_by(filename=filename).first()
+    return artifact
+
+
+def sweep_expired():
+    """Delete artifacts past EXPORT_FILE_RETENTION_HOURS, and stray local files.
+
+    Stray files are unindexed leftovers in EXPORT_FOLDER (interrupted .part
+    files, exports written before the index existed) older than the same
+    retention period.
+    """
+    cutoff = _expiry_cutoff()
+    deleted = 0
+    while True:
+        expired = ExportArtifact.query.filter(ExportArtifact.created_at < cutoff).limit(500).all()
+        if not expired:
+            break
+        delete_artifacts(expired)
+        deleted += len(expired)
+
+    strays = 0
+    if os.path.isdir(config.EXPORT_FOLDER):
+        cutoff_ts = time.time() - config.EXPORT_FILE_RETENTION_HOURS * 3600
+        for entry in os.scandir(config.EXPORT_FOLDER):
+            if not entry.is_file() or entry.stat().st_mtime >= cutoff_ts:
+                continue
+            if ExportArtifact.query.filter_by(filename=entry.name).first() is None:
+                os.remove(entry.path)
+                strays += 1
+    return deleted, strays
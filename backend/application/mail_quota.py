@@ -0,0 +1,85 @@
+"""The mail provider's send-rate quota, shared by every worker process.
+
+Batches are sent in parallel by many Celery workers, so pacing inside
+one task does not bound the total rate. Every send takes a token from one
+bucket in Redis that refills at MAIL_MAX_PER_SECOND, with a second's worth
+of burst. A sender that finds the bucket empty still takes its token (the
+count goes negative) and sleeps until the token would have existed, so
+waiting senders are served in order.
+
+Without Redis each process paces itself alone, which can exceed the quota
+by the number of processes; a warning is logged and Redis is retried
+after 30s.
+"""
+import logging
+import threading
+import time
+import application.config as config
+
+logger = logging.getLogger(__name__)
+
+# Refill the bucket by the time elapsed (Redis clock), take one token, and
+# return how many seconds the caller must wait for it
+_TAKE = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1]) or burst
+local at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - at) * rate) - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('EXPIRE', KEYS[1], 3600)
+if tokens >= 0 then
+    return '0'
+end
+return tostring(-tokens / rate)
+"""
+
+_redis = None
+_script = None
+_redis_down_until = 0
+_local_lock = threading.Lock()
+_local_next = 0.0
+
+
+def _take_shared(rate):
+    global _redis, _script
+    if _script is None:
+        import redis
+        _redis = redis.Redis.from_url(config.MAIL_RATE_REDIS_URL, socket_connect_timeout=1, socket_timeout=1)
+        _script = _redis.register_script(_TAKE)
+    return float(_script(keys=[config.MAIL_RATE_KEY], args=[rate, max(1.0, rate)]))
+
+
+def _take_local(rate):
+    """Seconds to wait for this process's next send slot"""
+    global _local_next
+    with _local_lock:
+        now = time.monotonic()
+        start = max(now, _local_next)
+        _local_next = start + 1.0 / rate
+        return start - now
+
+
+def acquire():
+    """Block until the quota allows one more message.
+
+    A no-op when MAIL_MAX_PER_SECOND is 0 or sending is suppressed.
+    """
+    global _redis_down_until
+    rate = config.MAIL_MAX_PER_SECOND
+    if not rate or config.MAIL_SUPPRESS_SEND:
+        return
+    wait = None
+    if time.time() >= _redis_down_until:
+        try:
+            wait = _take_shared(rate)
+        except Exception as e:
+            logger.warning("Mail quota in Redis unavailable, pacing per process: %s", e)
+            _redis_down_until = time.time() + 30
+    if wait is None:
+        wait = _take_local(rate)
+    if wait > 0:
+        time.sleep(wait)
@@ -0,0 +1,70 @@
+"""Keep the set of live ('Booked') appointments down to those still ahead.
+
+Booked appointments whose time passed without a treatment being recorded
+are moved to 'No-show', and booked Availability rows left without a live
+appointment are freed again.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, exists, and_, or_
+from application.models import Appointment, Availability
+from application.database import db
+import application.config as config
+
+NO_SHOW = 'No-show'
+
+
+def past_due_cutoff(now=None):
+    return (now or datetime.now()) - timedelta(hours=config.NO_SHOW_GRACE_HOURS)
+
+
+def close_past_appointments(batch_size=None, now=None):
+    """Mark live appointments older than the grace period as no-shows; returns how many.
+
+    Works in batches of ids taken from the live-appointment index, each
+    updated and committed on its own, so locks are held only briefly.
+    """
+    batch_size = batch_size or config.MAINTENANCE_BATCH_SIZE
+    cutoff = past_due_cutoff(now)
+    past_due = and_(
+        Appointment.status == 'Booked',
+        or_(Appointment.date < cutoff.date(),
+            and_(Appointment.date == cutoff.date(), Appointment.time < cutoff.time())),
+    )
+    closed = 0
+    while True:
+        ids = db.session.execute(
+            select(Appointment.id).where(past_due).order_by(Appointment.date).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return closed
+        db.session.execute(
+            update(Appointment)
+            .where(Appointment.id.in_(ids), Appointment.status == 'Booked')
+            .values(status=NO_SHOW)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        closed += len(ids)
+
+
+def free_orphaned_slots(now=None):
+    """Free upcoming slots still marked booked though no live appointment holds them.
+
+    Those are left behind when an appointment is cancelled or deleted by a
+    path that does not release its slot. Returns how many were freed.
+    """
+    today = (now or datetime.now()).date()
+    held = exists().where(
+        Appointment.doctor_id == Availability.doctor_id,
+        Appointment.date == Availability.date,
+        Appointment.time == Availability.start_time,
+        Appointment.status == 'Booked',
+    )
+    freed = db.session.execute(
+        update(Availability)
+        .where(Availability.is_booked == True, Availability.date >= today, ~held)
+        .values(is_booked=False)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return freed
@@ -0,0 +1,306 @@
+"""Request, query and task instrumentation, exported in Prometheus text format at /metrics.
+
+Web metrics (request latency, queries and DB time per request) live in the
+memory of the process serving the request. Celery task metrics are
+recorded by worker processes, so they are kept in Redis hashes under
+METRICS_REDIS_URL, which every web process reads when scraped. Queries
+slower than SLOW_QUERY_MS are logged with the endpoint or task that ran them.
+"""
+import logging
+import threading
+import time
+from flask import g, request, has_request_context, Response
+from celery.signals import before_task_publish, task_prerun, task_postrun
+from sqlalchemy import event
+import application.config as config
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('application.slow_query')
+
+# Seconds; request and task latencies
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TASK_BUCKETS = (0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+class LocalStore:
+    """Metric values in this process's memory"""
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def add(self, updates):
+        with self.lock:
+            for field, amount in updates:
+                self.values[field] = self.values.get(field, 0) + amount
+
+    def items(self):
+        with self.lock:
+            return list(self.values.items())
+
+
+class RedisStore:
+    """Metric values in a Redis hash, shared by every process that records them"""
+
+    def __init__(self, key, redis_url):
+        self.key = key
+        self.redis_url = redis_url
+        self._redis = None
+
+    def _client(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(self.redis_url, socket_connect_timeout=1, socket_timeout=1)
+        return self._redis
+
+    def add(self, updates):
+        try:
+            pipe = self._client().pipeline(transaction=False)
+            for field, amount in updates:
+                pipe.hincrbyfloat(self.key, field, amount)
+            pipe.execute()
+        except Exception as e:
+            logger.warning("Metrics %s: Redis unavailable: %s", self.key, e)
+
+    def items(self):
+        try:
+            values = self._client().hgetall(self.key)
+        except Exception as e:
+            logger.warning("Metrics %s: Redis unavailable: %s", self.key, e)
+            return []
+        return [(field.decode('utf-8'), float(value)) for field, value in values.items()]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=(), store=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.store = store or LocalStore()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        # Label values joined by the unit separator; field names stay flat
+        return '\x1f'.join(str(labels[name]) for name in self.labelnames)
+
+    def _pairs(self, key):
+        values = key.split('\x1f') if self.labelnames else []
+        return list(zip(self.labelnames, values))
+
+    def render(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}'] + self.samples()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.store.add([(self._key(labels), amount)])
+
+    def samples(self):
+        return [f'{self.name}{_labels(self._pairs(key))} {_number(value)}'
+                for key, value in sorted(self.store.items())]
+
+
+class Histogram(Metric):
+    """Bucket counts are stored per bucket and made cumulative when rendered"""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS, store=None):
+        super().__init__(name, help, labelnames, store)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        bucket = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.store.add([(f'{key}|{bucket}', 1), (f'{key}|sum', value), (f'{key}|count', 1)])
+
+    def samples(self):
+        series = {}
+        for field, value in self.store.items():
+            key, part = field.rsplit('|', 1)
+            series.setdefault(key, {})[part] = value
+        lines = []
+        for key, parts in sorted(series.items()):
+            pairs = self._pairs(key)
+            cumulative = 0
+            for i, bound in enumerate(self.buckets + (float('inf'),)):
+                cumulative += parts.get(str(i), 0)
+                le = '+Inf' if i == len(self.buckets) else _number(bound)
+                lines.append(f'{self.name}_bucket{_labels(pairs + [("le", le)])} {_number(cumulative)}')
+            lines.append(f'{self.name}_sum{_labels(pairs)} {_number(parts.get("sum", 0))}')
+            lines.append(f'{self.name}_count{_labels(pairs)} {_number(parts.get("count", 0))}')
+        return lines
+
+
+REGISTRY = []
+
+
+def _task_store(name):
+    """Shared store for task metrics, unless tasks run in the web process (eager mode)"""
+    if config.METRICS_REDIS_URL and not config.CELERY_TASK_ALWAYS_EAGER:
+        return RedisStore(f'hms:metrics:{name}', config.METRICS_REDIS_URL)
+    return LocalStore()
+
+
+http_requests = Counter('hms_http_requests_total', 'HTTP requests by endpoint and status',
+                        ('endpoint', 'method', 'status'))
+http_latency = Histogram('hms_http_request_duration_seconds', 'Time to produce a response',
+                         ('endpoint', 'method'))
+http_queries = Histogram('hms_http_request_queries', 'SQL statements executed per request',
+                         ('endpoint',), buckets=QUERY_COUNT_BUCKETS)
+http_db_time = Histogram('hms_http_request_db_seconds', 'Time spent in SQL per request', ('endpoint',))
+db_queries = Counter('hms_db_queries_total', 'SQL statements executed')
+db_slow_queries = Counter('hms_db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS')
+task_duration = Histogram('hms_celery_task_duration_seconds', 'Celery task run time', ('task', 'state'),
+                          buckets=TASK_BUCKETS, store=_task_store('task_duration'))
+task_queue_wait = Histogram('hms_celery_task_queue_wait_seconds', 'Time between publishing a task and its start',
+                            ('task',), buckets=TASK_BUCKETS, store=_task_store('task_queue_wait'))
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def init_request_metrics(app):
+    """Time every request and count its queries; adds db and total Server-Timing entries"""
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+        g.query_count = 0
+        g.db_seconds = 0.0
+
+    @app.after_request
+    def record_request(response):
+        if 'metrics_started' not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_started
+        endpoint = _endpoint()
+        http_requests.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        http_latency.observe(elapsed, endpoint=endpoint, method=request.method)
+        http_queries.observe(g.query_count, endpoint=endpoint)
+        http_db_time.observe(g.db_seconds, endpoint=endpoint)
+        response.headers.add('Server-Timing', f'db;dur={g.db_seconds * 1000:.3f};desc="{g.query_count} queries"')
+        response.headers.add('Server-Timing', f'total;dur={elapsed * 1000:.3f}')
+        return response
+
+
+def init_query_metrics(engine):
+    """Count statements and their time, per request, and log slow ones"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        db_queries.inc()
+        if has_request_context() and 'query_count' in g:
+            g.query_count += 1
+            g.db_seconds += elapsed
+        if config.SLOW_QUERY_MS and elapsed * 1000 >= config.SLOW_QUERY_MS:
+            db_slow_queries.inc()
+            source = _endpoint() if has_request_context() else 'background'
+            slow_query_logger.warning("Slow query (%.1f ms) in %s: %s", elapsed * 1000, source,
+                                      ' '.join(statement.split())[:1000])
+
+
+_task_started = {}
+
+
+@before_task_publish.connect
+def stamp_published(headers=None, **kwargs):
+    if headers is not None:
+        headers['published_at'] = time.time()
+
+
+@task_prerun.connect
+def start_task(task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+    published_at = getattr(task.request, 'published_at', None)
+    if published_at:
+        task_queue_wait.observe(max(time.time() - published_at, 0), task=task.name)
+
+
+@task_postrun.connect
+def finish_task(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        task_duration.observe(time.perf_counter() - started, task=task.name, state=state or 'UNKNOWN')
+
+
+def _gauges():
+    """Pool and cache state sampled at scrape time"""
+    from application.database import db
+    from application.pool import pool_stats
+    from application.cache import catalog_cache, dashboard_cache
+    from application.auth_dacorator import token_cache
+    from application.events import open_streams
+
+    pool = pool_stats(db.engine)
+    catalog = catalog_cache.stats()
+    dashboards = dashboard_cache.stats()
+    gauges = [
+        ('hms_db_pool_checked_out', 'gauge', 'Connections currently checked out', pool['checked_out']),
+        ('hms_db_pool_max_checked_out', 'gauge', 'Most connections checked out at once', pool['max_checked_out']),
+        ('hms_db_pool_connects_total', 'counter', 'Connections opened', pool['connects']),
+        ('hms_db_pool_invalidations_total', 'counter', 'Dead connections discarded', pool['invalidations']),
+        ('hms_auth_cache_hits_total', 'counter', 'Token verifications served from cache', token_cache.hits),
+        ('hms_auth_cache_misses_total', 'counter', 'Token verifications that decoded the token', token_cache.misses),
+        ('hms_catalog_cache_hits_total', 'counter', 'Catalog responses served from memory', catalog['hits']),
+        ('hms_catalog_cache_redis_hits_total', 'counter', 'Catalog responses served from Redis', catalog['redis_hits']),
+        ('hms_catalog_cache_misses_total', 'counter', 'Catalog responses rendered', catalog['misses']),
+        ('hms_dashboard_cache_hits_total', 'counter', 'Dashboard responses served from memory or Redis',
+         dashboards['hits'] + dashboards['redis_hits']),
+        ('hms_dashboard_cache_misses_total', 'counter', 'Dashboard responses rendered', dashboards['misses']),
+        ('hms_event_streams', 'gauge', 'Open /events streams in this process', open_streams()),
+    ]
+    lines = []
+    for name, kind, help, value in gauges:
+        lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}', f'{name} {_number(value)}']
+    return lines
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    lines += _gauges()
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view():
+    """Prometheus scrape endpoint; requires METRICS_TOKEN as a bearer token when it is set.
+
+    Without a token it is open, except in production, where it is not served at all.
+    """
+    if not config.METRICS_TOKEN and config.METRICS_HIDDEN_WITHOUT_TOKEN:
+        return Response('Not Found\n', status=404, mimetype='text/plain')
+    if config.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {config.METRICS_TOKEN}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_metrics(app, engine):
+    init_request_metrics(app)
+    init_query_metrics(engine)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
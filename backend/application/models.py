@@ -1,6 +1,6 @@
 
 from application.database import db
-from flask_bcrypt import generate_password_hash, check_password_hash
+from application import passwords
 from datetime import datetime
 
 class User(db.Model):
@@ -8,27 +8,30 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20), nullable=False) # admin, doctor, patient
-    email = db.Column(db.String(120))
+    email = db.Column(db.String(120), index=True)
     is_blacklisted = db.Column(db.Boolean, default=False)
     active = db.Column(db.Boolean, default=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password).decode('utf-8')
+        self.password_hash = passwords.hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.check_password(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return passwords.needs_rehash(self.password_hash)
 
 class Doctor(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     specialization = db.Column(db.String(100), nullable=False)
-    department = db.Column(db.String(100), nullable=True)
+    department = db.Column(db.String(100), nullable=True, index=True)
     user = db.relationship('User', backref=db.backref('doctor_profile', uselist=False))
 
 class Patient(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     dob = db.Column(db.Date, nullable=True)
     contact = db.Column(db.String(20), nullable=True)
@@ -43,22 +46,106 @@ class Availability(db.Model):
     is_booked = db.Column(db.Boolean, default=False)
     doctor = db.relationship('Doctor', backref='availabilities')
 
+    __table_args__ = (
+        # Slot lookups: by doctor and day, then exact start time / free slots
+        db.Index('ix_availability_doctor_date_start', 'doctor_id', 'date', 'start_time', 'is_booked'),
+    )
+
+class ScheduleRule(db.Model):
+    """A weekly recurring block of slots; concrete slots are computed per request"""
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False, index=True)
+    weekday = db.Column(db.Integer, nullable=False)  # 0 = Monday ... 6 = Sunday
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    slot_minutes = db.Column(db.Integer, nullable=False, default=60)
+    valid_from = db.Column(db.Date, nullable=False)
+    valid_until = db.Column(db.Date, nullable=True)  # open-ended when None
+    doctor = db.relationship('Doctor', backref='schedule_rules')
+
+class ScheduleException(db.Model):
+    """Time a doctor is unavailable despite their rules; the whole day when start_time is None"""
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    start_time = db.Column(db.Time, nullable=True)
+    end_time = db.Column(db.Time, nullable=True)
+    doctor = db.relationship('Doctor', backref='schedule_exceptions')
+
+    __table_args__ = (
+        db.Index('ix_schedule_exception_doctor_date', 'doctor_id', 'date'),
+    )
+
 class Appointment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
     patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
     time = db.Column(db.Time, nullable=False)
-    status = db.Column(db.String(20), default='Booked') # Booked, Completed, Cancelled
+    status = db.Column(db.String(20), default='Booked') # Booked, Completed, Cancelled, No-show
     reason = db.Column(db.Text, nullable=True)  # Patient's reason for appointment
     doctor = db.relationship('Doctor', backref='appointments')
     patient = db.relationship('Patient', backref='appointments')
 
+    __table_args__ = (
+        # Doctor dashboards and reports: doctor_id + status, ordered by date
+        db.Index('ix_appointment_doctor_status_date', 'doctor_id', 'status', 'date'),
+        # Patient history and listings: patient_id + status
+        db.Index('ix_appointment_patient_status', 'patient_id', 'status'),
+        # At most one live booking per doctor and time
+        db.Index('uq_appointment_live_slot', 'doctor_id', 'date', 'time', unique=True,
+                 sqlite_where=db.text("status = 'Booked'"),
+                 postgresql_where=db.text("status = 'Booked'")),
+        # Live appointments by day (reminders, past-due sweep); stays small
+        # however much history accumulates
+        db.Index('ix_appointment_live_date', 'date', 'time',
+                 sqlite_where=db.text("status = 'Booked'"),
+                 postgresql_where=db.text("status = 'Booked'")),
+    )
+
 class Treatment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    appointment_id = db.Column(db.Integer, db.ForeignKey('appointment.id'), nullable=False)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointment.id'), nullable=False, index=True)
     diagnosis = db.Column(db.Text, nullable=True)
     prescription = db.Column(db.Text, nullable=True)
     notes = db.Column(db.Text, nullable=True)
     appointment = db.relationship('Appointment', backref=db.backref('treatment', uselist=False))
 
+class AppointmentArchive(db.Model):
+    """Finished appointments moved out of `appointment` by the archive job (application.archive).
+
+    Rows keep their original id. On PostgreSQL the table is range-partitioned
+    by year of `date`, so the partition key is part of the primary key.
+    """
+    __tablename__ = 'appointment_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    date = db.Column(db.Date, primary_key=True)
+    doctor_id = db.Column(db.Integer, nullable=False)
+    patient_id = db.Column(db.Integer, nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    reason = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_appointment_archive_patient', 'patient_id', 'status'),
+        db.Index('ix_appointment_archive_doctor', 'doctor_id', 'date'),
+        {'postgresql_partition_by': 'RANGE (date)'},
+    )
+
+class TreatmentArchive(db.Model):
+    """Treatments of archived appointments, with their original ids"""
+    __tablename__ = 'treatment_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    appointment_id = db.Column(db.Integer, nullable=False, index=True)
+    diagnosis = db.Column(db.Text, nullable=True)
+    prescription = db.Column(db.Text, nullable=True)
+    notes = db.Column(db.Text, nullable=True)
+
+class ExportArtifact(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), unique=True, nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=True, index=True)  # None for bulk exports
+    size = db.Column(db.BigInteger, nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)
+    checksum = db.Column(db.String(64), nullable=False)  # sha256 of the stored file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
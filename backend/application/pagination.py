@@ -0,0 +1,57 @@
+from flask import request, jsonify
+from datetime import datetime
+import application.config as config
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def get_limit():
+    """Page size from the `limit` query parameter, clamped to MAX_PAGE_SIZE"""
+    try:
+        limit = int(request.args.get('limit', config.DEFAULT_PAGE_SIZE))
+    except ValueError:
+        limit = config.DEFAULT_PAGE_SIZE
+    return max(1, min(limit, config.MAX_PAGE_SIZE))
+
+
+def id_cursor(column):
+    """Keyset filter for `after=<id>` on a list ordered by id"""
+    after = request.args.get('after')
+    if not after:
+        return None
+    try:
+        return column > int(after)
+    except ValueError:
+        raise InvalidCursor(f'Invalid cursor: {after}')
+
+
+def date_id_cursor(date_column, id_column, descending=False):
+    """Keyset filter for `after=<YYYY-MM-DD>_<id>` on a list ordered by (date, id), or by both descending"""
+    after = request.args.get('after')
+    if not after:
+        return None
+    try:
+        date_str, id_str = after.split('_', 1)
+        after_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        after_id = int(id_str)
+    except ValueError:
+        raise InvalidCursor(f'Invalid cursor: {after}')
+    if descending:
+        return (date_column < after_date) | ((date_column == after_date) & (id_column < after_id))
+    return (date_column > after_date) | ((date_column == after_date) & (id_column > after_id))
+
+
+def fetch_page(query, limit):
+    """Fetch one page plus a look-ahead row to tell whether another page exists"""
+    rows = query.limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+def page_response(items, next_cursor=None):
+    """JSON list response; the cursor for the next page goes in X-Next-Cursor"""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
@@ -0,0 +1,88 @@
+import hmac
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+import application.config as config
+
+_pool = None
+_pool_pid = None
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _check(password, pw_hash):
+    return hmac.compare_digest(bcrypt.hashpw(password, pw_hash), pw_hash)
+
+
+def _encode(password):
+    # bcrypt only uses the first 72 bytes; older releases truncated silently
+    return password.encode('utf-8')[:72]
+
+
+def _run(fn, *args):
+    """Run fn in the hashing pool, or inline when there is none.
+
+    The pool is created lazily and per process, so gunicorn and Celery
+    workers forked from a parent never share one.
+    """
+    global _pool, _pool_pid
+    # Daemonic processes (Celery prefork children) cannot start a pool
+    if config.BCRYPT_POOL_SIZE <= 0 or multiprocessing.current_process().daemon:
+        return fn(*args)
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ProcessPoolExecutor(max_workers=config.BCRYPT_POOL_SIZE)
+        _pool_pid = os.getpid()
+    return _pool.submit(fn, *args).result()
+
+
+def hash_password(password, rounds=None):
+    if not password:
+        raise ValueError('Password must be non-empty.')
+    rounds = rounds or config.BCRYPT_LOG_ROUNDS
+    return _run(_hash, _encode(password), rounds).decode('utf-8')
+
+
+def check_password(pw_hash, password):
+    if not pw_hash or not password:
+        return False
+    try:
+        return _run(_check, _encode(password), pw_hash.encode('utf-8'))
+    except ValueError:
+        # Not a bcrypt hash
+        return False
+
+
+def hash_passwords(passwords, rounds=None, workers=None):
+    """Hash many passwords at once, spread over a pool of `workers` processes.
+
+    Meant for bulk imports, which can use every core; web requests go
+    through hash_password and the smaller per-worker pool.
+    """
+    rounds = rounds or config.BCRYPT_LOG_ROUNDS
+    encoded = []
+    for password in passwords:
+        if not password:
+            raise ValueError('Password must be non-empty.')
+        encoded.append(_encode(password))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(encoded) < 2 or multiprocessing.current_process().daemon:
+        return [_hash(p, rounds).decode('utf-8') for p in encoded]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        hashed = pool.map(_hash, encoded, [rounds] * len(encoded),
+                          chunksize=max(1, len(encoded) // (workers * 4)))
+        return [h.decode('utf-8') for h in hashed]
+
+
+def is_bcrypt_hash(value):
+    return isinstance(value, str) and len(value) == 60 and value[:4] in ('$2a$', '$2b$', '$2y$')
+
+
+def needs_rehash(pw_hash):
+    """True when the hash was made with a cost other than BCRYPT_LOG_ROUNDS"""
+    try:
+        return int(pw_hash.split('$')[2]) != config.BCRYPT_LOG_ROUNDS
+    except (IndexError, ValueError):
+        return True
@@ -0,0 +1,106 @@
+"""Engine and connection pool options per process role, and pool usage counters.
+
+Web processes (gunicorn) and Celery worker processes get separate pool
+profiles from config.DB_POOL_PROFILES, so the total number of connections
+stays predictable when both run against the same database. Connections are
+pre-pinged and recycled, which avoids errors from connections the server
+or a proxy closed while idle.
+"""
+import os
+import sys
+import time
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+import application.config as config
+
+# Counters for this process, since the engine was created
+pool_metrics = {
+    'connects': 0,
+    'checkouts': 0,
+    'invalidations': 0,  # dead connections found by pre-ping or on error
+    'checked_out': 0,
+    'max_checked_out': 0,
+    'checkout_seconds': 0.0,  # total time connections were held
+}
+
+_checkout_started = {}
+
+
+def current_profile():
+    """'worker' in Celery processes, 'web' otherwise, unless DB_POOL_PROFILE says which"""
+    if config.DB_POOL_PROFILE:
+        return config.DB_POOL_PROFILE
+    return 'worker' if os.path.basename(sys.argv[0]).startswith('celery') else 'web'
+
+
+def engine_options(database_url, profile=None):
+    """SQLALCHEMY_ENGINE_OPTIONS for the URL and process profile"""
+    if not database_url.startswith('postgresql'):
+        return {}
+    settings = config.DB_POOL_PROFILES[profile or current_profile()]
+    timeout = settings['statement_timeout_ms']
+    if config.DB_PGBOUNCER:
+        # PgBouncer does the pooling; prepared statements and session
+        # settings would not survive its switching of server connections
+        return {'poolclass': NullPool}
+    options = {
+        'pool_size': settings['pool_size'],
+        'max_overflow': settings['max_overflow'],
+        'pool_timeout': settings['pool_timeout'],
+        'pool_recycle': config.DB_POOL_RECYCLE,
+        'pool_pre_ping': config.DB_POOL_PRE_PING,
+    }
+    if timeout:
+        options['connect_args'] = {'options': f'-c statement_timeout={timeout}'}
+    return options
+
+
+def _set_local_timeout(timeout):
+    def on_begin(conn):
+        conn.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+    return on_begin
+
+
+def init_pool(engine, profile=None):
+    """Count pool events on the engine; in PgBouncer mode also apply the statement timeout per transaction"""
+    profile = profile or current_profile()
+    pool_metrics['profile'] = profile
+
+    if engine.dialect.name == 'postgresql' and config.DB_PGBOUNCER:
+        timeout = config.DB_POOL_PROFILES[profile]['statement_timeout_ms']
+        if timeout:
+            event.listen(engine, 'begin', _set_local_timeout(timeout))
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, record):
+        pool_metrics['connects'] += 1
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, record, proxy):
+        pool_metrics['checkouts'] += 1
+        pool_metrics['checked_out'] += 1
+        pool_metrics['max_checked_out'] = max(pool_metrics['max_checked_out'], pool_metrics['checked_out'])
+        _checkout_started[id(record)] = time.perf_counter()
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, record):
+        started = _checkout_started.pop(id(record), None)
+        if started is not None:
+            pool_metrics['checked_out'] -= 1
+            pool_metrics['checkout_seconds'] += time.perf_counter() - started
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, record, exception):
+        pool_metrics['invalidations'] += 1
+
+
+def pool_stats(engine):
+    """The pool's current state and this process's counters"""
+    pool = engine.pool
+    stats = dict(pool_metrics, pid=os.getpid(), pool=type(pool).__name__)
+    stats['checkout_seconds'] = round(stats['checkout_seconds'], 3)
+    for name in ('size', 'checkedin', 'overflow', 'checkedout'):
+        method = getattr(pool, name, None)
+        if method:
+            stats[f'pool_{name}'] = method()
+    return stats
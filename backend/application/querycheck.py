@@ -0,0 +1,120 @@
+"""Statement recording for finding N+1 queries and holding endpoints to query budgets.
+
+`record_queries()` captures every statement the engine runs inside it.
+Statements are grouped by shape, which is the SQL with literals and
+IN-lists normalized, so a lazy load repeated per row shows up as one
+shape run many times. `max_queries(n)` fails when a block or function runs
+more than n statements. With QUERY_CHECK on, every request is recorded and
+repeated shapes are logged with the endpoint that ran them.
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import ContextDecorator
+from flask import g, request
+from sqlalchemy import event
+from application.database import db
+import application.config as config
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'\?|%\([^)]*\)s|%s|:\w+')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def shape(statement):
+    """The statement with literals and parameters replaced by ?, and IN-lists collapsed"""
+    normalized = _STRING.sub('?', statement)
+    normalized = _NUMBER.sub('?', normalized)
+    normalized = _PLACEHOLDER.sub('?', normalized)
+    normalized = _IN_LIST.sub('(?)', normalized)
+    return _SPACE.sub(' ', normalized).strip()
+
+
+def repeated_shapes(statements, threshold=None):
+    """[(shape, count)] of shapes run at least threshold (N_PLUS_ONE_THRESHOLD) times, most frequent first"""
+    threshold = threshold or config.N_PLUS_ONE_THRESHOLD
+    counts = Counter(shape(statement) for statement in statements)
+    return [(s, n) for s, n in counts.most_common() if n >= threshold]
+
+
+class record_queries:
+    """Collect the statements run on the engine while the block is active.
+
+        with record_queries() as queries:
+            client.get('/patient/doctors')
+        queries.count, queries.repeated()
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.engine = self.engine or db.engine
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+        return False
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self, threshold=None):
+        return repeated_shapes(self.statements, threshold)
+
+    def report(self):
+        lines = [f'{self.count} statements']
+        for s, n in self.repeated():
+            lines.append(f'  {n} x {s[:300]}')
+        return '\n'.join(lines)
+
+
+class max_queries(ContextDecorator):
+    """Raise QueryBudgetExceeded when the block or decorated function runs more than n statements"""
+
+    def __init__(self, n, engine=None):
+        self.n = n
+        self.engine = engine
+
+    def __enter__(self):
+        self.recorder = record_queries(self.engine).__enter__()
+        return self.recorder
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.__exit__(exc_type, exc, tb)
+        if exc_type is None and self.recorder.count > self.n:
+            raise QueryBudgetExceeded(f'Expected at most {self.n} queries, ran {self.recorder.report()}')
+        return False
+
+
+def init_query_check(app):
+    """Log repeated statement shapes per request when QUERY_CHECK is on (development)"""
+    if not config.QUERY_CHECK:
+        return
+
+    @app.before_request
+    def start_recording():
+        g.query_recorder = record_queries().__enter__()
+
+    @app.teardown_request
+    def report_repeats(exc):
+        recorder = g.pop('query_recorder', None)
+        if recorder is None:
+            return
+        recorder.__exit__(None, None, None)
+        for s, n in recorder.repeated():
+            logger.warning("Possible N+1 in %s: %d x %s", request.endpoint, n, s[:300])
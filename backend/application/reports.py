@@ -0,0 +1,148 @@
+from flask import render_template
+from sqlalchemy import select, func, case
+from datetime import datetime, date, timedelta
+from application.models import Appointment, Doctor, Patient, Treatment, User
+from application.database import db
+
+TOP_DIAGNOSES = 5
+REPORT_APPOINTMENTS = 20  # Limit to 20 for email
+
+
+def last_month_range(today=None):
+    """First and last day of the month before `today`"""
+    today = today or date.today()
+    last_day = today.replace(day=1) - timedelta(days=1)
+    return last_day.replace(day=1), last_day
+
+
+def doctors_with_appointments(first_day, last_day):
+    """Ids of doctors who had at least one appointment in the range"""
+    return [row.doctor_id for row in db.session.execute(
+        select(Appointment.doctor_id)
+        .where(Appointment.date >= first_day, Appointment.date <= last_day)
+        .distinct()
+        .order_by(Appointment.doctor_id)
+    )]
+
+
+def monthly_doctor_reports(first_day, last_day, doctor_ids=None):
+    """Monthly totals, status breakdown and top diagnoses for every doctor.
+
+    Returns {doctor_id: report} with plain dicts ready for the email
+    template. Doctors with no appointments in the range are left out. Two
+    queries are issued whatever the number of doctors or appointments: one
+    grouped query for the statistics and one for the appointment table.
+    """
+    in_range = [Appointment.date >= first_day, Appointment.date <= last_day]
+    if doctor_ids is not None:
+        in_range.append(Appointment.doctor_id.in_(doctor_ids))
+
+    # Appointment counts per (doctor, diagnosis)
+    per_diagnosis = (
+        select(
+            Appointment.doctor_id,
+            Treatment.diagnosis,
+            func.count().label('cases'),
+            func.sum(case((Appointment.status == 'Completed', 1), else_=0)).label('completed'),
+            func.sum(case((Appointment.status == 'Cancelled', 1), else_=0)).label('cancelled'),
+        )
+        .select_from(Appointment)
+        .outerjoin(Treatment, Treatment.appointment_id == Appointment.id)
+        .where(*in_range)
+        .group_by(Appointment.doctor_id, Treatment.diagnosis)
+        .cte('per_diagnosis')
+    )
+
+    # Doctor totals as window sums; rank diagnoses, undiagnosed rows last
+    undiagnosed = case((func.coalesce(per_diagnosis.c.diagnosis, '') == '', 1), else_=0)
+    by_doctor = per_diagnosis.c.doctor_id
+    ranked = select(
+        per_diagnosis.c.doctor_id,
+        per_diagnosis.c.diagnosis,
+        per_diagnosis.c.cases,
+        undiagnosed.label('undiagnosed'),
+        func.sum(per_diagnosis.c.cases).over(partition_by=by_doctor).label('total'),
+        func.sum(per_diagnosis.c.completed).over(partition_by=by_doctor).label('completed'),
+        func.sum(per_diagnosis.c.cancelled).over(partition_by=by_doctor).label('cancelled'),
+        func.row_number().over(
+            partition_by=by_doctor,
+            order_by=(undiagnosed, per_diagnosis.c.cases.desc(), per_diagnosis.c.diagnosis)
+        ).label('rank'),
+    ).subquery('ranked')
+
+    rows = db.session.execute(
+        select(ranked, Doctor.name, User.username, User.email)
+        .join(Doctor, Doctor.id == ranked.c.doctor_id)
+        .outerjoin(User, User.id == Doctor.user_id)
+        .where(ranked.c.rank <= TOP_DIAGNOSES)
+        .order_by(ranked.c.doctor_id, ranked.c.rank)
+    )
+
+    reports = {}
+    for row in rows:
+        report = reports.get(row.doctor_id)
+        if report is None:
+            report = reports[row.doctor_id] = {
+                'doctor_id': row.doctor_id,
+                'doctor_name': row.name,
+                'username': row.username,
+                'email': row.email,
+                'total_appointments': int(row.total),
+                'completed_appointments': int(row.completed),
+                'cancelled_appointments': int(row.cancelled),
+                'diagnoses': [],
+                'appointments': [],
+            }
+        if not row.undiagnosed:
+            report['diagnoses'].append({'name': row.diagnosis, 'count': row.cases})
+
+    if reports:
+        _attach_appointments(reports, in_range)
+    return reports
+
+
+def _attach_appointments(reports, in_range):
+    """First REPORT_APPOINTMENTS appointments of each doctor, in one query"""
+    numbered = (
+        select(
+            Appointment.doctor_id,
+            Appointment.date,
+            Appointment.status,
+            Patient.name.label('patient'),
+            Treatment.diagnosis,
+            func.row_number().over(
+                partition_by=Appointment.doctor_id,
+                order_by=(Appointment.date, Appointment.id)
+            ).label('rank'),
+        )
+        .join(Patient, Patient.id == Appointment.patient_id)
+        .outerjoin(Treatment, Treatment.appointment_id == Appointment.id)
+        .where(*in_range)
+        .subquery('numbered')
+    )
+    rows = db.session.execute(
+        select(numbered)
+        .where(numbered.c.rank <= REPORT_APPOINTMENTS)
+        .order_by(numbered.c.doctor_id, numbered.c.rank)
+    )
+    for row in rows:
+        reports[row.doctor_id]['appointments'].append({
+            'date': row.date.strftime('%Y-%m-%d'),
+            'patient': row.patient,
+            'diagnosis': row.diagnosis if row.diagnosis is not None else 'N/A',
+            'status': row.status
+        })
+
+
+def render_monthly_report(report, month_year):
+    """HTML body of the monthly report email"""
+    return render_template('email/monthly_report.html',
+        doctor_name=report['doctor_name'],
+        month_year=month_year,
+        total_appointments=report['total_appointments'],
+        completed_appointments=report['completed_appointments'],
+        cancelled_appointments=report['cancelled_appointments'],
+        appointments=report['appointments'],
+        diagnoses=report['diagnoses'],
+        report_date=datetime.now().strftime('%B %d, %Y')
+    )
@@ -1,14 +1,27 @@
-from flask import Blueprint, jsonify, request
-from application.models import Doctor, User, Patient, Appointment, Availability, Treatment
+from flask import Blueprint, jsonify, request, Response, stream_with_context
+import io
+from sqlalchemy.orm import joinedload
+from application.models import Doctor, User, Patient, Appointment
 from application.database import db
+from application import bulk, deletion, exports, archive, pool, dashboard, events
+from application import search as search_index
+from application.auth_dacorator import revoke_user_tokens, token_cache
+from application.cache import catalog_cache, dashboard_cache, cached_response
+from application.pagination import InvalidCursor, get_limit, id_cursor, date_id_cursor, fetch_page, page_response
 
 admin_bp = Blueprint('admin', __name__)
 
 @admin_bp.route('/search', methods=['GET'])
 def search():
     query = request.args.get('q', '')
-    doctors = Doctor.query.filter(Doctor.name.contains(query) | Doctor.department.contains(query)).all()
-    patients = Patient.query.filter(Patient.name.contains(query)).all()
+    limit = get_limit()
+    if query.strip():
+        doctors = search_index.search('doctor', query, limit)
+        patients = search_index.search('patient', query, limit)
+    else:
+        # An empty query lists everyone, as before the search index (up to limit)
+        doctors = Doctor.query.order_by(Doctor.id).limit(limit).all()
+        patients = Patient.query.order_by(Patient.id).limit(limit).all()
     
     return jsonify({
         'doctors': [{'id': d.id, 'name': d.name, 'department': d.department} for d in doctors],
@@ -20,6 +33,8 @@ def toggle_blacklist(user_id):
     user = User.query.get_or_404(user_id)
     user.is_blacklisted = not user.is_blacklisted
     db.session.commit()
+    revoke_user_tokens(user.id)
+    events.publish(events.user_event(user))
     status = 'blacklisted' if user.is_blacklisted else 'active'
     return jsonify({'message': f'User {status}'}), 200
 
@@ -44,17 +59,32 @@ def manage_doctors():
         doctor = Doctor(user_id=user.id, name=name, specialization=specialization, department=department)
         db.session.add(doctor)
         db.session.commit()
+        catalog_cache.invalidate()
         return jsonify({'message': 'Doctor added'}), 201
         
-    doctors = Doctor.query.all()
-    return jsonify([{
+    limit = get_limit()
+    query = _doctors_query()
+    try:
+        cursor = id_cursor(Doctor.id)
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
+    if cursor is not None:
+        query = query.filter(cursor)
+    doctors, has_more = fetch_page(query, limit)
+    return page_response([_doctor_json(d) for d in doctors], str(doctors[-1].id) if has_more else None)
+
+def _doctors_query():
+    return Doctor.query.options(joinedload(Doctor.user)).order_by(Doctor.id)
+
+def _doctor_json(d):
+    return {
         'id': d.id, 
         'name': d.name, 
         'specialization': d.specialization,
         'department': d.department,
         'user_id': d.user_id,
         'is_blacklisted': d.user.is_blacklisted
-    } for d in doctors])
+    }
 
 @admin_bp.route('/doctors/<int:id>', methods=['PUT'])
 def update_doctor(id):
@@ -64,32 +94,36 @@ def update_doctor(id):
     doctor.specialization = data.get('specialization', doctor.specialization)
     doctor.department = data.get('department', doctor.department)
     db.session.commit()
+    catalog_cache.invalidate()
     return jsonify({'message': 'Doctor updated'}), 200
 
 @admin_bp.route('/doctors/<int:id>', methods=['DELETE'])
 def delete_doctor(id):
     doctor = Doctor.query.get_or_404(id)
-    user = User.query.get(doctor.user_id)
-    
-    # Delete all appointments and their treatments for this doctor
-    appointments = Appointment.query.filter_by(doctor_id=id).all()
-    for appointment in appointments:
-        if appointment.treatment:
-            db.session.delete(appointment.treatment)
-        db.session.delete(appointment)
-    
-    # Delete all availability slots
-    availabilities = Availability.query.filter_by(doctor_id=id).all()
-    for avail in availabilities:
-        db.session.delete(avail)
+    user_id = doctor.user_id
     
-    db.session.delete(doctor)
-    if user:
-        db.session.delete(user)
+    # Very long histories are deleted in the background; the account is
+    # disabled right away
+    if deletion.needs_background(Appointment.doctor_id == id):
+        return _deactivate_and_purge(user_id, 'purge_doctor', id)
     
-    db.session.commit()
+    deletion.purge_doctor(doctor)
+    catalog_cache.invalidate()
+    revoke_user_tokens(user_id)
     return jsonify({'message': 'Doctor deleted successfully'}), 200
 
+def _deactivate_and_purge(user_id, task_name, record_id):
+    from application import tasks
+    user = db.session.get(User, user_id)
+    user.active = False
+    db.session.commit()
+    # The catalog lists active doctors only; the purge task's own invalidation
+    # runs in the worker and does not reach this process's cache
+    catalog_cache.invalidate()
+    revoke_user_tokens(user_id)
+    task = getattr(tasks, task_name).delay(record_id)
+    return jsonify({'message': 'Account deactivated, history is being deleted', 'task_id': task.id}), 202
+
 @admin_bp.route('/patients', methods=['GET', 'POST'])
 def manage_patients():
     if request.method == 'POST':
@@ -119,15 +153,29 @@ def manage_patients():
         db.session.commit()
         return jsonify({'message': 'Patient added'}), 201
         
-    patients = Patient.query.all()
-    return jsonify([{
+    limit = get_limit()
+    query = _patients_query()
+    try:
+        cursor = id_cursor(Patient.id)
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
+    if cursor is not None:
+        query = query.filter(cursor)
+    patients, has_more = fetch_page(query, limit)
+    return page_response([_patient_json(p) for p in patients], str(patients[-1].id) if has_more else None)
+
+def _patients_query():
+    return Patient.query.options(joinedload(Patient.user)).order_by(Patient.id)
+
+def _patient_json(p):
+    return {
         'id': p.id, 
         'name': p.name,
         'dob': str(p.dob) if p.dob else None,
         'contact': p.contact,
         'user_id': p.user_id,
         'is_blacklisted': p.user.is_blacklisted
-    } for p in patients])
+    }
 
 @admin_bp.route('/patients/<int:id>', methods=['PUT'])
 def update_patient(id):
@@ -144,26 +192,38 @@ def update_patient(id):
 @admin_bp.route('/patients/<int:id>', methods=['DELETE'])
 def delete_patient(id):
     patient = Patient.query.get_or_404(id)
-    user = User.query.get(patient.user_id)
-    
-    # Delete all appointments and their treatments for this patient
-    appointments = Appointment.query.filter_by(patient_id=id).all()
-    for appointment in appointments:
-        if appointment.treatment:
-            db.session.delete(appointment.treatment)
-        db.session.delete(appointment)
+    user_id = patient.user_id
     
-    db.session.delete(patient)
-    if user:
-        db.session.delete(user)
+    if deletion.needs_background(Appointment.patient_id == id):
+        return _deactivate_and_purge(user_id, 'purge_patient', id)
     
-    db.session.commit()
+    deletion.purge_patient(patient)
+    revoke_user_tokens(user_id)
     return jsonify({'message': 'Patient deleted successfully'}), 200
 
 @admin_bp.route('/appointments', methods=['GET'])
 def get_appointments():
-    appointments = Appointment.query.all()
-    return jsonify([{
+    limit = get_limit()
+    query = _appointments_query()
+    try:
+        cursor = date_id_cursor(Appointment.date, Appointment.id, descending=True)
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
+    if cursor is not None:
+        query = query.filter(cursor)
+    appointments, has_more = fetch_page(query, limit)
+    last = appointments[-1] if has_more else None
+    return page_response([_appointment_json(a) for a in appointments], f'{last.date}_{last.id}' if last else None)
+
+def _appointments_query():
+    # Latest first, so upcoming bookings are on the first page rather than the oldest history
+    return Appointment.query.options(
+        joinedload(Appointment.doctor),
+        joinedload(Appointment.patient)
+    ).order_by(Appointment.date.desc(), Appointment.id.desc())
+
+def _appointment_json(a):
+    return {
         'id': a.id, 
         'doctor': a.doctor.name, 
         'patient': a.patient.name, 
@@ -171,11 +231,119 @@ def get_appointments():
         'time': str(a.time),
         'status': a.status,
         'reason': a.reason or 'Not specified'
-    } for a in appointments])
+    }
+
+@admin_bp.route('/dashboard', methods=['GET'])
+@cached_response(dashboard_cache)
+def get_dashboard():
+    """Totals and the first page of doctors, patients and appointments in one response.
+
+    `next` holds the cursors for ?after= on the list endpoints.
+    """
+    limit = get_limit()
+    doctors, more_doctors = fetch_page(_doctors_query(), limit)
+    patients, more_patients = fetch_page(_patients_query(), limit)
+    appointments, more_appointments = fetch_page(_appointments_query(), limit)
+    last = appointments[-1] if more_appointments else None
+    return jsonify({
+        'counts': dashboard.admin_counts(),
+        'doctors': [_doctor_json(d) for d in doctors],
+        'patients': [_patient_json(p) for p in patients],
+        'appointments': [_appointment_json(a) for a in appointments],
+        'next': {
+            'doctors': str(doctors[-1].id) if more_doctors else None,
+            'patients': str(patients[-1].id) if more_patients else None,
+            'appointments': f'{last.date}_{last.id}' if last else None
+        }
+    })
 
 @admin_bp.route('/appointments/<int:id>/cancel', methods=['PUT'])
 def cancel_appointment_admin(id):
     appointment = Appointment.query.get_or_404(id)
     appointment.status = 'Cancelled'
     db.session.commit()
+    events.appointment_changed(appointment)
     return jsonify({'message': 'Appointment cancelled'}), 200
+
+@admin_bp.route('/export-treatments', methods=['POST'])
+def trigger_bulk_export():
+    """Trigger async CSV export of every patient's treatments"""
+    from application.tasks import export_all_treatments
+    
+    compress = request.args.get('gzip', '1') == '1'
+    task = export_all_treatments.delay(compress)
+    
+    return jsonify({
+        'message': 'Export started',
+        'task_id': task.id
+    }), 202
+
+@admin_bp.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Hit and miss counters of this worker process's caches"""
+    return jsonify({
+        'catalog': catalog_cache.stats(),
+        'dashboard': dashboard_cache.stats(),
+        'auth': {'entries': len(token_cache.entries), 'hits': token_cache.hits, 'misses': token_cache.misses}
+    }), 200
+
+@admin_bp.route('/pool-stats', methods=['GET'])
+def pool_stats():
+    """Database connection pool usage of this worker process"""
+    return jsonify(pool.pool_stats(db.engine)), 200
+
+@admin_bp.route('/archive-stats', methods=['GET'])
+def archive_stats():
+    """Appointment and treatment counts in hot and archived storage"""
+    return jsonify(archive.storage_stats()), 200
+
+@admin_bp.route('/import/<kind>', methods=['POST'])
+def bulk_import(kind):
+    """Import doctors, patients or appointments from a CSV or NDJSON request body.
+
+    The body is read as a stream; the response reports per-row errors.
+    """
+    if kind not in bulk.FIELDS:
+        return jsonify({'message': f'Unknown kind: {kind}'}), 404
+    fmt = request.args.get('format') or bulk.detect_format(content_type=request.content_type)
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    report = bulk.import_records(kind, bulk.read_records(stream, fmt))
+    return jsonify(report), 200
+
+@admin_bp.route('/export/<kind>', methods=['GET'])
+def bulk_export(kind):
+    """Stream every doctor, patient or appointment as CSV or NDJSON (?format=)"""
+    if kind not in bulk.FIELDS:
+        return jsonify({'message': f'Unknown kind: {kind}'}), 404
+    fmt = 'csv' if request.args.get('format') == 'csv' else 'ndjson'
+    return Response(
+        stream_with_context(bulk.stream_export(kind, fmt)),
+        mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={kind}.{fmt}'}
+    )
+
+@admin_bp.route('/tasks/<task_id>', methods=['GET'])
+def task_status(task_id):
+    """State of a background admin job (bulk export, purge), with its progress"""
+    from application.tasks import celery
+    from celery.result import AsyncResult
+    
+    task = AsyncResult(task_id, app=celery)
+    response = {'state': task.state}
+    if task.state == 'PROGRESS':
+        response['rows'] = task.info.get('rows', 0)
+    elif task.state == 'SUCCESS':
+        response['result'] = task.result
+        if isinstance(task.result, dict) and task.result.get('filename'):
+            response['download_url'] = f"/admin/download-export/{task.result['filename']}"
+    elif task.state == 'FAILURE':
+        response['error'] = str(task.info)
+    return jsonify(response), 200
+
+@admin_bp.route('/download-export/<filename>', methods=['GET'])
+def download_export(filename):
+    """Download a bulk export (one not tied to a patient) while it is unexpired"""
+    artifact = exports.find_artifact(filename)
+    if artifact is None or artifact.patient_id is not None:
+        return jsonify({'message': 'File not found'}), 404
+    return exports.serve_artifact(artifact)
@@ -3,6 +3,7 @@ from application.models import User, Patient, Doctor
 from application.database import db
 from datetime import datetime, timedelta
 import  jwt
+from application import auth_dacorator
 
 import os
 
@@ -21,15 +22,6 @@ def generate_token(user_id, role):
     }
     return jwt.encode(payload, SECRET_KEY, algorithm='HS256')
 
-def verify_token(token):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-        return payload
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
-        return None
-
 @auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
@@ -43,6 +35,12 @@ def login():
         
         if not user.active:
             return jsonify({'message': 'Account is inactive'}), 403
+        
+        # BCRYPT_LOG_ROUNDS changed since this hash was made: upgrade it now
+        # while the plaintext is at hand
+        if user.password_needs_rehash():
+            user.set_password(password)
+            db.session.commit()
             
         # Generate JWT token
         token = generate_token(user.id, user.role)
@@ -99,10 +97,10 @@ def verify():
     
     try:
         token = auth_header.split(' ')[1]  # Bearer <token>
-        payload = verify_token(token)
-        if payload:
-            return jsonify({'valid': True, 'user_id': payload['user_id'], 'role': payload['role']}), 200
-        else:
-            return jsonify({'valid': False, 'message': 'Invalid or expired token'}), 401
-    except:
+    except IndexError:
         return jsonify({'valid': False, 'message': 'Invalid token format'}), 401
+    try:
+        user_id, role = auth_dacorator.verify_token(token)
+    except auth_dacorator.AuthError as e:
+        return jsonify({'valid': False, 'message': str(e)}), 401
+    return jsonify({'valid': True, 'user_id': user_id, 'role': role}), 200
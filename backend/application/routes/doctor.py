@@ -1,48 +1,102 @@
 from flask import Blueprint, jsonify, request
-from application.models import Appointment, Treatment, Availability, Patient, Doctor, User
+from application.models import Appointment, Treatment, Availability, Patient, Doctor, User, ScheduleRule, ScheduleException, TreatmentArchive
 from application.database import db
 from datetime import datetime, date, timedelta
-from collections import Counter
-from flask import render_template
 from flask_mail import Message
 from application.tasks import mail
+from application import reports, schedule, archive, availability, dashboard, events
+from application.cache import dashboard_cache, cached_response
+from application.pagination import InvalidCursor, get_limit, id_cursor, date_id_cursor, fetch_page, page_response
 
 doctor_bp = Blueprint('doctor', __name__)
 
-@doctor_bp.route('/appointments/<int:doctor_id>', methods=['GET'])
-def get_appointments(doctor_id):
-    appointments = Appointment.query.filter_by(doctor_id=doctor_id, status='Booked').order_by(Appointment.date).all()
-    return jsonify([{
+def _appointment_json(a):
+    return {
         'id': a.id, 
         'patient': a.patient.name, 
         'date': str(a.date), 
         'time': str(a.time),
         'reason': a.reason or 'Not specified'
-    } for a in appointments])
+    }
+
+def _paged():
+    """Whether a list request asked for a page (?limit= or ?after=) rather than everything"""
+    return 'limit' in request.args or 'after' in request.args
+
+@doctor_bp.route('/appointments/<int:doctor_id>', methods=['GET'])
+def get_appointments(doctor_id):
+    query = dashboard.booked_appointments(doctor_id)
+    if not _paged():
+        return jsonify([_appointment_json(a) for a in query.all()])
+    try:
+        cursor = date_id_cursor(Appointment.date, Appointment.id)
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
+    if cursor is not None:
+        query = query.filter(cursor)
+    appointments, has_more = fetch_page(query, get_limit())
+    last = appointments[-1] if has_more else None
+    return page_response([_appointment_json(a) for a in appointments], f'{last.date}_{last.id}' if last else None)
 
 @doctor_bp.route('/assigned_patients/<int:doctor_id>', methods=['GET'])
 def get_assigned_patients(doctor_id):
-    # Get patients who have at least one appointment with this doctor
-    appointments = Appointment.query.filter_by(doctor_id=doctor_id).all()
-    patient_ids = set([a.patient_id for a in appointments])
-    patients = Patient.query.filter(Patient.id.in_(patient_ids)).all()
-    return jsonify([{'id': p.id, 'name': p.name} for p in patients])
+    query = dashboard.assigned_patients(doctor_id)
+    if not _paged():
+        return jsonify([{'id': p.id, 'name': p.name} for p in query.all()])
+    try:
+        cursor = id_cursor(Patient.id)
+    except InvalidCursor as e:
+        return jsonify({'message': str(e)}), 400
+    if cursor is not None:
+        query = query.filter(cursor)
+    patients, has_more = fetch_page(query, get_limit())
+    return page_response([{'id': p.id, 'name': p.name} for p in patients], str(patients[-1].id) if has_more else None)
+
+@doctor_bp.route('/dashboard/<int:doctor_id>', methods=['GET'])
+@cached_response(dashboard_cache)
+def get_dashboard(doctor_id):
+    """Counts, the first page of booked appointments and of assigned patients, and the
+    slots in the ?from=&to= window, in one response.
+
+    `next` holds the cursors for ?after= on /appointments and /assigned_patients.
+    """
+    try:
+        start, end, _ = availability.get_window()
+    except availability.InvalidWindow as e:
+        return jsonify({'message': str(e)}), 400
+    limit = get_limit()
+    appointments, more_appointments = fetch_page(dashboard.booked_appointments(doctor_id), limit)
+    patients, more_patients = fetch_page(dashboard.assigned_patients(doctor_id), limit)
+    slots = availability.doctor_slots(doctor_id, start, end)
+    last = appointments[-1] if more_appointments else None
+    return jsonify({
+        'counts': dict(dashboard.doctor_counts(doctor_id),
+                       free_slots=slots['is_booked'].count(False)),
+        'appointments': [_appointment_json(a) for a in appointments],
+        'patients': [{'id': p.id, 'name': p.name} for p in patients],
+        'from': str(start),
+        'to': str(end),
+        'slots': slots,
+        'next': {
+            'appointments': f'{last.date}_{last.id}' if last else None,
+            'patients': str(patients[-1].id) if more_patients else None
+        }
+    })
 
 @doctor_bp.route('/patient_history/<int:patient_id>', methods=['GET'])
 def get_patient_history(patient_id):
-    appointments = Appointment.query.filter_by(patient_id=patient_id, status='Completed').all()
     history = []
-    for app in appointments:
-        if app.treatment:
-            history.append({
-                'id': app.treatment.id,  # Added treatment ID for editing
-                'appointment_id': app.id,
-                'date': str(app.date),
-                'doctor': app.doctor.name,
-                'diagnosis': app.treatment.diagnosis,
-                'prescription': app.treatment.prescription,
-                'notes': app.treatment.notes
-            })
+    for row in archive.treatment_history(patient_id):
+        history.append({
+            'id': row.treatment_id,  # Added treatment ID for editing
+            'appointment_id': row.appointment_id,
+            'date': str(row.date),
+            'doctor': row.doctor,
+            'diagnosis': row.diagnosis,
+            'prescription': row.prescription,
+            'notes': row.notes,
+            'archived': bool(row.archived)  # archived records are read-only
+        })
     return jsonify(history)
 
 @doctor_bp.route('/availability', methods=['POST'])
@@ -60,6 +114,7 @@ def add_availability():
     avail = Availability(doctor_id=doctor_id, date=date_obj, start_time=start_time_obj, end_time=end_time_obj)
     db.session.add(avail)
     db.session.commit()
+    events.publish(events.slot_event(avail.doctor_id, date_obj, start_time_obj))
     return jsonify({'message': 'Availability added'}), 201
 
 @doctor_bp.route('/availability/<int:doctor_id>/<date>/<time>', methods=['DELETE'])
@@ -79,9 +134,127 @@ def remove_availability(doctor_id, date, time):
     if avail:
         db.session.delete(avail)
         db.session.commit()
+        events.publish(events.slot_event(doctor_id, date_obj, time_obj))
         return jsonify({'message': 'Availability removed'}), 200
-    else:
-        return jsonify({'message': 'Slot not found or already booked'}), 404
+    
+    # A slot from the weekly schedule is removed by an exception for its time
+    scheduled = schedule.scheduled_slot(doctor_id, date_obj, time_obj)
+    if scheduled and not Availability.query.filter_by(doctor_id=doctor_id, date=date_obj, start_time=time_obj).first():
+        db.session.add(ScheduleException(doctor_id=doctor_id, date=date_obj,
+                                         start_time=scheduled[0], end_time=scheduled[1]))
+        db.session.commit()
+        events.publish(events.slot_event(doctor_id, date_obj, time_obj))
+        return jsonify({'message': 'Availability removed'}), 200
+    return jsonify({'message': 'Slot not found or already booked'}), 404
+
+def _rule_json(rule):
+    return {
+        'id': rule.id,
+        'weekday': rule.weekday,
+        'start_time': rule.start_time.strftime('%H:%M'),
+        'end_time': rule.end_time.strftime('%H:%M'),
+        'slot_minutes': rule.slot_minutes,
+        'valid_from': str(rule.valid_from),
+        'valid_until': str(rule.valid_until) if rule.valid_until else None
+    }
+
+@doctor_bp.route('/schedule/<int:doctor_id>', methods=['GET'])
+def get_schedule(doctor_id):
+    """Weekly rules and upcoming exceptions of a doctor"""
+    rules = ScheduleRule.query.filter_by(doctor_id=doctor_id).order_by(ScheduleRule.weekday, ScheduleRule.start_time).all()
+    exceptions = ScheduleException.query.filter(
+        ScheduleException.doctor_id == doctor_id,
+        ScheduleException.date >= date.today()
+    ).order_by(ScheduleException.date).all()
+    return jsonify({
+        'rules': [_rule_json(r) for r in rules],
+        'exceptions': [{
+            'id': e.id,
+            'date': str(e.date),
+            'start_time': e.start_time.strftime('%H:%M') if e.start_time else None,
+            'end_time': e.end_time.strftime('%H:%M') if e.end_time else None
+        } for e in exceptions]
+    })
+
+@doctor_bp.route('/schedule', methods=['POST'])
+def add_schedule_rule():
+    """Publish weekly hours, e.g. {"doctor_id": 1, "weekdays": [0, 2], "start_time": "09:00",
+    "end_time": "13:00", "slot_minutes": 15, "valid_from": "2025-01-06", "valid_until": null}"""
+    data = request.get_json()
+    try:
+        weekdays = data.get('weekdays', [data.get('weekday')])
+        start_time_obj = datetime.strptime(data.get('start_time'), '%H:%M').time()
+        end_time_obj = datetime.strptime(data.get('end_time'), '%H:%M').time()
+        slot_minutes = int(data.get('slot_minutes', 60))
+        valid_from = datetime.strptime(data['valid_from'], '%Y-%m-%d').date() if data.get('valid_from') else date.today()
+        valid_until = datetime.strptime(data['valid_until'], '%Y-%m-%d').date() if data.get('valid_until') else None
+        weekdays = [int(w) for w in weekdays]
+    except (TypeError, ValueError):
+        return jsonify({'message': 'Invalid schedule rule'}), 400
+    if not weekdays or any(w < 0 or w > 6 for w in weekdays) or slot_minutes <= 0 or end_time_obj <= start_time_obj:
+        return jsonify({'message': 'Invalid schedule rule'}), 400
+    
+    rules = [ScheduleRule(doctor_id=data.get('doctor_id'), weekday=w, start_time=start_time_obj,
+                          end_time=end_time_obj, slot_minutes=slot_minutes,
+                          valid_from=valid_from, valid_until=valid_until) for w in weekdays]
+    db.session.add_all(rules)
+    db.session.commit()
+    events.publish(events.schedule_event(rules[0].doctor_id))
+    return jsonify({'message': 'Schedule added', 'rules': [_rule_json(r) for r in rules]}), 201
+
+@doctor_bp.route('/schedule/rules/<int:rule_id>', methods=['DELETE'])
+def delete_schedule_rule(rule_id):
+    """Stop a rule; slots already booked from it are stored and stay booked"""
+    rule = ScheduleRule.query.get_or_404(rule_id)
+    doctor_id = rule.doctor_id
+    db.session.delete(rule)
+    db.session.commit()
+    events.publish(events.schedule_event(doctor_id))
+    return jsonify({'message': 'Schedule rule removed'}), 200
+
+@doctor_bp.route('/schedule/exceptions', methods=['POST'])
+def add_schedule_exception():
+    """Block a day, or a time range on it when start_time and end_time are given"""
+    data = request.get_json()
+    try:
+        date_obj = datetime.strptime(data.get('date'), '%Y-%m-%d').date()
+        start_time_obj = datetime.strptime(data['start_time'], '%H:%M').time() if data.get('start_time') else None
+        end_time_obj = datetime.strptime(data['end_time'], '%H:%M').time() if data.get('end_time') else None
+    except (TypeError, ValueError):
+        return jsonify({'message': 'Invalid exception'}), 400
+    if (start_time_obj is None) != (end_time_obj is None):
+        return jsonify({'message': 'Give both start_time and end_time, or neither'}), 400
+    
+    exception = ScheduleException(doctor_id=data.get('doctor_id'), date=date_obj,
+                                  start_time=start_time_obj, end_time=end_time_obj)
+    db.session.add(exception)
+    db.session.commit()
+    events.publish(events.schedule_event(exception.doctor_id))
+    return jsonify({'message': 'Exception added'}), 201
+
+@doctor_bp.route('/schedule/exceptions/<int:exception_id>', methods=['DELETE'])
+def delete_schedule_exception(exception_id):
+    exception = ScheduleException.query.get_or_404(exception_id)
+    doctor_id = exception.doctor_id
+    db.session.delete(exception)
+    db.session.commit()
+    events.publish(events.schedule_event(doctor_id))
+    return jsonify({'message': 'Exception removed'}), 200
+
+@doctor_bp.route('/schedule/materialize', methods=['POST'])
+def materialize_schedule():
+    """Store the scheduled slots of a date range as Availability rows, in one bulk insert"""
+    data = request.get_json()
+    try:
+        start = datetime.strptime(data.get('from'), '%Y-%m-%d').date()
+        end = datetime.strptime(data.get('to'), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return jsonify({'message': 'from and to must be YYYY-MM-DD dates'}), 400
+    if end < start:
+        return jsonify({'message': 'to must not be before from'}), 400
+    
+    added = schedule.materialize(data.get('doctor_id'), start, end)
+    return jsonify({'message': f'{added} slots stored', 'added': added}), 201
 
 @doctor_bp.route('/appointments/<int:id>/cancel', methods=['PUT'])
 def cancel_appointment(id):
@@ -100,6 +273,7 @@ def cancel_appointment(id):
         
     appointment.status = 'Cancelled'
     db.session.commit()
+    events.appointment_changed(appointment)
     return jsonify({'message': 'Appointment cancelled and slot freed'}), 200
 
 @doctor_bp.route('/treatment', methods=['POST'])
@@ -115,13 +289,18 @@ def add_treatment():
     appointment = Appointment.query.get(appointment_id)
     appointment.status = 'Completed'
     db.session.commit()
+    events.publish(events.appointment_event(appointment))
     
     return jsonify({'message': 'Treatment added'}), 201
 
 @doctor_bp.route('/treatment/<int:treatment_id>', methods=['PUT'])
 def update_treatment(treatment_id):
     """Update existing treatment record"""
-    treatment = Treatment.query.get_or_404(treatment_id)
+    treatment = db.session.get(Treatment, treatment_id)
+    if not treatment:
+        if db.session.get(TreatmentArchive, treatment_id):
+            return jsonify({'message': 'Archived treatments cannot be edited'}), 409
+        return jsonify({'message': 'Treatment not found'}), 404
     data = request.get_json()
     
     # Update treatment fields
@@ -141,83 +320,38 @@ def generate_monthly_report(doctor_id):
     try:
         doctor = Doctor.query.get_or_404(doctor_id)
         
-        # Calculate last month's date range
-        today = date.today()
-        first_day_this_month = today.replace(day=1)
-        last_day_last_month = first_day_this_month - timedelta(days=1)
-        first_day_last_month = last_day_last_month.replace(day=1)
+        # Last month up to today
+        first_day_last_month, last_day_last_month = reports.last_month_range()
         month_year = last_day_last_month.strftime('%B %Y')
         
-        # Get appointments for last month
-        appointments = Appointment.query.filter(
-            Appointment.doctor_id == doctor.id,
-            Appointment.date >= first_day_last_month,
-            Appointment.date <= today
-        ).all()
+        report = reports.monthly_doctor_reports(first_day_last_month, date.today(), [doctor.id]).get(doctor.id)
         
-        if not appointments:
+        if not report:
             return jsonify({
                 'message': f'No appointments found for {month_year}',
                 'status': 'info'
             }), 200
         
-        # Calculate statistics
-        total_appointments = len(appointments)
-        completed = sum(1 for a in appointments if a.status == 'Completed')
-        cancelled = sum(1 for a in appointments if a.status == 'Cancelled')
-        
-        # Get diagnoses from treatments
-        diagnoses = []
-        for apt in appointments:
-            if apt.treatment and apt.treatment.diagnosis:
-                diagnoses.append(apt.treatment.diagnosis)
-        
-        diagnosis_counts = Counter(diagnoses)
-        top_diagnoses = [{'name': d, 'count': c} for d, c in diagnosis_counts.most_common(5)]
-        
-        # Prepare appointment data for table
-        apt_data = []
-        for apt in appointments[:20]:  # Limit to 20 for email
-            diagnosis = apt.treatment.diagnosis if apt.treatment else 'N/A'
-            apt_data.append({
-                'date': apt.date.strftime('%Y-%m-%d'),
-                'patient': apt.patient.name,
-                'diagnosis': diagnosis,
-                'status': apt.status
-            })
-        
-        # Get doctor email
-        user = User.query.get(doctor.user_id)
-        if not user or not user.username:
+        if not report['username']:
             return jsonify({'message': 'Doctor email not found'}), 404
         
-        # Render email template
-        html_body = render_template('email/monthly_report.html',
-            doctor_name=doctor.name,
-            month_year=month_year,
-            total_appointments=total_appointments,
-            completed_appointments=completed,
-            cancelled_appointments=cancelled,
-            appointments=apt_data,
-            diagnoses=top_diagnoses,
-            report_date=datetime.now().strftime('%B %d, %Y')
-        )
+        html_body = reports.render_monthly_report(report, month_year)
         
         # Send email
         msg = Message(
             subject=f'Monthly Activity Report - {month_year}',
-            recipients=[user.username],
+            recipients=[report['username']],
             html=html_body
         )
         mail.send(msg)
         
         return jsonify({
-            'message': f'Monthly report for {month_year} sent successfully to {user.username}',
+            'message': f'Monthly report for {month_year} sent successfully to {report["username"]}',
             'status': 'success',
             'stats': {
-                'total': total_appointments,
-                'completed': completed,
-                'cancelled': cancelled,
+                'total': report['total_appointments'],
+                'completed': report['completed_appointments'],
+                'cancelled': report['cancelled_appointments'],
                 'month': month_year
             }
         }), 200
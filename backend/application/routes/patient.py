@@ -1,28 +1,55 @@
-from flask import Blueprint, jsonify, request
+from functools import wraps
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from application.models import Doctor, Appointment, Availability, Patient, User
 from application.database import db
-from datetime import datetime
+from application import availability, booking, exports, search, archive, events
+from application.pagination import get_limit
+from application.booking import SlotUnavailable
+from application.cache import catalog_cache, cached_response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
+import application.config as config
 
 patient_bp = Blueprint('patient', __name__)
 
+
+def _caller_patient_id():
+    """Id of the signed-in user's Patient, or None"""
+    return db.session.query(Patient.id).filter_by(user_id=request.user_id).scalar()
+
+
+def _listed_doctors():
+    """Doctors shown in the catalog: those whose account is active (deleted ones are deactivated first)"""
+    return Doctor.query.join(Doctor.user).filter(User.active.is_(True))
+
+
+def own_records(f):
+    """Allow a view taking patient_id only for that patient, or a doctor or admin"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if request.user_role not in ('doctor', 'admin') and kwargs['patient_id'] != _caller_patient_id():
+            return jsonify({'message': 'Insufficient permissions'}), 403
+        return f(*args, **kwargs)
+    return decorated
+
+
 @patient_bp.route('/departments', methods=['GET'])
+@cached_response(catalog_cache)
 def get_departments():
     
-    doctors = Doctor.query.with_entities(Doctor.department).distinct().all()
+    doctors = _listed_doctors().with_entities(Doctor.department).distinct().all()
     departments = [d.department for d in doctors if d.department]
     return jsonify(departments)
 
 @patient_bp.route('/search', methods=['GET'])
+@cached_response(catalog_cache)
 def search_doctors():
-    query = request.args.get('q', '').lower()
-    if not query:
+    query = request.args.get('q', '')
+    if not query.strip():
         return jsonify([])
     
-    doctors = Doctor.query.filter(
-        (Doctor.name.ilike(f'%{query}%')) | 
-        (Doctor.department.ilike(f'%{query}%')) |
-        (Doctor.specialization.ilike(f'%{query}%'))
-    ).all()
+    doctors = search.search('doctor', query, get_limit(), base=_listed_doctors())
     
     return jsonify([{
         'id': d.id, 
@@ -32,21 +59,42 @@ def search_doctors():
     } for d in doctors])
 
 @patient_bp.route('/department/<string:department>/doctors', methods=['GET'])
+@cached_response(catalog_cache)
 def get_doctors_by_department(department):
-    doctors = Doctor.query.filter_by(department=department).all()
+    doctors = _listed_doctors().filter(Doctor.department == department).all()
     return jsonify([{'id': d.id, 'name': d.name, 'specialization': d.specialization} for d in doctors])
 
 @patient_bp.route('/doctor/<int:doctor_id>/availability', methods=['GET'])
 def get_doctor_availability(doctor_id):
+    """Slots in the ?from=&to= window (default: the next AVAILABILITY_DEFAULT_DAYS), as parallel arrays"""
+    try:
+        start, end, only_free = availability.get_window()
+    except availability.InvalidWindow as e:
+        return jsonify({'message': str(e)}), 400
     
-    slots = Availability.query.filter_by(doctor_id=doctor_id).all()
-    return jsonify([{
-        'id': s.id, 
-        'date': str(s.date), 
-        'start_time': str(s.start_time), 
-        'end_time': str(s.end_time),
-        'is_booked': s.is_booked
-    } for s in slots])
+    return jsonify({
+        'doctor_id': doctor_id,
+        'from': str(start),
+        'to': str(end),
+        'slots': availability.doctor_slots(doctor_id, start, end, only_free)
+    })
+
+@patient_bp.route('/department/<string:department>/availability', methods=['GET'])
+def get_department_availability(department):
+    """Doctors of a department and all their slots in the window, in one round trip"""
+    try:
+        start, end, only_free = availability.get_window()
+    except availability.InvalidWindow as e:
+        return jsonify({'message': str(e)}), 400
+    
+    doctors = _listed_doctors().filter(Doctor.department == department).order_by(Doctor.id).all()
+    return jsonify({
+        'department': department,
+        'from': str(start),
+        'to': str(end),
+        'doctors': [{'id': d.id, 'name': d.name, 'specialization': d.specialization} for d in doctors],
+        'slots': availability.department_slots([d.id for d in doctors], start, end, only_free)
+    })
 
 @patient_bp.route('/book_slot', methods=['POST'])
 def book_slot():
@@ -55,21 +103,12 @@ def book_slot():
     patient_id = data.get('patient_id')
     reason = data.get('reason', '')
     
-    slot = Availability.query.get_or_404(slot_id)
-    if slot.is_booked:
-        return jsonify({'message': 'Slot already booked'}), 400
-        
-    slot.is_booked = True
-    
-    appointment = Appointment(
-        doctor_id=slot.doctor_id, 
-        patient_id=patient_id, 
-        date=slot.date, 
-        time=slot.start_time,
-        reason=reason
-    )
-    db.session.add(appointment)
-    db.session.commit()
+    try:
+        appointment = booking.book_slot(slot_id, patient_id, reason)
+    except SlotUnavailable as e:
+        Availability.query.get_or_404(slot_id)
+        return jsonify({'message': str(e)}), 400
+    events.appointment_changed(appointment)
     
     # Send confirmation email
     from application.tasks import send_booking_confirmation
@@ -78,8 +117,9 @@ def book_slot():
     return jsonify({'message': 'Appointment booked successfully'}), 201
 
 @patient_bp.route('/doctors', methods=['GET'])
+@cached_response(catalog_cache)
 def get_doctors():
-    doctors = Doctor.query.all()
+    doctors = _listed_doctors().all()
     return jsonify([{'id': d.id, 'name': d.name, 'specialization': d.specialization} for d in doctors])
 
 @patient_bp.route('/book', methods=['POST'])
@@ -89,13 +129,16 @@ def book_appointment():
     patient_id = data.get('patient_id') 
     date_str = data.get('date')
     time_str = data.get('time')
+    reason = data.get('reason', '')
     
     date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
     time_obj = datetime.strptime(time_str, '%H:%M').time()
     
-    appointment = Appointment(doctor_id=doctor_id, patient_id=patient_id, date=date_obj, time=time_obj)
-    db.session.add(appointment)
-    db.session.commit()
+    try:
+        appointment = booking.book_time(doctor_id, patient_id, date_obj, time_obj, reason)
+    except SlotUnavailable as e:
+        return jsonify({'message': str(e)}), 400
+    events.appointment_changed(appointment)
     
     # Send confirmation email
     from application.tasks import send_booking_confirmation
@@ -104,8 +147,10 @@ def book_appointment():
     return jsonify({'message': 'Appointment booked'}), 201
 
 @patient_bp.route('/appointments/<int:patient_id>', methods=['GET'])
+@own_records
 def get_appointments(patient_id):
-    appointments = Appointment.query.filter_by(patient_id=patient_id).order_by(Appointment.date.desc()).all()
+    appointments = (Appointment.query.options(joinedload(Appointment.doctor))
+                    .filter_by(patient_id=patient_id).order_by(Appointment.date.desc()).all())
     return jsonify([{
         'id': a.id, 
         'doctor': a.doctor.name, 
@@ -132,37 +177,56 @@ def cancel_appointment(id):
         
     appointment.status = 'Cancelled'
     db.session.commit()
+    events.appointment_changed(appointment)
     return jsonify({'message': 'Appointment cancelled and slot freed'}), 200
 
 @patient_bp.route('/history/<int:patient_id>', methods=['GET'])
+@own_records
 def get_history(patient_id):
-    
-    appointments = Appointment.query.filter_by(patient_id=patient_id, status='Completed').all()
+    """Treatment history from the hot tables and the archive"""
     history = []
-    for app in appointments:
-        if app.treatment:
-            history.append({
-                'date': str(app.date),
-                'doctor': app.doctor.name,
-                'diagnosis': app.treatment.diagnosis,
-                'prescription': app.treatment.prescription
-            })
+    for row in archive.treatment_history(patient_id):
+        history.append({
+            'date': str(row.date),
+            'doctor': row.doctor,
+            'diagnosis': row.diagnosis,
+            'prescription': row.prescription
+        })
     return jsonify(history)
 
 
 @patient_bp.route('/export-treatments/<int:patient_id>', methods=['POST'])
+@own_records
 def trigger_export(patient_id):
     """Trigger async CSV export job"""
     from application.tasks import export_patient_treatments
     
+    # Small exports skip Celery: the client downloads them straight away
+    if exports.count_rows(exports.treatment_rows(patient_id)) <= config.EXPORT_STREAM_MAX_ROWS:
+        return jsonify({
+            'message': 'Export ready',
+            'download_url': f'/patient/export-treatments/{patient_id}/stream'
+        }), 200
     
-    task = export_patient_treatments.delay(patient_id)
+    compress = request.args.get('gzip') == '1'
+    task = export_patient_treatments.delay(patient_id, compress)
     
     return jsonify({
         'message': 'Export started',
         'task_id': task.id
     }), 202
 
+@patient_bp.route('/export-treatments/<int:patient_id>/stream', methods=['GET'])
+@own_records
+def stream_export(patient_id):
+    """Stream the CSV export in the response, without a background job"""
+    Patient.query.get_or_404(patient_id)
+    return Response(
+        stream_with_context(exports.stream_csv(exports.treatment_rows(patient_id))),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=patient_{patient_id}_treatments.csv'}
+    )
+
 @patient_bp.route('/export-status/<task_id>', methods=['GET'])
 def check_export_status(task_id):
     from application.tasks import export_patient_treatments
@@ -180,6 +244,12 @@ def check_export_status(task_id):
             'state': task.state,
             'result': task.result
         }
+    elif task.state == 'PROGRESS':
+        response = {
+            'state': task.state,
+            'status': 'Processing...',
+            'rows': task.info.get('rows', 0)
+        }
     elif task.state == 'FAILURE':
         response = {
             'state': task.state,
@@ -195,41 +265,18 @@ def check_export_status(task_id):
 
 @patient_bp.route('/download-export/<filename>', methods=['GET'])
 def download_export(filename):
-    """Download exported CSV file"""
-    from flask import send_from_directory
-    import application.config as config
-    import os
-    
-    import sys
-    
-    sys.stderr.write(f"=== DOWNLOAD REQUEST ===\n")
-    sys.stderr.write(f"Requested filename: {filename}\n")
-    sys.stderr.write(f"EXPORT_FOLDER: {config.EXPORT_FOLDER}\n")
-    
-    filepath = os.path.join(config.EXPORT_FOLDER, filename)
-    sys.stderr.write(f"Full filepath: {filepath}\n")
-    sys.stderr.write(f"File exists: {os.path.exists(filepath)}\n")
-    
-    if os.path.exists(config.EXPORT_FOLDER):
-        sys.stderr.write(f"Files in export folder:\n")
-        files = os.listdir(config.EXPORT_FOLDER)
-        for f in files:
-            sys.stderr.write(f"  - {f}\n")
-    else:
-        sys.stderr.write(f"Export folder does not exist!\n")
-    
-    sys.stderr.write(f"========================\n")
-    sys.stderr.flush()
-    
-    if not os.path.exists(filepath):
-        return jsonify({'message': 'File not found', 'debug_path': filepath}), 404
-    
-    return send_from_directory(config.EXPORT_FOLDER, filename, as_attachment=True)
-    
-    if not os.path.exists(filepath):
+    """Download exported CSV file.
+
+    Only indexed, unexpired artifacts are served. Export names are
+    content-addressed, so the digest is a strong ETag and the file never
+    changes: conditional and Range requests are honoured.
+    """
+    artifact = exports.find_artifact(filename)
+    # Only the caller's own exports; bulk exports have no patient and are never served here
+    if artifact is None or artifact.patient_id is None or artifact.patient_id != _caller_patient_id():
         return jsonify({'message': 'File not found'}), 404
-    
-    return send_from_directory(config.EXPORT_FOLDER, filename, as_attachment=True)
+    return exports.serve_artifact(artifact)
+
 def manage_profile(patient_id):
     patient = Patient.query.get_or_404(patient_id)
     
@@ -269,10 +316,16 @@ def reschedule_appointment(appointment_id):
     if new_time_str:
         appointment.time = datetime.strptime(new_time_str, '%H:%M').time()
     
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'Slot already booked'}), 400
+    events.publish(events.appointment_event(appointment))
     return jsonify({'message': 'Appointment rescheduled successfully'}), 200
 
 @patient_bp.route('/profile/<int:patient_id>', methods=['GET'])
+@own_records
 def get_patient_profile(patient_id):
     """Get patient profile information"""
     patient = Patient.query.get_or_404(patient_id)
@@ -286,6 +339,7 @@ def get_patient_profile(patient_id):
     })
 
 @patient_bp.route('/profile/<int:patient_id>', methods=['PUT'])
+@own_records
 def update_patient_profile(patient_id):
     """Update patient profile information"""
     data = request.get_json()
@@ -0,0 +1,124 @@
+"""Recurring weekly schedules.
+
+A doctor's free slots are computed from their ScheduleRules for the window
+being viewed, minus ScheduleExceptions. Only booked slots (or slots pre-
+expanded on request) are stored as Availability rows, and a stored row for
+a time always takes precedence over the computed one.
+"""
+import csv
+import io
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert
+from application.models import Availability, ScheduleRule, ScheduleException
+from application.database import db
+
+
+def rules_in_window(doctor_ids, start, end):
+    return db.session.execute(
+        select(ScheduleRule).where(
+            ScheduleRule.doctor_id.in_(doctor_ids),
+            ScheduleRule.valid_from <= end,
+            (ScheduleRule.valid_until == None) | (ScheduleRule.valid_until >= start),
+        )
+    ).scalars().all()
+
+
+def exceptions_in_window(doctor_ids, start, end):
+    """{(doctor_id, date): [(start_time, end_time), ...]}; (None, None) blocks the day"""
+    blocked = defaultdict(list)
+    for exc in db.session.execute(
+        select(ScheduleException).where(
+            ScheduleException.doctor_id.in_(doctor_ids),
+            ScheduleException.date.between(start, end),
+        )
+    ).scalars():
+        blocked[(exc.doctor_id, exc.date)].append((exc.start_time, exc.end_time))
+    return blocked
+
+
+def _is_blocked(blocks, slot_start, slot_end):
+    for block_start, block_end in blocks:
+        if block_start is None or (slot_start < block_end and block_start < slot_end):
+            return True
+    return False
+
+
+def _rule_slots(rule, day):
+    step = timedelta(minutes=rule.slot_minutes)
+    current = datetime.combine(day, rule.start_time)
+    close = datetime.combine(day, rule.end_time)
+    while current + step <= close:
+        yield current.time(), (current + step).time()
+        current += step
+
+
+def expand(doctor_ids, start, end):
+    """Computed slots as (doctor_id, date, start_time, end_time), in date and time order per doctor"""
+    rules = rules_in_window(doctor_ids, start, end)
+    if not rules:
+        return []
+    blocked = exceptions_in_window(doctor_ids, start, end)
+    by_weekday = defaultdict(list)
+    for rule in rules:
+        by_weekday[rule.weekday].append(rule)
+
+    slots = []
+    day = start
+    while day <= end:
+        for rule in by_weekday.get(day.weekday(), ()):
+            if day < rule.valid_from or (rule.valid_until and day > rule.valid_until):
+                continue
+            blocks = blocked.get((rule.doctor_id, day), ())
+            for slot_start, slot_end in _rule_slots(rule, day):
+                if not _is_blocked(blocks, slot_start, slot_end):
+                    slots.append((rule.doctor_id, day, slot_start, slot_end))
+        day += timedelta(days=1)
+    slots.sort()
+    return slots
+
+
+def scheduled_slot(doctor_id, date, time):
+    """(start_time, end_time) of the computed slot starting at time, or None"""
+    for _, _, slot_start, slot_end in expand([doctor_id], date, date):
+        if slot_start == time:
+            return slot_start, slot_end
+    return None
+
+
+def _bulk_insert(rows):
+    """Insert Availability rows: COPY on PostgreSQL/psycopg2, a batched executemany elsewhere"""
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            (r['doctor_id'], r['date'], r['start_time'], r['end_time'], r['is_booked']) for r in rows
+        )
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        cursor.copy_expert(
+            "COPY availability (doctor_id, date, start_time, end_time, is_booked) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    else:
+        db.session.execute(insert(Availability), rows)
+
+
+def materialize(doctor_id, start, end):
+    """Store the computed slots of a window as free Availability rows; returns how many were added"""
+    existing = set(db.session.execute(
+        select(Availability.date, Availability.start_time).where(
+            Availability.doctor_id == doctor_id,
+            Availability.date.between(start, end),
+        )
+    ).tuples())
+    rows = [
+        {'doctor_id': doctor_id, 'date': day, 'start_time': slot_start,
+         'end_time': slot_end, 'is_booked': False}
+        for _, day, slot_start, slot_end in expand([doctor_id], start, end)
+        if (day, slot_start) not in existing
+    ]
+    if rows:
+        _bulk_insert(rows)
+    db.session.commit()
+    return len(rows)
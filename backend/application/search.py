@@ -0,0 +1,222 @@
+"""Ranked, typo-tolerant name search over doctors and patients.
+
+PostgreSQL uses pg_trgm GIN indexes; SQLite uses FTS5 tables with the
+trigram tokenizer, kept in sync with their source table by triggers. Both
+match substrings through the index, and fall back to trigram similarity
+when a query has a typo (on SQLite, over a bounded scan of the table,
+since a transposed word may share no trigram with its match). Other databases get an unindexed LIKE scan.
+"""
+import re
+from difflib import SequenceMatcher
+from sqlalchemy import text
+from application.models import Doctor, Patient
+from application.database import db
+import application.config as config
+
+# Searched columns per table; nullable ones are coalesced to ''
+SEARCH_COLUMNS = {
+    'doctor': ('name', 'department', 'specialization'),
+    'patient': ('name',),
+}
+
+MODELS = {'doctor': Doctor, 'patient': Patient}
+
+# Below this length a query has no trigrams and is matched as a name prefix
+MIN_TRIGRAM_LENGTH = 3
+
+# Similarity a fuzzy match must reach (see `similarity`)
+FUZZY_THRESHOLD = 0.5
+
+# Per-word spelling similarity that counts as the same word ("alcie" and "alice" score 0.8)
+WORD_THRESHOLD = 0.75
+
+
+def is_search_object(name):
+    """True for the FTS tables and trigram indexes managed here, not by the models"""
+    return any(name.startswith(f'{table}_fts') or name == f'ix_{table}_search_trgm'
+               for table in SEARCH_COLUMNS)
+
+
+def _search_expression(table):
+    parts = [f"coalesce({table}.{column}, '')" for column in SEARCH_COLUMNS[table]]
+    return 'lower(' + " || ' ' || ".join(parts) + ')'
+
+
+def sqlite_ddl(table):
+    """Statements creating the FTS5 index of a table and its sync triggers"""
+    columns = SEARCH_COLUMNS[table]
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{c}' for c in columns)
+    old_values = ', '.join(f'old.{c}' for c in columns)
+    fts = f'{table}_fts'
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{table}', "
+        f"content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def sqlite_triggers(table):
+    """Only the trigger statements, to restore them after a batch table rebuild"""
+    return [stmt for stmt in sqlite_ddl(table) if stmt.startswith('CREATE TRIGGER')]
+
+
+def postgresql_ddl(table):
+    return [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f"CREATE INDEX ix_{table}_search_trgm ON {table} "
+        f"USING gin (({_search_expression(table)}) gin_trgm_ops)",
+    ]
+
+
+def drop_ddl(table, dialect):
+    if dialect == 'sqlite':
+        return [f"DROP TABLE IF EXISTS {table}_fts"] + [
+            f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}" for suffix in ('ai', 'ad', 'au')
+        ]
+    if dialect == 'postgresql':
+        return [f"DROP INDEX IF EXISTS ix_{table}_search_trgm"]
+    return []
+
+
+def create_ddl(table, dialect):
+    if dialect == 'sqlite':
+        return sqlite_ddl(table)
+    if dialect == 'postgresql':
+        return postgresql_ddl(table)
+    return []
+
+
+def trigrams(value):
+    """Trigrams of each word padded as pg_trgm does, so short words with a typo still overlap"""
+    grams = set()
+    for word in re.findall(r'\w+', value.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(query, value):
+    """How well value matches query, from 0 to 1.
+
+    The better of the share of the query's trigrams found in value, and the
+    share of the query's words with a close spelling in value (difflib
+    ratio of at least WORD_THRESHOLD), which also catches transpositions.
+    """
+    grams = trigrams(query)
+    if not grams:
+        return 0
+    score = len(grams & trigrams(value)) / len(grams)
+    words = re.findall(r'\w+', query.lower())
+    candidates = re.findall(r'\w+', value.lower())
+    close = sum(1 for word in words
+                if any(SequenceMatcher(None, word, other).ratio() >= WORD_THRESHOLD for other in candidates))
+    return max(score, close / len(words))
+
+
+def _fts_phrase(value):
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _search_sqlite(table, query, limit):
+    fts = f'{table}_fts'
+    ids = db.session.execute(
+        text(f"SELECT rowid FROM {fts} WHERE {fts} MATCH :match ORDER BY rank LIMIT :limit"),
+        {'match': _fts_phrase(query), 'limit': limit}
+    ).scalars().all()
+    if len(ids) >= limit or not trigrams(query):
+        return ids
+
+    # Typo tolerance: rows sharing any trigram (best BM25 first) plus the
+    # first SEARCH_FUZZY_SCAN_LIMIT rows of the table, kept and ranked by
+    # similarity when they reach FUZZY_THRESHOLD
+    columns = ', '.join(SEARCH_COLUMNS[table])
+    lowered = query.lower()
+    fts_grams = {lowered[i:i + 3] for i in range(len(lowered) - 2)}
+    candidates = db.session.execute(
+        text(f"SELECT rowid, {columns} FROM {fts} "
+             f"WHERE {fts} MATCH :match ORDER BY rank LIMIT :limit"),
+        {'match': ' OR '.join(_fts_phrase(g) for g in fts_grams), 'limit': limit * 10}
+    ).all()
+    candidates += db.session.execute(
+        text(f"SELECT id, {columns} FROM {table} ORDER BY id LIMIT :limit"),
+        {'limit': config.SEARCH_FUZZY_SCAN_LIMIT}
+    ).all()
+    seen = set(ids)
+    scored = []
+    for row in candidates:
+        if row[0] in seen:
+            continue
+        seen.add(row[0])
+        score = similarity(query, ' '.join(value or '' for value in row[1:]))
+        if score >= FUZZY_THRESHOLD:
+            scored.append((-score, row[0]))
+    return ids + [row_id for _, row_id in sorted(scored)[:limit - len(ids)]]
+
+
+def _search_postgresql(table, query, limit):
+    expression = _search_expression(table)
+    return db.session.execute(
+        text(f"SELECT id FROM {table} "
+             f"WHERE {expression} LIKE :pattern OR :query <% {expression} "
+             f"ORDER BY {expression} LIKE :pattern DESC, "
+             f"word_similarity(:query, {expression}) DESC, id "
+             f"LIMIT :limit"),
+        {'query': query.lower(), 'pattern': f'%{_escape_like(query.lower())}%', 'limit': limit}
+    ).scalars().all()
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _search_prefix(table, query, limit):
+    model = MODELS[table]
+    return db.session.execute(
+        db.select(model.id)
+        .where(model.name.ilike(f'{_escape_like(query)}%', escape='\\'))
+        .order_by(model.name, model.id)
+        .limit(limit)
+    ).scalars().all()
+
+
+def _search_like(table, query, limit):
+    model = MODELS[table]
+    pattern = f'%{_escape_like(query)}%'
+    criteria = [getattr(model, column).ilike(pattern, escape='\\') for column in SEARCH_COLUMNS[table]]
+    return db.session.execute(
+        db.select(model.id).where(db.or_(*criteria)).order_by(model.id).limit(limit)
+    ).scalars().all()
+
+
+def search_ids(table, query, limit):
+    """Ids of the best matches for query in table, best first"""
+    query = query.strip()
+    if not query:
+        return []
+    if len(query) < MIN_TRIGRAM_LENGTH:
+        return _search_prefix(table, query, limit)
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return _search_sqlite(table, query, limit)
+    if dialect == 'postgresql':
+        return _search_postgresql(table, query, limit)
+    return _search_like(table, query, limit)
+
+
+def search(table, query, limit, base=None):
+    """Model instances of the best matches, best first, taken from base (a query of the model) if given"""
+    ids = search_ids(table, query, limit)
+    if not ids:
+        return []
+    model = MODELS[table]
+    base = base if base is not None else model.query
+    found = {row.id: row for row in base.filter(model.id.in_(ids))}
+    return [found[i] for i in ids if i in found]
@@ -0,0 +1,91 @@
+import os
+import shutil
+from flask import send_from_directory, redirect
+import application.config as config
+
+
+class LocalStorage:
+    """Artifacts kept as files under a directory on this machine"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def save(self, local_path, name):
+        os.makedirs(self.root, exist_ok=True)
+        target = os.path.join(self.root, name)
+        if os.path.abspath(local_path) != os.path.abspath(target):
+            shutil.move(local_path, target)
+
+    def delete(self, name):
+        try:
+            os.remove(os.path.join(self.root, name))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, name):
+        return os.path.isfile(os.path.join(self.root, name))
+
+    def serve(self, name, etag, max_age):
+        return send_from_directory(self.root, name, as_attachment=True,
+                                   conditional=True, etag=etag, max_age=max_age)
+
+
+class S3Storage:
+    """Artifacts kept in an S3-compatible bucket (AWS S3, MinIO, ...).
+
+    Downloads are redirects to short-lived presigned URLs, so the file bytes
+    never pass through the web workers.
+    """
+
+    def __init__(self, bucket, endpoint_url=None, prefix='exports/'):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("EXPORT_STORAGE_BACKEND='s3' requires boto3: pip install boto3")
+        self.client = boto3.client('s3', endpoint_url=endpoint_url or None)
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, name):
+        return self.prefix + name
+
+    def save(self, local_path, name):
+        self.client.upload_file(local_path, self.bucket, self._key(name))
+        os.remove(local_path)
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+
+    def exists(self, name):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+            return True
+        except ClientError:
+            return False
+
+    def serve(self, name, etag, max_age):
+        url = self.client.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': self.bucket,
+                'Key': self._key(name),
+                'ResponseContentDisposition': f'attachment; filename={name}',
+            },
+            ExpiresIn=config.EXPORT_S3_URL_EXPIRY,
+        )
+        return redirect(url)
+
+
+_storage = None
+
+
+def get_storage():
+    """The export storage backend selected by EXPORT_STORAGE_BACKEND"""
+    global _storage
+    if _storage is None:
+        if config.EXPORT_STORAGE_BACKEND == 's3':
+            _storage = S3Storage(config.EXPORT_S3_BUCKET, config.EXPORT_S3_ENDPOINT_URL)
+        else:
+            _storage = LocalStorage(config.EXPORT_FOLDER)
+    return _storage
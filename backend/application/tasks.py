@@ -1,28 +1,35 @@
 
-from celery import Celery
+from celery import Celery, group, chord
+from celery.utils.log import get_task_logger
 from flask import render_template
 from flask_mail import Mail, Message
+from sqlalchemy.orm import joinedload
 from datetime import datetime, date, timedelta
-from collections import Counter
-import csv
 import os
+import smtplib
 import application.config as config
 from application.models import Appointment, Doctor, Patient, Treatment, User
 from application.database import db
+from application.worker import AppContextTask
+from application import reports, exports, deletion, maintenance, archive, mail_quota
 
 
 celery = Celery('tasks',
                 broker=config.CELERY_BROKER_URL,
-                backend=config.CELERY_RESULT_BACKEND)
+                backend=config.CELERY_RESULT_BACKEND,
+                task_cls=AppContextTask)
 
 celery.conf.update(
     task_serializer=config.CELERY_TASK_SERIALIZER,
     result_serializer=config.CELERY_RESULT_SERIALIZER,
     accept_content=config.CELERY_ACCEPT_CONTENT,
     timezone=config.CELERY_TIMEZONE,
-    enable_utc=config.CELERY_ENABLE_UTC
+    enable_utc=config.CELERY_ENABLE_UTC,
+    task_always_eager=config.CELERY_TASK_ALWAYS_EAGER,
+    beat_schedule=config.CELERY_BEAT_SCHEDULE
 )
 mail = None
+logger = get_task_logger(__name__)
 
 def init_mail(app):
     
@@ -32,226 +39,294 @@ def init_mail(app):
 @celery.task(name='tasks.send_booking_confirmation')
 def send_booking_confirmation(appointment_id):
     """Send booking confirmation email to patient"""
-    from app import create_app
-    app, _ = create_app()
-    
-    with app.app_context():
-        try:
-            appointment = Appointment.query.get(appointment_id)
-            if not appointment:
-                return "Appointment not found"
-                
-            patient = appointment.patient
-            doctor = appointment.doctor
-            user = User.query.get(patient.user_id)
-            
-            if not user or not user.username:
-                return "User email not found"
-                
-            html_body = render_template('email/booking_confirmation.html',
-                patient_name=patient.name,
-                doctor_name=doctor.name,
-                appointment_date=appointment.date.strftime('%B %d, %Y'),
-                appointment_time=appointment.time.strftime('%I:%M %p'),
-                reason=appointment.reason or 'General Consultation'
-            )
+    try:
+        appointment = Appointment.query.get(appointment_id)
+        if not appointment:
+            return "Appointment not found"
             
-            msg = Message(
-                subject='Appointment Confirmation',
-                recipients=[user.email],
-                html=html_body
-            )
-            mail.send(msg)
-            return f"Sent confirmation to {user.username}"
+        patient = appointment.patient
+        doctor = appointment.doctor
+        user = User.query.get(patient.user_id)
+        
+        if not user or not user.username:
+            return "User email not found"
             
-        except Exception as e:
-            return f"Error sending confirmation: {str(e)}"
-
-@celery.task(name='tasks.send_daily_reminders')
-def send_daily_reminders():
-    
-    from app import create_app
-    app, _ = create_app()
-    
-    with app.app_context():
-        today = date.today()
-        appointments = Appointment.query.filter_by(
-            date=today,
-            status='Booked'
-        ).all()
+        html_body = render_template('email/booking_confirmation.html',
+            patient_name=patient.name,
+            doctor_name=doctor.name,
+            appointment_date=appointment.date.strftime('%B %d, %Y'),
+            appointment_time=appointment.time.strftime('%I:%M %p'),
+            reason=appointment.reason or 'General Consultation'
+        )
         
-        sent_count = 0
-        for appointment in appointments:
+        msg = Message(
+            subject='Appointment Confirmation',
+            recipients=[user.email],
+            html=html_body
+        )
+        mail_quota.acquire()
+        mail.send(msg)
+        return f"Sent confirmation to {user.username}"
+        
+    except Exception as e:
+        return f"Error sending confirmation: {str(e)}"
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _close_connection(conn):
+    try:
+        conn.__exit__(None, None, None)
+    except Exception:
+        pass
+
+def send_batch(messages):
+    """Send (key, Message) pairs over one reused SMTP connection.
+
+    Each message waits for the shared MAIL_MAX_PER_SECOND quota
+    (mail_quota), which batches running in parallel draw from together. A
+    failed message drops the connection (it may be broken) and the next
+    message reconnects. Returns the number sent and the keys of the
+    messages that failed.
+    """
+    sent_count = 0
+    failed = []
+    conn = None
+    try:
+        for key, msg in messages:
+            mail_quota.acquire()
             try:
-                patient = appointment.patient
-                doctor = appointment.doctor
-                user = User.query.get(patient.user_id)
-                if not user or not user.email: 
-                    continue
-                
-            
-                html_body = render_template('email/appointment_reminder.html',
-                    patient_name=patient.name,
-                    doctor_name=doctor.name,
-                    appointment_date=appointment.date.strftime('%B %d, %Y'),
-                    appointment_time=appointment.time.strftime('%I:%M %p'),
-                    reason=appointment.reason or 'General Consultation'
-                )
-                
-                msg = Message(
-                    subject='Appointment Reminder - Today',
-                    recipients=[user.email],
-                    html=html_body
-                )
-                mail.send(msg)
+                if conn is None:
+                    conn = mail.connect().__enter__()
+                conn.send(msg)
                 sent_count += 1
-                
-            except Exception as e:
-                print(f"Error sending reminder to {patient.name}: {str(e)}")
-                continue
-        return f"Sent {sent_count} reminders for {len(appointments)} appointments"
+            except (smtplib.SMTPException, OSError) as e:
+                logger.warning("Error sending %s: %s", key, e)
+                failed.append(key)
+                if conn is not None:
+                    _close_connection(conn)
+                    conn = None
+    finally:
+        if conn is not None:
+            _close_connection(conn)
+    return sent_count, failed
+
+def _retry_countdown(attempt):
+    return config.MAIL_RETRY_BACKOFF * (2 ** attempt)
+
+def _reminder_message(appointment):
+    patient = appointment.patient
+    user = patient.user
+    if not user or not user.email:
+        return None
+
+    html_body = render_template('email/appointment_reminder.html',
+        patient_name=patient.name,
+        doctor_name=appointment.doctor.name,
+        appointment_date=appointment.date.strftime('%B %d, %Y'),
+        appointment_time=appointment.time.strftime('%I:%M %p'),
+        reason=appointment.reason or 'General Consultation'
+    )
+    return Message(
+        subject='Appointment Reminder - Today',
+        recipients=[user.email],
+        html=html_body
+    )
+
+def _load_reminder_appointments(appointment_ids):
+    return Appointment.query.options(
+        joinedload(Appointment.patient).joinedload(Patient.user),
+        joinedload(Appointment.doctor)
+    ).filter(Appointment.id.in_(appointment_ids)).all()
+
+@celery.task(name='tasks.summarize_mail_batches')
+def summarize_mail_batches(results, kind):
+    sent_count = sum(r['sent'] for r in results)
+    retried = sum(r['retried'] for r in results)
+    return f"Sent {sent_count} {kind}, {retried} queued for retry"
+
+@celery.task(name='tasks.send_daily_reminders')
+def send_daily_reminders():
+    """Fan today's reminders out into batches that each reuse one SMTP connection"""
+    today = date.today()
+    appointment_ids = [row.id for row in db.session.query(Appointment.id).filter_by(
+        date=today,
+        status='Booked'
+    ).order_by(Appointment.id)]
+
+    if not appointment_ids:
+        return "Sent 0 reminders for 0 appointments"
+
+    batches = group(send_reminder_batch.s(ids) for ids in _chunks(appointment_ids, config.MAIL_BATCH_SIZE))
+    chord(batches)(summarize_mail_batches.s('reminders'))
+    return f"Queued reminders for {len(appointment_ids)} appointments"
+
+@celery.task(name='tasks.send_reminder_batch')
+def send_reminder_batch(appointment_ids):
+    messages = []
+    for appointment in _load_reminder_appointments(appointment_ids):
+        msg = _reminder_message(appointment)
+        if msg:
+            messages.append((appointment.id, msg))
+
+    sent_count, failed = send_batch(messages)
+    for appointment_id in failed:
+        send_reminder.apply_async((appointment_id,), countdown=_retry_countdown(0))
+    return {'sent': sent_count, 'retried': len(failed)}
+
+@celery.task(name='tasks.send_reminder', bind=True, max_retries=config.MAIL_MAX_RETRIES)
+def send_reminder(self, appointment_id):
+    """Retry path for a single reminder that failed inside a batch"""
+    appointments = _load_reminder_appointments([appointment_id])
+    msg = _reminder_message(appointments[0]) if appointments else None
+    if not msg:
+        return "Nothing to send"
+    try:
+        mail_quota.acquire()
+        mail.send(msg)
+    except (smtplib.SMTPException, OSError) as e:
+        raise self.retry(exc=e, countdown=_retry_countdown(self.request.retries + 1))
+    return f"Sent reminder for appointment {appointment_id}"
+
+def _monthly_report_message(report, month_year):
+    if not report.get('email'):
+        return None
+    return Message(
+        subject=f'Monthly Activity Report - {month_year}',
+        recipients=[report['email']],
+        html=reports.render_monthly_report(report, month_year)
+    )
 
 @celery.task(name='tasks.send_monthly_reports')
 def send_monthly_reports():
-    """Send monthly activity reports to all doctors"""
-    from app import create_app
-    app, _ = create_app()
+    """Send monthly activity reports to all doctors, in batches"""
+    first_day, last_day = reports.last_month_range()
+    doctor_ids = reports.doctors_with_appointments(first_day, last_day)
     
-    with app.app_context():
-        
-        today = date.today()
-        first_day_this_month = today.replace(day=1)
-        last_day_last_month = first_day_this_month - timedelta(days=1)
-        first_day_last_month = last_day_last_month.replace(day=1)
-        
-        month_year = last_day_last_month.strftime('%B %Y')
+    if not doctor_ids:
+        return "Sent 0 monthly reports to doctors"
+    
+    batches = group(
+        send_report_batch.s(ids, first_day.isoformat(), last_day.isoformat())
+        for ids in _chunks(doctor_ids, config.MAIL_BATCH_SIZE)
+    )
+    chord(batches)(summarize_mail_batches.s('monthly reports'))
+    return f"Queued monthly reports for {len(doctor_ids)} doctors"
+
+@celery.task(name='tasks.send_report_batch')
+def send_report_batch(doctor_ids, first_day, last_day):
+    first_day, last_day = date.fromisoformat(first_day), date.fromisoformat(last_day)
+    month_year = last_day.strftime('%B %Y')
+    messages = []
+    for doctor_id, report in reports.monthly_doctor_reports(first_day, last_day, doctor_ids).items():
+        msg = _monthly_report_message(report, month_year)
+        if msg:
+            messages.append((doctor_id, msg))
+    
+    sent_count, failed = send_batch(messages)
+    for doctor_id in failed:
+        send_monthly_report.apply_async(
+            (doctor_id, first_day.isoformat(), last_day.isoformat()),
+            countdown=_retry_countdown(0)
+        )
+    return {'sent': sent_count, 'retried': len(failed)}
+
+@celery.task(name='tasks.send_monthly_report', bind=True, max_retries=config.MAIL_MAX_RETRIES)
+def send_monthly_report(self, doctor_id, first_day, last_day):
+    """Retry path for a single monthly report that failed inside a batch"""
+    first_day, last_day = date.fromisoformat(first_day), date.fromisoformat(last_day)
+    report = reports.monthly_doctor_reports(first_day, last_day, [doctor_id]).get(doctor_id)
+    msg = _monthly_report_message(report, last_day.strftime('%B %Y')) if report else None
+    if not msg:
+        return "Nothing to send"
+    try:
+        mail_quota.acquire()
+        mail.send(msg)
+    except (smtplib.SMTPException, OSError) as e:
+        raise self.retry(exc=e, countdown=_retry_countdown(self.request.retries + 1))
+    return f"Sent monthly report to doctor {doctor_id}"
+
+def _progress(task):
+    if task.request.is_eager:
+        return None
+    def progress(rows):
+        task.update_state(state='PROGRESS', meta={'rows': rows})
+    return progress
+
+def _export(task, stmt, prefix, compress, patient_id=None):
+    """Write a content-addressed export, reusing the stored artifact if the data is unchanged"""
+    digest, record_count = exports.fingerprint(stmt)
+    filename = exports.export_filename(prefix, digest, compress)
+    
+    if exports.find_artifact(filename) is None:
+        os.makedirs(config.EXPORT_FOLDER, exist_ok=True)
+        filepath = os.path.join(config.EXPORT_FOLDER, filename)
+        exports.write_csv(stmt, filepath, compress=compress, progress=_progress(task))
+        exports.store_artifact(filepath, filename, patient_id, record_count)
+    
+    return {
+        'status': 'success',
+        'filename': filename,
+        'record_count': record_count
+    }
+
+@celery.task(name='tasks.export_patient_treatments', bind=True)
+def export_patient_treatments(self, patient_id, compress=False):
+    """Export patient treatment history as CSV"""
+    try:
+        if not db.session.get(Patient, patient_id):
+            return {'status': 'error', 'message': 'Patient not found'}
         
-        doctors = Doctor.query.all()
-        sent_count = 0
+        return _export(self, exports.treatment_rows(patient_id), f'patient_{patient_id}_treatments', compress, patient_id)
         
-        for doctor in doctors:
-            try:
-                
-                appointments = Appointment.query.filter(
-                    Appointment.doctor_id == doctor.id,
-                    Appointment.date >= first_day_last_month,
-                    Appointment.date <= last_day_last_month
-                ).all()
-                
-                if not appointments:
-                    continue 
-                
-                # Calculate statistics
-                total_appointments = len(appointments)
-                completed = sum(1 for a in appointments if a.status == 'Completed')
-                cancelled = sum(1 for a in appointments if a.status == 'Cancelled')
-                
-                # Get diagnoses from treatments
-                diagnoses = []
-                for apt in appointments:
-                    if apt.treatment and apt.treatment.diagnosis:
-                        diagnoses.append(apt.treatment.diagnosis)
-                
-                diagnosis_counts = Counter(diagnoses)
-                top_diagnoses = [{'name': d, 'count': c} for d, c in diagnosis_counts.most_common(5)]
-                
-                # Prepare appointment data for table
-                apt_data = []
-                for apt in appointments[:20]:  # Limit to 20 for email
-                    diagnosis = apt.treatment.diagnosis if apt.treatment else 'N/A'
-                    apt_data.append({
-                        'date': apt.date.strftime('%Y-%m-%d'),
-                        'patient': apt.patient.name,
-                        'diagnosis': diagnosis,
-                        'status': apt.status
-                    })
-                
-                # Get doctor email
-                user = User.query.get(doctor.user_id)
-                if not user or not user.email:
-                    continue
-                
-                # Render email template
-                html_body = render_template('email/monthly_report.html',
-                    doctor_name=doctor.name,
-                    month_year=month_year,
-                    total_appointments=total_appointments,
-                    completed_appointments=completed,
-                    cancelled_appointments=cancelled,
-                    appointments=apt_data,
-                    diagnoses=top_diagnoses,
-                    report_date=datetime.now().strftime('%B %d, %Y')
-                )
-                
-                # Send email
-                msg = Message(
-                    subject=f'Monthly Activity Report - {month_year}',
-                    recipients=[user.email],
-                    html=html_body
-                )
-                mail.send(msg)
-                sent_count += 1
-                
-            except Exception as e:
-                print(f"Error sending report to Dr. {doctor.name}: {str(e)}")
-                continue
+    except Exception as e:
+        return {'status': 'error', 'message': str(e)}
+
+@celery.task(name='tasks.export_all_treatments', bind=True)
+def export_all_treatments(self, compress=True):
+    """Export every patient's treatment history as one CSV, in constant memory"""
+    try:
+        return _export(self, exports.treatment_rows(), 'all_patients_treatments', compress)
         
-        return f"Sent {sent_count} monthly reports to doctors"
+    except Exception as e:
+        return {'status': 'error', 'message': str(e)}
 
-@celery.task(name='tasks.export_patient_treatments', bind=True)
-def export_patient_treatments(self, patient_id):
-    """Export patient treatment history as CSV"""
-    from app import create_app
-    app, _ = create_app()
-    
-    with app.app_context():
-        try:
-            patient = Patient.query.get(patient_id)
-            if not patient:
-                return {'status': 'error', 'message': 'Patient not found'}
-            
-            # Get all treatments for patient
-            treatments = Treatment.query.join(Appointment).filter(Appointment.patient_id == patient_id).all()
-            
-            # Creating exports directory if it doesn't exist
-            os.makedirs(config.EXPORT_FOLDER, exist_ok=True)
-            
-            # Generate filename
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'patient_{patient_id}_treatments_{timestamp}.csv'
-            filepath = os.path.join(config.EXPORT_FOLDER, filename)
-            
-            # CSV
-            with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = [
-                    'Patient ID', 'Patient Name', 'Doctor Name',
-                    'Appointment Date', 'Appointment Time', 'Diagnosis',
-                    'Prescription', 'Notes'
-                ]
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                for treatment in treatments:
-                    appointment = treatment.appointment
-                    doctor = appointment.doctor if appointment else None
-                    
-                    writer.writerow({
-                        'Patient ID': patient.id,
-                        'Patient Name': patient.name,
-                        'Doctor Name': doctor.name if doctor else 'N/A',
-                        'Appointment Date': appointment.date if appointment else 'N/A',
-                        'Appointment Time': appointment.time if appointment else 'N/A',
-                        'Diagnosis': treatment.diagnosis or '',
-                        'Prescription': treatment.prescription or '',
-                        'Notes': treatment.notes or ''
-                    })
-            
-            return {
-                'status': 'success',
-                'filename': filename,
-                'filepath': filepath,
-                'record_count': len(treatments)
-            }
-            
-        except Exception as e:
-            return {'status': 'error', 'message': str(e)}
+@celery.task(name='tasks.sweep_exports')
+def sweep_exports():
+    """Delete export artifacts older than EXPORT_FILE_RETENTION_HOURS"""
+    deleted, strays = exports.sweep_expired()
+    return f"Deleted {deleted} expired exports and {strays} stray files"
+
+@celery.task(name='tasks.close_past_appointments')
+def close_past_appointments():
+    """Move past-due bookings to No-show and release slots nobody holds"""
+    closed = maintenance.close_past_appointments()
+    freed = maintenance.free_orphaned_slots()
+    return f"Marked {closed} appointments as no-shows, freed {freed} slots"
+
+@celery.task(name='tasks.archive_appointments')
+def archive_appointments():
+    """Move finished appointments past ARCHIVE_AFTER_DAYS to the archive tables"""
+    moved = archive.archive_appointments()
+    return f"Archived {moved} appointments"
+
+@celery.task(name='tasks.purge_doctor', bind=True)
+def purge_doctor(self, doctor_id):
+    """Delete a deactivated doctor's history in batches, then the doctor"""
+    from application.cache import catalog_cache
+    doctor = db.session.get(Doctor, doctor_id)
+    if not doctor:
+        return {'status': 'error', 'message': 'Doctor not found'}
+    deleted = deletion.purge_doctor(doctor, config.DELETE_BATCH_SIZE, _progress(self))
+    catalog_cache.invalidate()
+    return {'status': 'success', 'appointments_deleted': deleted}
+
+@celery.task(name='tasks.purge_patient', bind=True)
+def purge_patient(self, patient_id):
+    """Delete a deactivated patient's history in batches, then the patient"""
+    patient = db.session.get(Patient, patient_id)
+    if not patient:
+        return {'status': 'error', 'message': 'Patient not found'}
+    deleted = deletion.purge_patient(patient, config.DELETE_BATCH_SIZE, _progress(self))
+    return {'status': 'success', 'appointments_deleted': deleted}
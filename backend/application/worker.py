@@ -0,0 +1,66 @@
+import os
+import time
+from celery import Task
+from celery.signals import worker_process_init
+from celery.utils.log import get_task_logger
+from flask import has_app_context
+from application.database import db
+
+logger = get_task_logger(__name__)
+
+_app = None
+
+# Startup cost of the per-process Flask app, reported once per worker process
+startup_metrics = {
+    'pid': None,
+    'app_builds': 0,
+    'build_seconds': 0.0,
+    'init_seconds': 0.0,
+}
+
+
+def record_app_build(seconds):
+    """Called by create_app so the cost of every build is accounted for"""
+    startup_metrics['app_builds'] += 1
+    startup_metrics['build_seconds'] += seconds
+
+
+def get_app():
+    """Return the Flask app for this process, building it on first use"""
+    global _app
+    if _app is None:
+        from app import app as flask_app
+        _app = flask_app
+    return _app
+
+
+class AppContextTask(Task):
+    """Run every task inside the shared app context of the worker process"""
+
+    def __call__(self, *args, **kwargs):
+        if has_app_context():
+            return self.run(*args, **kwargs)
+        with get_app().app_context():
+            return self.run(*args, **kwargs)
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    started = time.perf_counter()
+    app = get_app()
+    with app.app_context():
+        # Connections opened by the parent before fork must not be shared
+        db.engine.dispose(close=False)
+        from application.pool import pool_stats
+        pool = pool_stats(db.engine)
+    startup_metrics['pid'] = os.getpid()
+    startup_metrics['init_seconds'] = time.perf_counter() - started
+    logger.info(
+        "Worker process %s ready: app builds=%d, build=%.3fs, init=%.3fs, db pool=%s (%s profile)",
+        startup_metrics['pid'],
+        startup_metrics['app_builds'],
+        startup_metrics['build_seconds'],
+        startup_metrics['init_seconds'],
+        pool['pool'],
+        pool.get('profile'),
+    )
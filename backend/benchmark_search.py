@@ -0,0 +1,132 @@
+"""Search benchmark: indexed search against the old LIKE scan on synthetic data.
+
+    # Fresh SQLite database with 100k doctors and 1M patients (takes a while)
+    python benchmark_search.py
+
+    # Smaller run, or against an existing database (e.g. PostgreSQL)
+    python benchmark_search.py --doctors 10000 --patients 100000
+    DATABASE_URL=postgresql://... python benchmark_search.py --skip-load
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+SYLLABLES = ['an', 'ar', 'ka', 'mi', 'ra', 'sh', 'vi', 'de', 'lo', 'ne', 'ta', 'su',
+             'ya', 'jo', 'el', 'is', 'ma', 'ri', 'ko', 'ha', 'pr', 'ia', 'nu', 'ch']
+DEPARTMENTS = ['Cardiology', 'Neurology', 'Orthopedics', 'Pediatrics', 'Dermatology',
+               'Oncology', 'Radiology', 'Psychiatry', 'Urology', 'Gastroenterology']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--doctors', type=int, default=100_000)
+    parser.add_argument('--patients', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=50, help='Queries per kind')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--skip-load', action='store_true', help='Use the rows already in DATABASE_URL')
+    parser.add_argument('--seed', type=int, default=7)
+    return parser.parse_args()
+
+
+def make_name(rng):
+    def word():
+        return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+    return f'{word()} {word()}'
+
+
+def load(db, rng, doctors, patients, batch=20_000):
+    from application.models import User, Doctor, Patient
+
+    started = time.perf_counter()
+    for table, count in ((Doctor, doctors), (Patient, patients)):
+        role = table.__tablename__
+        for offset in range(0, count, batch):
+            size = min(batch, count - offset)
+            # Placeholder hashes: these accounts are never logged into
+            user_ids = db.session.execute(db.insert(User).returning(User.id), [
+                {'username': f'bench_{role}_{rng.getrandbits(64):x}', 'password_hash': '!', 'role': role}
+                for _ in range(size)
+            ]).scalars().all()
+            if table is Doctor:
+                rows = [{'user_id': uid, 'name': 'Dr ' + make_name(rng),
+                         'specialization': rng.choice(DEPARTMENTS) + ' specialist',
+                         'department': rng.choice(DEPARTMENTS)} for uid in user_ids]
+            else:
+                rows = [{'user_id': uid, 'name': make_name(rng)} for uid in user_ids]
+            db.session.execute(db.insert(table), rows)
+            db.session.commit()
+    print(f"Loaded {doctors} doctors and {patients} patients in {time.perf_counter() - started:.1f}s")
+
+
+def sample_queries(db, rng, model, count):
+    """Substrings of real names, plus the same with one typo"""
+    names = db.session.execute(
+        db.select(model.name).order_by(db.func.random()).limit(count)
+    ).scalars().all()
+    exact, typo = [], []
+    for name in names:
+        word = rng.choice(name.split())
+        start = rng.randint(0, max(0, len(word) - 5))
+        term = word[start:start + 5]
+        exact.append(term)
+        pos = rng.randrange(len(term))
+        typo.append(term[:pos] + rng.choice('aeiouxz') + term[pos + 1:])
+    return {'substring': exact, 'typo': typo}
+
+
+def like_scan(db, model, query):
+    """The search as it was before the indexes: every leading-wildcard LIKE match, unranked"""
+    columns = [model.name] + ([model.department, model.specialization] if hasattr(model, 'department') else [])
+    return db.session.execute(
+        db.select(model.id).where(db.or_(*[c.contains(query) for c in columns]))
+    ).scalars().all()
+
+
+def timed(fn, queries):
+    latencies, hits = [], 0
+    for q in queries:
+        started = time.perf_counter()
+        hits += bool(fn(q))
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        'p50_ms': statistics.median(latencies),
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        'found': f'{hits}/{len(queries)}',
+    }
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'search.db'))
+
+    from flask_migrate import upgrade
+    from app import app
+    from application.database import db
+    from application.models import Doctor, Patient
+    from application import search
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        upgrade()
+        if not args.skip_load:
+            load(db, rng, args.doctors, args.patients)
+
+        print(f"{'table':>8} {'kind':>10} {'method':>7} {'p50 ms':>9} {'p99 ms':>9}  found")
+        for table, model in (('doctor', Doctor), ('patient', Patient)):
+            for kind, queries in sample_queries(db, rng, model, args.queries).items():
+                for method, fn in (
+                    ('like', lambda q: like_scan(db, model, q)),
+                    ('index', lambda q: search.search_ids(table, q, args.limit)),
+                ):
+                    result = timed(fn, queries)
+                    print(f"{table:>8} {kind:>10} {method:>7} {result['p50_ms']:>9.2f} "
+                          f"{result['p99_ms']:>9.2f}  {result['found']}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,19 @@
+"""Reproducible benchmarks: a synthetic data generator and HTTP scenarios with JSON results.
+
+Run from the backend directory:
+
+    # Fresh SQLite database, in-process test client
+    python -m benchmarks run
+
+    # Bigger dataset, through a local gunicorn with 4 workers
+    python -m benchmarks run --doctors 500 --patients 50000 --years 3 --gunicorn 4
+
+    # Existing PostgreSQL database, filled earlier
+    DATABASE_URL=postgresql://... python -m benchmarks run --skip-load --patients 50000
+
+    # What changed between two commits
+    python -m benchmarks compare results/abc123-....json results/def456-....json
+
+Results are written to benchmarks/results/ and name the commit they were
+measured on. Runs are comparable when they use the same arguments and seed.
+"""
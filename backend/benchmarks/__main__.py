@@ -0,0 +1,182 @@
+"""Command line: generate data, run scenarios, write JSON; or compare two result files.
+
+    python -m benchmarks run [--scenarios dashboard,exports] [--output FILE]
+    python -m benchmarks compare OLD.json NEW.json [--threshold 15]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+from benchmarks.scenarios import SCENARIOS
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Generate data and run scenarios')
+    run.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated, from: ' + ', '.join(SCENARIOS))
+    run.add_argument('--doctors', type=int, default=50)
+    run.add_argument('--patients', type=int, default=2000)
+    run.add_argument('--years', type=int, default=1, help='Years of past appointments')
+    run.add_argument('--per-day', type=int, default=4, help='Past appointments per doctor per weekday')
+    run.add_argument('--grid-days', type=int, default=14, help='Days of stored upcoming availability')
+    run.add_argument('--archive', action='store_true', help='Move old appointments to the archive after loading')
+    run.add_argument('--skip-load', action='store_true', help='Use the data already in DATABASE_URL')
+    run.add_argument('--requests', type=int, default=100, help='Requests per step')
+    run.add_argument('--concurrency', type=int, default=8)
+    run.add_argument('--seed', type=int, default=7)
+    run.add_argument('--url', help='Drive a running server instead of the in-process test client')
+    run.add_argument('--gunicorn', type=int, metavar='WORKERS', help='Start a local gunicorn with this many workers')
+    run.add_argument('--admin-user', default='admin')
+    run.add_argument('--admin-password', default='admin123')
+    run.add_argument('--output', help=f'Result file (default: {RESULTS_DIR}/<commit>-<time>.json)')
+
+    compare = commands.add_parser('compare', help='Show the change between two result files')
+    compare.add_argument('old')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=15, help='Percent slower counted as a regression')
+    return parser.parse_args()
+
+
+def git_revision():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                         stderr=subprocess.DEVNULL).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                             text=True, stderr=subprocess.DEVNULL).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def prepare_environment():
+    """Defaults for an in-process run; must happen before the app is imported"""
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db'))
+    os.environ.setdefault('MAIL_SUPPRESS_SEND', 'True')
+    os.environ.setdefault('CELERY_TASK_ALWAYS_EAGER', 'True')
+
+
+def load(args, rng):
+    from flask_migrate import upgrade
+    from app import app
+    from application.database import db
+    from application.models import User
+    from benchmarks import datagen
+
+    with app.app_context():
+        upgrade()
+        if not User.query.filter_by(username=args.admin_user).first():
+            admin = User(username=args.admin_user, role='admin', email='admin@hms.com')
+            admin.set_password(args.admin_password)
+            db.session.add(admin)
+            db.session.commit()
+        dialect = db.engine.dialect.name
+        if args.skip_load:
+            return app, dialect, {'existing': datagen.existing_counts(db)}
+        return app, dialect, datagen.generate(
+            db, rng, args.doctors, args.patients, args.years, args.per_day, args.grid_days,
+            archive=args.archive, log=lambda line: print(f'  {line}', file=sys.stderr))
+
+
+def run_scenarios(args, client, rng):
+    from benchmarks.client import login
+    from benchmarks.scenarios import Context
+
+    login(client, args.admin_user, args.admin_password)
+    ctx = Context(client, rng, args.requests, args.concurrency, args.patients, args.grid_days)
+    results = {}
+    for name in args.scenarios.split(','):
+        if name not in SCENARIOS:
+            raise SystemExit(f'Unknown scenario: {name}')
+        print(f'{name}...', file=sys.stderr)
+        results[name] = SCENARIOS[name](ctx)
+        for step, result in results[name].items():
+            print(f"  {step:<28} p50 {result['p50_ms']:>9.2f} ms  p99 {result['p99_ms']:>9.2f} ms  "
+                  f"{result['throughput']:>8.1f} req/s  queries {result['queries']}  {result['statuses']}",
+                  file=sys.stderr)
+    return results
+
+
+def run(args):
+    from benchmarks.client import LocalClient, RemoteClient, Gunicorn
+
+    started = datetime.now(timezone.utc)
+    rng = random.Random(args.seed)
+    if not args.url:
+        prepare_environment()
+        print('Loading data...', file=sys.stderr)
+        app, dialect, dataset = load(args, rng)
+    else:
+        app, dialect, dataset = None, None, {'existing': 'remote'}
+
+    if args.gunicorn:
+        with Gunicorn(args.gunicorn) as server:
+            mode = f'gunicorn -w {args.gunicorn}'
+            results = run_scenarios(args, RemoteClient(server.url, args.concurrency), rng)
+    elif args.url:
+        mode = 'remote'
+        results = run_scenarios(args, RemoteClient(args.url, args.concurrency), rng)
+    else:
+        mode = 'test client'
+        results = run_scenarios(args, LocalClient(app), rng)
+
+    commit, dirty = git_revision()
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'started': started.isoformat(timespec='seconds'),
+            'mode': mode,
+            'database': dialect,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': {k: v for k, v in vars(args).items() if k not in ('command', 'admin_password')},
+        },
+        'dataset': dataset,
+        'scenarios': results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{commit or 'nogit'}{'-dirty' if dirty else ''}-{started:%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f'Results written to {output}', file=sys.stderr)
+
+    failed = [f'{name}.{step}' for name, steps in results.items() for step, result in steps.items()
+              if result.get('exactly_one_booked') is False or result.get('all_booked') is False]
+    if failed:
+        print(f"Correctness checks failed: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def compare(args):
+    """Per step: p50, p99 and statements per request, old -> new; exit 1 on a regression"""
+    from benchmarks.compare import compare_reports
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    lines, regressions = compare_reports(old, new, args.threshold)
+    print('\n'.join(lines))
+    return 1 if regressions else 0
+
+
+def main():
+    args = parse_args()
+    return run(args) if args.command == 'run' else compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""HTTP clients for the scenarios: the Flask test client in-process, or a real server.
+
+Both return (status, body bytes, headers) so scenarios do not care which
+one they drive.
+"""
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+_QUERIES = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def server_timing(headers):
+    """(db milliseconds, statement count) from the Server-Timing header, or (None, None)"""
+    if hasattr(headers, 'getlist'):
+        value = ', '.join(headers.getlist('Server-Timing'))
+    else:
+        value = headers.get('Server-Timing', '')
+    match = _QUERIES.search(value)
+    if match:
+        return float(match.group(1)), int(match.group(2))
+    return None, None
+
+
+class LocalClient:
+    """Flask test client; one per call, since test clients are not shared between threads"""
+    kind = 'local'
+
+    def __init__(self, app):
+        self.app = app
+        self.token = None
+
+    def request(self, method, path, json=None):
+        headers = {'Authorization': f'Bearer {self.token}'} if self.token else {}
+        with self.app.test_client() as client:
+            res = client.open(path, method=method, json=json, headers=headers)
+            return res.status_code, res.get_data(), res.headers
+
+
+class RemoteClient:
+    kind = 'remote'
+
+    def __init__(self, url, pool_size=64):
+        import requests
+
+        self.url = url.rstrip('/')
+        self.token = None
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method, path, json=None):
+        headers = {'Authorization': f'Bearer {self.token}'} if self.token else {}
+        res = self.session.request(method, self.url + path, json=json, headers=headers)
+        # requests joins repeated headers with ', ', which the Server-Timing pattern still matches
+        return res.status_code, res.content, res.headers
+
+
+def another_client(client):
+    """A client of the same kind and target, not signed in"""
+    if client.kind == 'local':
+        return LocalClient(client.app)
+    return RemoteClient(client.url)
+
+
+def login(client, username, password):
+    import json
+    status, body, _ = client.request('POST', '/auth/login', json={'username': username, 'password': password})
+    if status != 200:
+        raise SystemExit(f'Could not log in as {username}: {status} {body[:200]!r}')
+    data = json.loads(body)
+    client.token = data['token']
+    client.patient_id = data.get('patient_id')
+    return client
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Gunicorn:
+    """A local gunicorn serving app:app against the same DATABASE_URL, for the duration of a with-block"""
+
+    def __init__(self, workers, threads=1):
+        self.workers = workers
+        self.threads = threads
+        self.port = _free_port()
+        self.process = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def __enter__(self):
+        backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-w', str(self.workers), '--threads', str(self.threads),
+             '-b', f'127.0.0.1:{self.port}', '--log-level', 'warning', 'app:app'],
+            cwd=backend, env=dict(os.environ),
+        )
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit('gunicorn exited during startup')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=0.5).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise SystemExit('gunicorn did not start within 60s')
+
+    def __exit__(self, *exc):
+        if self.process and self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        return False
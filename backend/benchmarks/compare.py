@@ -0,0 +1,61 @@
+"""Differences between two benchmark result files."""
+
+# (field, label, counts as a regression when it grows)
+FIELDS = (
+    ('p50_ms', 'p50 ms', True),
+    ('p99_ms', 'p99 ms', True),
+    ('queries', 'queries', True),
+    ('throughput', 'req/s', False),
+)
+
+
+def _change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def _is_regression(field, grows_worse, change, old, new, threshold):
+    if field == 'queries':
+        # Statement counts barely vary between runs (only cache misses do), so
+        # half a statement more per request is a regression whatever the threshold
+        return old is not None and new is not None and new - old >= 0.5
+    if change is None:
+        return False
+    return change > threshold if grows_worse else -change > threshold
+
+
+def compare_reports(old, new, threshold):
+    """(printable lines, number of regressions) for the steps both reports share"""
+    meta_old, meta_new = old['meta'], new['meta']
+    lines = [f"old: {meta_old.get('commit')} ({meta_old.get('database')}, {meta_old.get('mode')}, {meta_old.get('started')})",
+             f"new: {meta_new.get('commit')} ({meta_new.get('database')}, {meta_new.get('mode')}, {meta_new.get('started')})",
+             '']
+    for key in ('mode', 'database'):
+        if meta_old.get(key) != meta_new.get(key):
+            lines.append(f'warning: the runs differ in {key}')
+    args_old, args_new = meta_old.get('args', {}), meta_new.get('args', {})
+    for key in ('doctors', 'patients', 'years', 'per_day', 'requests', 'concurrency', 'seed'):
+        if args_old.get(key) != args_new.get(key):
+            lines.append(f'warning: the runs differ in --{key.replace("_", "-")}')
+
+    regressions = 0
+    for scenario, steps in new['scenarios'].items():
+        for step, result in steps.items():
+            before = old['scenarios'].get(scenario, {}).get(step)
+            if before is None:
+                lines.append(f'{scenario}.{step}: new step')
+                continue
+            cells, flagged = [], False
+            for field, label, grows_worse in FIELDS:
+                a, b = before.get(field), result.get(field)
+                change = _change(a, b)
+                regression = _is_regression(field, grows_worse, change, a, b, threshold)
+                flagged |= regression
+                pct = f'{change:+.0f}%' if change is not None else 'n/a'
+                cells.append(f"{label} {a} -> {b} ({pct}){' !' if regression else ''}")
+            regressions += flagged
+            lines.append(f"{'REGRESSION ' if flagged else ''}{scenario}.{step}: " + ', '.join(cells))
+    lines.append('')
+    lines.append(f'{regressions} regressed steps (threshold {threshold:g}%)')
+    return lines, regressions
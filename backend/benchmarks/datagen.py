@@ -0,0 +1,184 @@
+"""Synthetic hospital data, inserted in bulk.
+
+Everything is drawn from one seeded random generator, so the same
+arguments always produce the same rows (dates are relative to today).
+Generated users are named bench_doctor_<n> and bench_patient_<n>, and
+all of them share PASSWORD.
+"""
+import time
+from datetime import date, time as dtime, timedelta
+from sqlalchemy import insert, select, func
+
+PASSWORD = 'bench-password'
+
+SYLLABLES = ['an', 'ar', 'ka', 'mi', 'ra', 'sh', 'vi', 'de', 'lo', 'ne', 'ta', 'su',
+             'ya', 'jo', 'el', 'is', 'ma', 'ri', 'ko', 'ha', 'pr', 'ia', 'nu', 'ch']
+DEPARTMENTS = ['Cardiology', 'Neurology', 'Orthopedics', 'Pediatrics', 'Dermatology',
+               'Oncology', 'Radiology', 'Psychiatry', 'Urology', 'Gastroenterology']
+DIAGNOSES = ['Hypertension', 'Migraine', 'Fracture', 'Influenza', 'Eczema', 'Diabetes',
+             'Asthma', 'Anxiety', 'Gastritis', 'Back pain', 'Bronchitis', 'Arthritis']
+# Past appointments: status by weight
+PAST_STATUSES = [('Completed', 80), ('Cancelled', 12), ('No-show', 8)]
+
+# Working hours of every generated doctor, Monday to Friday
+DAY_START, DAY_END, SLOT_MINUTES = 9, 17, 30
+
+
+def make_name(rng):
+    def word():
+        return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+    return f'{word()} {word()}'
+
+
+def day_slots():
+    """(start, end) times of a working day"""
+    slots = []
+    minutes = DAY_START * 60
+    while minutes + SLOT_MINUTES <= DAY_END * 60:
+        end = minutes + SLOT_MINUTES
+        slots.append((dtime(minutes // 60, minutes % 60), dtime(end // 60, end % 60)))
+        minutes = end
+    return slots
+
+
+def weekdays(first, last):
+    day = first
+    while day <= last:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+
+class Generator:
+    def __init__(self, db, rng, batch_size=10_000, log=print):
+        self.db = db
+        self.rng = rng
+        self.batch_size = batch_size
+        self.log = log
+        self.counts = {}
+
+    def _insert(self, model, rows, returning=None):
+        """Insert rows in batches; returns the `returning` column of each row, in order, when asked"""
+        ids = []
+        for offset in range(0, len(rows), self.batch_size):
+            batch = rows[offset:offset + self.batch_size]
+            if returning is not None:
+                ids.extend(self.db.session.execute(
+                    insert(model).returning(returning, sort_by_parameter_order=True), batch
+                ).scalars().all())
+            else:
+                self.db.session.execute(insert(model), batch)
+            self.db.session.commit()
+        self.counts[model.__tablename__] = self.counts.get(model.__tablename__, 0) + len(rows)
+        return ids
+
+    def people(self, role, model, count, password_hash, profile):
+        from application.models import User
+
+        user_ids = self._insert(User, [{
+            'username': f'bench_{role}_{n}', 'email': f'bench_{role}_{n}@example.com', 'role': role,
+            'password_hash': password_hash, 'is_blacklisted': False, 'active': True,
+        } for n in range(count)], returning=User.id)
+        return self._insert(model, [dict(profile(), user_id=user_id) for user_id in user_ids],
+                            returning=model.id)
+
+    def schedules(self, doctor_ids, today):
+        from application.models import ScheduleRule
+
+        self._insert(ScheduleRule, [{
+            'doctor_id': doctor_id, 'weekday': weekday,
+            'start_time': dtime(DAY_START), 'end_time': dtime(DAY_END),
+            'slot_minutes': SLOT_MINUTES, 'valid_from': today,
+        } for doctor_id in doctor_ids for weekday in range(5)])
+
+    def history(self, doctor_ids, patient_ids, first, last, per_day):
+        """Past appointments with a treatment for each completed one"""
+        from application.models import Appointment, Treatment
+
+        slots = day_slots()
+        statuses = [s for s, _ in PAST_STATUSES]
+        weights = [w for _, w in PAST_STATUSES]
+        days = list(weekdays(first, last))
+        for doctor_id in doctor_ids:
+            rows = []
+            for day in days:
+                for slot_start, _ in self.rng.sample(slots, min(per_day, len(slots))):
+                    rows.append({
+                        'doctor_id': doctor_id, 'patient_id': self.rng.choice(patient_ids),
+                        'date': day, 'time': slot_start,
+                        'status': self.rng.choices(statuses, weights)[0],
+                        'reason': 'Follow-up' if self.rng.random() < 0.3 else None,
+                    })
+            ids = self._insert(Appointment, rows, returning=Appointment.id)
+            self._insert(Treatment, [{
+                'appointment_id': appointment_id,
+                'diagnosis': self.rng.choice(DIAGNOSES),
+                'prescription': f'Rx {self.rng.randint(1, 500)}',
+                'notes': None,
+            } for appointment_id, row in zip(ids, rows) if row['status'] == 'Completed'])
+
+    def upcoming(self, doctor_ids, patient_ids, first, last, booked_share):
+        """Stored availability grid for the coming days, part of it booked"""
+        from application.models import Appointment, Availability
+
+        slots = day_slots()
+        grid, booked = [], []
+        for doctor_id in doctor_ids:
+            for day in weekdays(first, last):
+                for slot_start, slot_end in slots:
+                    is_booked = self.rng.random() < booked_share
+                    grid.append({'doctor_id': doctor_id, 'date': day, 'start_time': slot_start,
+                                 'end_time': slot_end, 'is_booked': is_booked})
+                    if is_booked:
+                        booked.append({'doctor_id': doctor_id, 'patient_id': self.rng.choice(patient_ids),
+                                       'date': day, 'time': slot_start, 'status': 'Booked', 'reason': None})
+        self._insert(Availability, grid)
+        self._insert(Appointment, booked)
+
+
+def generate(db, rng, doctors, patients, years, per_day, grid_days, booked_share=0.3,
+             archive=False, log=print):
+    """Fill the database; returns a summary with row counts and the time taken"""
+    from application.models import Doctor, Patient
+    from application import passwords
+
+    started = time.perf_counter()
+    today = date.today()
+    gen = Generator(db, rng, log=log)
+    password_hash = passwords.hash_password(PASSWORD)  # once: every generated user shares it
+
+    doctor_ids = gen.people('doctor', Doctor, doctors, password_hash, lambda: {
+        'name': 'Dr ' + make_name(rng), 'department': rng.choice(DEPARTMENTS),
+        'specialization': rng.choice(DEPARTMENTS) + ' specialist',
+    })
+    patient_ids = gen.people('patient', Patient, patients, password_hash, lambda: {
+        'name': make_name(rng), 'contact': f'9{rng.randint(0, 10**9 - 1):09d}',
+        'dob': date(1940, 1, 1) + timedelta(days=rng.randint(0, 365 * 80)),
+    })
+    log(f"{doctors} doctors and {patients} patients")
+    gen.schedules(doctor_ids, today)
+    gen.history(doctor_ids, patient_ids, today - timedelta(days=365 * years), today - timedelta(days=1), per_day)
+    log(f"{gen.counts.get('appointment', 0)} past appointments, {gen.counts.get('treatment', 0)} treatments")
+    gen.upcoming(doctor_ids, patient_ids, today + timedelta(days=1), today + timedelta(days=grid_days), booked_share)
+    log(f"{gen.counts.get('availability', 0)} upcoming slots")
+
+    archived = 0
+    if archive:
+        from application import archive as archive_store
+        archived = archive_store.archive_appointments()
+        log(f"{archived} appointments archived")
+
+    return {
+        'rows': gen.counts,
+        'archived': archived,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def existing_counts(db):
+    """Doctor and patient counts of a database that was filled earlier"""
+    from application.models import Doctor, Patient
+    return {
+        'doctor': db.session.execute(select(func.count()).select_from(Doctor)).scalar(),
+        'patient': db.session.execute(select(func.count()).select_from(Patient)).scalar(),
+    }
@@ -0,0 +1,203 @@
+"""Benchmark scenarios. Each returns {step: measurement} for the JSON report.
+
+A step fires a list of requests at a fixed concurrency and reports the
+latency percentiles, throughput, status codes and statements per request.
+Statement counts are read from the Server-Timing header. For streamed
+responses they cover only the work done before the body is streamed.
+"""
+import json
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from benchmarks.client import another_client, login, server_timing
+from benchmarks.datagen import PASSWORD
+
+
+class Context:
+    """Shared state of a run: the admin client, the random generator and ids discovered through the API.
+
+    Patient-only endpoints (records, exports, booking) are requested by
+    `patient_client`, signed in as a generated patient; patients may only
+    read their own records, so those steps all request that patient's.
+    """
+
+    def __init__(self, client, rng, requests, concurrency, patients, grid_days):
+        self.client = client
+        self.patient_client = login(another_client(client), 'bench_patient_0', PASSWORD)
+        self.own_patient_id = self.patient_client.patient_id
+        self.rng = rng
+        self.requests = requests
+        self.concurrency = concurrency
+        self.patient_count = patients
+        self.grid_days = grid_days
+        self.doctors = self.get_json('/patient/doctors')
+        self.patient_ids = [p['id'] for p in self.get_json('/admin/patients?limit=200')]
+        if not self.doctors or not self.patient_ids:
+            raise SystemExit('The database has no doctors or patients; generate data first')
+
+    def get_json(self, path):
+        status, body, _ = self.client.request('GET', path)
+        if status != 200:
+            raise SystemExit(f'GET {path} failed: {status}')
+        return json.loads(body)
+
+    def doctor_ids(self, n):
+        return [self.rng.choice(self.doctors)['id'] for _ in range(n)]
+
+    def patients(self, n):
+        return [self.rng.choice(self.patient_ids) for _ in range(n)]
+
+
+def percentile(samples, pct):
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def measure(ctx, calls, concurrency=None, client=None):
+    """Run (method, path, json) calls concurrently and summarize them"""
+    client = client or ctx.client
+    concurrency = concurrency or ctx.concurrency
+
+    def timed(call):
+        method, path, body = call
+        started = time.perf_counter()
+        status, data, headers = client.request(method, path, json=body)
+        elapsed = time.perf_counter() - started
+        return status, elapsed, len(data), server_timing(headers)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, calls))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for _, elapsed, _, _ in results)
+    queries = [timing[1] for _, _, _, timing in results if timing[1] is not None]
+    db_ms = [timing[0] for _, _, _, timing in results if timing[0] is not None]
+    return {
+        'requests': len(results),
+        'concurrency': concurrency,
+        'throughput': round(len(results) / wall, 2),
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(latencies[-1], 3),
+        'statuses': {str(k): v for k, v in sorted(Counter(status for status, _, _, _ in results).items())},
+        'queries': round(statistics.mean(queries), 2) if queries else None,
+        'max_queries': max(queries) if queries else None,
+        'db_ms': round(statistics.mean(db_ms), 3) if db_ms else None,
+        'bytes': round(statistics.mean(size for _, _, size, _ in results)),
+    }
+
+
+def get(paths):
+    return [('GET', path, None) for path in paths]
+
+
+def dashboard(ctx):
+    """The requests behind the patient, doctor and admin dashboards"""
+    n = ctx.requests
+    return {
+        'patient.doctors': measure(ctx, get(['/patient/doctors'] * n)),
+        'patient.departments': measure(ctx, get(['/patient/departments'] * n)),
+        'patient.appointments': measure(ctx, get([f'/patient/appointments/{ctx.own_patient_id}'] * n),
+                                        client=ctx.patient_client),
+        'patient.history': measure(ctx, get([f'/patient/history/{ctx.own_patient_id}'] * n),
+                                   client=ctx.patient_client),
+        'patient.availability': measure(ctx, get(f'/patient/doctor/{d}/availability' for d in ctx.doctor_ids(n))),
+        'doctor.appointments': measure(ctx, get(f'/doctor/appointments/{d}' for d in ctx.doctor_ids(n))),
+        'doctor.assigned_patients': measure(ctx, get(f'/doctor/assigned_patients/{d}' for d in ctx.doctor_ids(n))),
+        'doctor.schedule': measure(ctx, get(f'/doctor/schedule/{d}' for d in ctx.doctor_ids(n))),
+        'admin.doctors': measure(ctx, get(['/admin/doctors'] * n)),
+        'admin.patients': measure(ctx, get(['/admin/patients'] * n)),
+        'admin.appointments': measure(ctx, get(['/admin/appointments'] * n)),
+        'doctor.dashboard': measure(ctx, get(f'/doctor/dashboard/{d}' for d in ctx.doctor_ids(n))),
+        'admin.dashboard': measure(ctx, get(['/admin/dashboard'] * n)),
+    }
+
+
+def search_typing(ctx):
+    """A search request per keystroke while typing parts of doctor names"""
+    terms = []
+    while len(terms) < ctx.requests:
+        word = ctx.rng.choice(ctx.rng.choice(ctx.doctors)['name'].split()[1:] or ['a'])
+        terms.extend(word[:length] for length in range(1, min(len(word), 8) + 1))
+    terms = terms[:ctx.requests]
+    return {
+        'patient.search': measure(ctx, get(f'/patient/search?q={t}' for t in terms)),
+        'admin.search': measure(ctx, get(f'/admin/search?q={t}' for t in terms)),
+    }
+
+
+def _free_slots(ctx, start, end, wanted):
+    """[(doctor_id, slot_id or None, date, start_time)] of free slots in the window"""
+    free = []
+    for doctor in ctx.rng.sample(ctx.doctors, len(ctx.doctors)):
+        slots = ctx.get_json(f"/patient/doctor/{doctor['id']}/availability?from={start}&to={end}&only_free=1")['slots']
+        free.extend(zip([doctor['id']] * len(slots['id']), slots['id'], slots['date'], slots['start_time']))
+        if len(free) >= wanted:
+            break
+    return free[:wanted]
+
+
+def _booking(slot, patient_id):
+    doctor_id, slot_id, day, start_time = slot
+    if slot_id is not None:
+        return 'POST', '/patient/book_slot', {'slot_id': slot_id, 'patient_id': patient_id, 'reason': 'benchmark'}
+    return 'POST', '/patient/book', {'doctor_id': doctor_id, 'patient_id': patient_id, 'date': day,
+                                     'time': start_time[:5], 'reason': 'benchmark'}
+
+
+def booking_storm(ctx):
+    """Everyone books one slot at once (exactly one must win), then many different slots at once"""
+    first = date.today() + timedelta(days=1)
+    hot = _free_slots(ctx, first, first + timedelta(days=ctx.grid_days), 1)
+    if not hot:
+        raise SystemExit('No free slot to book')
+    hot_slot = measure(ctx, [_booking(hot[0], p) for p in ctx.patients(ctx.requests)], client=ctx.patient_client)
+    hot_slot['exactly_one_booked'] = hot_slot['statuses'].get('201') == 1
+
+    # Slots beyond the stored grid are computed from the schedule rules
+    later = first + timedelta(days=ctx.grid_days + 1)
+    spread = _free_slots(ctx, first, later + timedelta(days=13), ctx.requests)
+    distinct = measure(ctx, [_booking(slot, p) for slot, p in zip(spread, ctx.patients(len(spread)))],
+                       client=ctx.patient_client)
+    distinct['all_booked'] = distinct['statuses'] == {'201': len(spread)}
+    return {'hot_slot': hot_slot, 'distinct_slots': distinct}
+
+
+def login_burst(ctx):
+    """Concurrent logins of generated patients (every login is a bcrypt check)"""
+    anonymous = another_client(ctx.client)
+    usernames = [f'bench_patient_{ctx.rng.randrange(ctx.patient_count)}' for _ in range(ctx.requests)]
+    calls = [('POST', '/auth/login', {'username': u, 'password': PASSWORD}) for u in usernames]
+    return {'login': measure(ctx, calls, client=anonymous)}
+
+
+def monthly_reports(ctx):
+    """Report generation (and the suppressed or real email) for a sample of doctors"""
+    n = min(ctx.requests, 50)
+    return {'doctor.monthly_report': measure(
+        ctx, [('POST', f'/doctor/monthly-report/{d}', None) for d in ctx.doctor_ids(n)])}
+
+
+def exports(ctx):
+    """Streamed per-patient treatment exports and full bulk exports"""
+    n = min(ctx.requests, 50)
+    return {
+        'patient.treatments_csv': measure(ctx, get([f'/patient/export-treatments/{ctx.own_patient_id}/stream'] * n),
+                                          client=ctx.patient_client),
+        'admin.export_appointments': measure(ctx, get(['/admin/export/appointments?format=csv'] * 3), concurrency=1),
+        'admin.export_patients': measure(ctx, get(['/admin/export/patients'] * 3), concurrency=1),
+    }
+
+
+# In run order; booking_storm changes data, so it comes after the read-only scenarios
+SCENARIOS = {
+    'dashboard': dashboard,
+    'search_typing': search_typing,
+    'login_burst': login_burst,
+    'monthly_reports': monthly_reports,
+    'exports': exports,
+    'booking_storm': booking_storm,
+}
@@ -0,0 +1,131 @@
+"""Booking storm: fire many concurrent bookings at one hot slot.
+
+Exactly one request must succeed and the slot must end up with exactly one
+live appointment. Exits with status 1 otherwise.
+
+    # In-process, against a fresh SQLite database
+    python loadtest_booking.py --requests 2000 --concurrency 64
+
+    # Against a running server (e.g. gunicorn -w 4 app:app)
+    python loadtest_booking.py --url http://localhost:8000 --slot-id 12 --patient-id 3 \
+        --username alice --password secret
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--url', help='Base URL of a running server; omit to run in-process')
+    parser.add_argument('--slot-id', type=int, help='Free slot to book (with --url)')
+    parser.add_argument('--patient-id', type=int, help='Patient to book as (with --url)')
+    parser.add_argument('--username', help="That patient's username, to log in (with --url)")
+    parser.add_argument('--password', help="That patient's password (with --url)")
+    return parser.parse_args()
+
+
+def run_remote(args):
+    import requests
+
+    if not (args.slot_id and args.patient_id and args.username and args.password):
+        sys.exit('--slot-id, --patient-id, --username and --password are required with --url')
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    res = session.post(f"{args.url}/auth/login", json={'username': args.username, 'password': args.password})
+    if res.status_code != 200:
+        sys.exit(f"Could not log in as {args.username}: {res.status_code} {res.text[:200]}")
+    session.headers['Authorization'] = f"Bearer {res.json()['token']}"
+
+    def book(_):
+        res = session.post(f"{args.url}/patient/book_slot", json={
+            'slot_id': args.slot_id,
+            'patient_id': args.patient_id,
+            'reason': 'load test'
+        })
+        return res.status_code
+
+    return fire(book, args), None
+
+
+def run_local(args):
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'loadtest.db'))
+    os.environ.setdefault('MAIL_SUPPRESS_SEND', 'True')
+    os.environ.setdefault('CELERY_TASK_ALWAYS_EAGER', 'True')
+
+    from datetime import date, time as dtime, timedelta
+    from flask_migrate import upgrade
+    from app import app
+    from application.database import db
+    from application.models import User, Doctor, Patient, Availability, Appointment
+    from application.routes.auth import generate_token
+
+    with app.app_context():
+        upgrade()
+        doctor_user = User(username=f'loadtest_doctor_{time.time_ns()}', role='doctor', password_hash='-')
+        patient_user = User(username=f'loadtest_patient_{time.time_ns()}', role='patient', password_hash='-')
+        db.session.add_all([doctor_user, patient_user])
+        db.session.flush()
+        doctor = Doctor(user_id=doctor_user.id, name='Dr. Load Test', specialization='General')
+        patient = Patient(user_id=patient_user.id, name='Load Test Patient')
+        db.session.add_all([doctor, patient])
+        db.session.flush()
+        slot_date = date.today() + timedelta(days=1)
+        slot = Availability(doctor_id=doctor.id, date=slot_date,
+                            start_time=dtime(9, 0), end_time=dtime(9, 15))
+        db.session.add(slot)
+        db.session.commit()
+        slot_id, patient_id, doctor_id = slot.id, patient.id, doctor.id
+        headers = {'Authorization': f"Bearer {generate_token(patient_user.id, 'patient')}"}
+
+    def book(_):
+        with app.test_client() as client:
+            res = client.post('/patient/book_slot', json={
+                'slot_id': slot_id,
+                'patient_id': patient_id,
+                'reason': 'load test'
+            }, headers=headers)
+            return res.status_code
+
+    statuses = fire(book, args)
+
+    with app.app_context():
+        live = Appointment.query.filter_by(doctor_id=doctor_id, date=slot_date,
+                                           time=dtime(9, 0), status='Booked').count()
+    return statuses, live
+
+
+def fire(book, args):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        statuses = Counter(pool.map(book, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    print(f"{args.requests} requests in {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)")
+    return statuses
+
+
+def main():
+    args = parse_args()
+    statuses, live = run_remote(args) if args.url else run_local(args)
+
+    print(f"Status codes: {dict(statuses)}")
+    if live is not None:
+        print(f"Live appointments for the slot: {live}")
+
+    ok = statuses.get(201, 0) == 1 and live in (None, 1)
+    print("✅ Exactly one booking succeeded" if ok else "❌ Double booking or no booking")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
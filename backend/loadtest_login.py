@@ -0,0 +1,112 @@
+"""Login benchmark: latency percentiles at several concurrency levels.
+
+    # In-process, against a fresh SQLite database
+    python loadtest_login.py --levels 1,4,16 --requests 200
+
+    # Against a running server (e.g. gunicorn -k gthread --threads 8 app:app)
+    python loadtest_login.py --url http://localhost:8000 --username alice --password secret
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--levels', default='1,4,16,64', help='Comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=200, help='Logins per level')
+    parser.add_argument('--url', help='Base URL of a running server; omit to run in-process')
+    parser.add_argument('--username', default='loadtest_user')
+    parser.add_argument('--password', default='loadtest_password')
+    return parser.parse_args()
+
+
+def remote_login(args):
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(int(n) for n in args.levels.split(',')))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def login():
+        return session.post(f"{args.url}/auth/login", json={
+            'username': args.username,
+            'password': args.password
+        }).status_code
+    return login
+
+
+def local_login(args):
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'loadtest.db'))
+
+    from flask_migrate import upgrade
+    from app import app
+    from application.database import db
+    from application.models import User
+
+    with app.app_context():
+        upgrade()
+        if not User.query.filter_by(username=args.username).first():
+            user = User(username=args.username, role='admin')
+            user.set_password(args.password)
+            db.session.add(user)
+            db.session.commit()
+
+    def login():
+        with app.test_client() as client:
+            return client.post('/auth/login', json={
+                'username': args.username,
+                'password': args.password
+            }).status_code
+    return login
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def run_level(login, concurrency, requests):
+    def timed(_):
+        started = time.perf_counter()
+        status = login()
+        return status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency * 1000 for _, latency in results]
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'throughput': requests / elapsed,
+        'p50_ms': statistics.median(latencies),
+        'p99_ms': percentile(latencies, 99),
+        'statuses': dict(Counter(status for status, _ in results)),
+    }
+
+
+def main():
+    args = parse_args()
+    login = remote_login(args) if args.url else local_login(args)
+
+    print(f"{'concurrency':>11} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9}  statuses")
+    failed = False
+    for level in (int(n) for n in args.levels.split(',')):
+        result = run_level(login, level, args.requests)
+        failed |= set(result['statuses']) != {200}
+        print(f"{result['concurrency']:>11} {result['throughput']:>8.1f} "
+              f"{result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f}  {result['statuses']}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Mail throughput: one SMTP connection per message vs. a pooled batch.
+
+Starts a local aiosmtpd server as the SMTP stand-in, sends the same
+messages both ways and prints messages per second for each.
+
+    pip install aiosmtpd
+    python loadtest_mail.py --messages 500
+"""
+import argparse
+import os
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--port', type=int, default=8025)
+    return parser.parse_args()
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return '250 OK'
+
+
+def main():
+    args = parse_args()
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        raise SystemExit('aiosmtpd is required: pip install aiosmtpd')
+
+    # Must be set before the app and its config are imported
+    os.environ.update({
+        'MAIL_SERVER': '127.0.0.1',
+        'MAIL_PORT': str(args.port),
+        'MAIL_USE_TLS': 'False',
+        'MAIL_PASSWORD': '',
+        'MAIL_MAX_PER_SECOND': '0',
+        'MAIL_MAX_EMAILS': str(args.messages),
+    })
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+    from flask_mail import Message
+    from app import app
+    import application.tasks as tasks
+
+    handler = CountingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=args.port)
+    controller.start()
+    try:
+        with app.app_context():
+            messages = [
+                (i, Message(subject='Load test', recipients=[f'patient{i}@example.com'], html='<p>Hello</p>'))
+                for i in range(args.messages)
+            ]
+
+            started = time.perf_counter()
+            for _, msg in messages:
+                tasks.mail.send(msg)
+            per_message = time.perf_counter() - started
+
+            started = time.perf_counter()
+            sent_count, failed = tasks.send_batch(messages)
+            pooled = time.perf_counter() - started
+    finally:
+        controller.stop()
+
+    print(f"Connection per message: {args.messages / per_message:8.0f} msg/s ({per_message:.2f}s)")
+    print(f"Pooled batch:           {args.messages / pooled:8.0f} msg/s ({pooled:.2f}s), failed={len(failed)}")
+    print(f"Server received {handler.received} messages")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""search indexes
+
+Revision ID: 0005_search_indexes
+Revises: 0004_export_artifacts
+Create Date: 2026-10-18 19:05:12.418206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_search_indexes'
+down_revision = '0004_export_artifacts'
+branch_labels = None
+depends_on = None
+
+
+# The statements are written out here, not built from application.search,
+# so that later changes to that module do not change this revision
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE doctor_fts USING fts5(name, department, specialization, content='doctor', "
+    "content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER doctor_fts_ai AFTER INSERT ON doctor BEGIN "
+    "INSERT INTO doctor_fts(rowid, name, department, specialization) "
+    "VALUES (new.id, new.name, new.department, new.specialization); END",
+    "CREATE TRIGGER doctor_fts_ad AFTER DELETE ON doctor BEGIN "
+    "INSERT INTO doctor_fts(doctor_fts, rowid, name, department, specialization) "
+    "VALUES ('delete', old.id, old.name, old.department, old.specialization); END",
+    "CREATE TRIGGER doctor_fts_au AFTER UPDATE ON doctor BEGIN "
+    "INSERT INTO doctor_fts(doctor_fts, rowid, name, department, specialization) "
+    "VALUES ('delete', old.id, old.name, old.department, old.specialization); "
+    "INSERT INTO doctor_fts(rowid, name, department, specialization) "
+    "VALUES (new.id, new.name, new.department, new.specialization); END",
+    "INSERT INTO doctor_fts(doctor_fts) VALUES ('rebuild')",
+    "CREATE VIRTUAL TABLE patient_fts USING fts5(name, content='patient', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER patient_fts_ai AFTER INSERT ON patient BEGIN "
+    "INSERT INTO patient_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER patient_fts_ad AFTER DELETE ON patient BEGIN "
+    "INSERT INTO patient_fts(patient_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER patient_fts_au AFTER UPDATE ON patient BEGIN "
+    "INSERT INTO patient_fts(patient_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO patient_fts(rowid, name) VALUES (new.id, new.name); END",
+    "INSERT INTO patient_fts(patient_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TABLE IF EXISTS doctor_fts",
+    "DROP TRIGGER IF EXISTS doctor_fts_ai",
+    "DROP TRIGGER IF EXISTS doctor_fts_ad",
+    "DROP TRIGGER IF EXISTS doctor_fts_au",
+    "DROP TABLE IF EXISTS patient_fts",
+    "DROP TRIGGER IF EXISTS patient_fts_ai",
+    "DROP TRIGGER IF EXISTS patient_fts_ad",
+    "DROP TRIGGER IF EXISTS patient_fts_au",
+]
+
+POSTGRESQL_UPGRADE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX ix_doctor_search_trgm ON doctor USING gin ((lower(coalesce(doctor.name, '') || ' ' || "
+    "coalesce(doctor.department, '') || ' ' || coalesce(doctor.specialization, ''))) gin_trgm_ops)",
+    "CREATE INDEX ix_patient_search_trgm ON patient USING gin ((lower(coalesce(patient.name, ''))) gin_trgm_ops)",
+]
+
+POSTGRESQL_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_doctor_search_trgm",
+    "DROP INDEX IF EXISTS ix_patient_search_trgm",
+]
+
+
+def upgrade():
+    # FTS5 tables and triggers on SQLite, pg_trgm indexes on PostgreSQL
+    dialect = op.get_bind().dialect.name
+    statements = {'sqlite': SQLITE_UPGRADE, 'postgresql': POSTGRESQL_UPGRADE}.get(dialect, [])
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    statements = {'sqlite': SQLITE_DOWNGRADE, 'postgresql': POSTGRESQL_DOWNGRADE}.get(dialect, [])
+    for statement in statements:
+        op.execute(statement)
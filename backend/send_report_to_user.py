@@ -2,10 +2,9 @@ from app import create_app
 from application.models import User, Doctor, Patient, Appointment, Treatment
 from application.database import db
 from datetime import date, timedelta, datetime
-from collections import Counter
-from flask import render_template
 from flask_mail import Message
 from application.tasks import mail
+from application import reports
 
 app, _ = create_app()
 
@@ -29,25 +28,15 @@ with app.app_context():
         print(f"Created test doctor: {doctor.name}")
     
     # Calculate last month's date range
-    today = date.today()
-    first_day_this_month = today.replace(day=1)
-    last_day_last_month = first_day_this_month - timedelta(days=1)
-    first_day_last_month = last_day_last_month.replace(day=1)
+    first_day_last_month, last_day_last_month = reports.last_month_range()
     month_year = last_day_last_month.strftime('%B %Y')
     
     print(f"Generating report for: {month_year}")
     
-    # Get appointments for last month
-    appointments = Appointment.query.filter(
-        Appointment.doctor_id == doctor.id,
-        Appointment.date >= first_day_last_month,
-        Appointment.date <= last_day_last_month
-    ).all()
-    
-    print(f"Found {len(appointments)} appointments for last month")
+    report = reports.monthly_doctor_reports(first_day_last_month, last_day_last_month, [doctor.id]).get(doctor.id)
     
     # If no appointments, create some test data
-    if not appointments:
+    if not report:
         print("No appointments found. Creating test appointment...")
         patient = Patient.query.first()
         
@@ -92,45 +81,12 @@ with app.app_context():
         db.session.add(treatment)
         db.session.commit()
         
-        appointments = [apt]
         print(f"Created test appointment on {last_month_date}")
+        report = reports.monthly_doctor_reports(first_day_last_month, last_day_last_month, [doctor.id])[doctor.id]
     
-    # Calculate statistics
-    total_appointments = len(appointments)
-    completed = sum(1 for a in appointments if a.status == 'Completed')
-    cancelled = sum(1 for a in appointments if a.status == 'Cancelled')
-    
-    # Get diagnoses from treatments
-    diagnoses = []
-    for apt in appointments:
-        if apt.treatment and apt.treatment.diagnosis:
-            diagnoses.append(apt.treatment.diagnosis)
-    
-    diagnosis_counts = Counter(diagnoses)
-    top_diagnoses = [{'name': d, 'count': c} for d, c in diagnosis_counts.most_common(5)]
+    print(f"Found {report['total_appointments']} appointments for last month")
     
-    # Prepare appointment data for table
-    apt_data = []
-    for apt in appointments[:20]:  # Limit to 20 for email
-        diagnosis = apt.treatment.diagnosis if apt.treatment else 'N/A'
-        apt_data.append({
-            'date': apt.date.strftime('%Y-%m-%d'),
-            'patient': apt.patient.name,
-            'diagnosis': diagnosis,
-            'status': apt.status
-        })
-    
-    # Render email template
-    html_body = render_template('email/monthly_report.html',
-        doctor_name=doctor.name,
-        month_year=month_year,
-        total_appointments=total_appointments,
-        completed_appointments=completed,
-        cancelled_appointments=cancelled,
-        appointments=apt_data,
-        diagnoses=top_diagnoses,
-        report_date=datetime.now().strftime('%B %d, %Y')
-    )
+    html_body = reports.render_monthly_report(report, month_year)
     
     # Send email to specified address
     recipient_email = "aryanmishra1411@zohomail.in"
@@ -144,9 +100,9 @@ with app.app_context():
         mail.send(msg)
         print(f"✅ Successfully sent monthly report to {recipient_email}")
         print(f"Report contains:")
-        print(f"  - Total Appointments: {total_appointments}")
-        print(f"  - Completed: {completed}")
-        print(f"  - Cancelled: {cancelled}")
-        print(f"  - Top Diagnoses: {len(top_diagnoses)}")
+        print(f"  - Total Appointments: {report['total_appointments']}")
+        print(f"  - Completed: {report['completed_appointments']}")
+        print(f"  - Cancelled: {report['cancelled_appointments']}")
+        print(f"  - Top Diagnoses: {len(report['diagnoses'])}")
     except Exception as e:
         print(f"❌ Error sending email: {str(e)}")
@@ -0,0 +1,43 @@
+"""A throwaway SQLite database with a small generated hospital, shared by the tests."""
+import os
+import random
+import tempfile
+
+import pytest
+
+# Read by application.config at import, so set before the app is imported
+_workdir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_workdir, 'test.db')
+os.environ['EXPORT_FOLDER'] = os.path.join(_workdir, 'exports')
+os.environ.setdefault('MAIL_SUPPRESS_SEND', 'True')
+os.environ.setdefault('CELERY_TASK_ALWAYS_EAGER', 'True')
+os.environ.setdefault('CELERY_RESULT_BACKEND', 'cache+memory://')
+os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+os.environ.setdefault('BCRYPT_POOL_SIZE', '0')
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    from application.database import db
+    from benchmarks import datagen
+
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        datagen.generate(db, random.Random(7), doctors=3, patients=10, years=1, per_day=2, grid_days=5,
+                         log=lambda line: None)
+        yield app
+
+
+@pytest.fixture(scope='session')
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def auth():
+    """auth(user) -> request headers carrying a token for that user's role"""
+    from application.routes.auth import generate_token
+
+    return lambda user: {'Authorization': f'Bearer {generate_token(user.id, user.role)}'}
@@ -0,0 +1,25 @@
+"""The doctor catalog lists active doctors only."""
+from application import tasks
+from application.cache import catalog_cache
+from application.database import db
+from application.models import Doctor, User
+import application.config as config
+
+
+def test_doctor_deleted_in_the_background_leaves_the_catalog_at_once(client, auth, monkeypatch):
+    doctor = Doctor.query.order_by(Doctor.id.desc()).first()
+    admin = User.query.filter_by(role='admin').first()
+    patient_user = User.query.filter_by(role='patient').first()
+    listed = lambda: [d['id'] for d in client.get('/patient/doctors', headers=auth(patient_user)).get_json()]
+    assert doctor.id in listed()  # now cached
+
+    # Force the background path, and leave the purge to a worker that never runs here
+    monkeypatch.setattr(config, 'DELETE_INLINE_MAX_APPOINTMENTS', -1)
+    monkeypatch.setattr(tasks.purge_doctor, 'delay', lambda *args: type('Task', (), {'id': 'queued'})())
+    assert client.delete(f'/admin/doctors/{doctor.id}', headers=auth(admin)).status_code == 202
+    try:
+        assert doctor.id not in listed()
+    finally:
+        db.session.get(User, doctor.user_id).active = True
+        db.session.commit()
+        catalog_cache.invalidate()
@@ -0,0 +1,16 @@
+"""/events: streams past EVENTS_MAX_STREAMS are refused so they cannot take every worker thread."""
+from application.models import User
+import application.config as config
+
+
+def test_streams_are_capped_per_process(client, auth, monkeypatch):
+    monkeypatch.setattr(config, 'EVENTS_MAX_STREAMS', 1)
+    token = auth(User.query.filter_by(role='admin').first())['Authorization'].split()[1]
+
+    first = client.get(f'/events?token={token}')
+    assert first.status_code == 200
+    assert client.get(f'/events?token={token}').status_code == 503
+    first.close()  # the client went away: its slot is free again
+    again = client.get(f'/events?token={token}')
+    assert again.status_code == 200
+    again.close()
@@ -0,0 +1,22 @@
+"""Export artifacts: re-exports after expiry are indexed again."""
+from datetime import timedelta
+from application import exports
+from application.database import db
+from application.models import ExportArtifact, Patient
+import application.config as config
+
+
+def test_reexport_after_expiry_replaces_the_expired_row(client, auth):
+    from application.tasks import export_patient_treatments
+
+    patient = Patient.query.order_by(Patient.id).first()
+    filename = export_patient_treatments.apply(args=(patient.id,)).result['filename']
+    # Expired, but not yet swept
+    artifact = ExportArtifact.query.filter_by(filename=filename).one()
+    artifact.created_at -= timedelta(hours=config.EXPORT_FILE_RETENTION_HOURS + 1)
+    db.session.commit()
+    assert exports.find_artifact(filename) is None
+
+    assert export_patient_treatments.apply(args=(patient.id,)).result['filename'] == filename
+    assert exports.find_artifact(filename) is not None
+    assert client.get(f'/patient/download-export/{filename}', headers=auth(patient.user)).status_code == 200
@@ -0,0 +1,9 @@
+"""Every lookup in HOT_QUERIES is planned through an index, as explain-indexes checks."""
+import pytest
+from application.commands import HOT_QUERIES, explain, plan_uses_index
+
+
+@pytest.mark.parametrize('name, sql, params', HOT_QUERIES, ids=[name for name, _, _ in HOT_QUERIES])
+def test_hot_query_uses_an_index(app, name, sql, params):
+    plan = explain(sql, params)
+    assert plan_uses_index(plan), f'{name} is not served by an index:\n' + '\n'.join(plan)
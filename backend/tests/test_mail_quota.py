@@ -0,0 +1,20 @@
+"""The mail quota paces sends, falling back to per-process pacing without Redis."""
+import time
+from application import mail_quota
+import application.config as config
+
+
+def test_sends_are_paced_without_redis(monkeypatch):
+    monkeypatch.setattr(config, 'MAIL_SUPPRESS_SEND', False)
+    monkeypatch.setattr(config, 'MAIL_MAX_PER_SECOND', 20)
+    monkeypatch.setattr(config, 'MAIL_RATE_REDIS_URL', 'redis://127.0.0.1:1/0')  # nothing listens there
+    monkeypatch.setattr(mail_quota, '_script', None)
+    monkeypatch.setattr(mail_quota, '_redis_down_until', 0)
+    monkeypatch.setattr(mail_quota, '_local_next', 0.0)
+
+    mail_quota.acquire()  # finds Redis down and takes the first local slot
+    started = time.monotonic()
+    for _ in range(4):
+        mail_quota.acquire()
+    assert time.monotonic() - started >= 4 / 20 - 0.01
+    assert mail_quota._redis_down_until > time.time()
@@ -0,0 +1,36 @@
+"""Patients reach only their own records and exports."""
+import pytest
+from application.models import Patient
+
+
+@pytest.fixture(scope='module')
+def patients(app):
+    first, second = Patient.query.order_by(Patient.id).limit(2).all()
+    return first, second
+
+
+def test_export_download_is_limited_to_its_patient(client, auth, patients):
+    from application.tasks import export_patient_treatments
+
+    owner, other = patients
+    filename = export_patient_treatments.apply(args=(owner.id,)).result['filename']
+    assert client.get(f'/patient/download-export/{filename}', headers=auth(owner.user)).status_code == 200
+    assert client.get(f'/patient/download-export/{filename}', headers=auth(other.user)).status_code == 404
+
+
+def test_bulk_export_is_served_to_admins_only(client, auth, patients):
+    from application.models import User
+    from application.tasks import export_all_treatments
+
+    filename = export_all_treatments.apply().result['filename']
+    admin = User.query.filter_by(role='admin').first()
+    assert client.get(f'/patient/download-export/{filename}', headers=auth(patients[0].user)).status_code == 404
+    assert client.get(f'/admin/download-export/{filename}', headers=auth(admin)).status_code == 200
+
+
+@pytest.mark.parametrize('path', ['/patient/appointments/{}', '/patient/history/{}',
+                                  '/patient/export-treatments/{}/stream', '/patient/profile/{}'])
+def test_patient_records_are_limited_to_their_patient(client, auth, patients, path):
+    owner, other = patients
+    assert client.get(path.format(owner.id), headers=auth(owner.user)).status_code == 200
+    assert client.get(path.format(owner.id), headers=auth(other.user)).status_code == 403
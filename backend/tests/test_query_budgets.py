@@ -0,0 +1,22 @@
+"""QUERY_BUDGETS as tests: every GET endpoint answers, within its budget and without N+1 queries."""
+import pytest
+from application.commands import QUERY_BUDGETS, budget_fixtures, check_budget, unbudgeted_endpoints
+
+
+@pytest.fixture(scope='module')
+def fixtures(client):
+    return budget_fixtures(client)
+
+
+@pytest.mark.parametrize('path, budget', QUERY_BUDGETS)
+def test_query_budget(client, fixtures, path, budget):
+    ids, headers = fixtures
+    ok, status, count, repeated = check_budget(client, path.format(**ids), budget, headers)
+    assert status < 400, f'{path} answered {status}'
+    assert count <= budget, f'{path} ran {count} statements, budget {budget}'
+    assert not repeated, f'{path} repeated {repeated}'
+
+
+def test_every_get_endpoint_has_a_budget(app, fixtures):
+    ids, _ = fixtures
+    assert unbudgeted_endpoints(app, ids) == []
@@ -0,0 +1,17 @@
+// Availability endpoints return slots as parallel arrays; the grids want one object per slot
+export function slotRows(columns) {
+  const names = Object.keys(columns)
+  const count = names.length ? columns[names[0]].length : 0
+  const rows = []
+  for (let i = 0; i < count; i++) {
+    const row = {}
+    for (const name of names) row[name] = columns[name][i]
+    rows.push(row)
+  }
+  return rows
+}
+
+// The ?from=&to= window covering the dates shown in a grid
+export function windowQuery(weekDates) {
+  return `from=${weekDates[0].dateStr}&to=${weekDates[weekDates.length - 1].dateStr}`
+}
@@ -0,0 +1,59 @@
+// Refetch interval for views the server turned away (it caps open streams)
+const POLL_MS = 30000
+
+// Live updates from /events. `handlers` maps an event type ('appointment', 'slot',
+// 'schedule', 'user') to a function taking the event's data. EventSource reconnects
+// by itself; events sent while it was away are not replayed, so `resync` runs after
+// every reconnect (and when the server says the client fell behind). When the server
+// refuses the stream (503: too many open), the view polls `resync` instead.
+export function subscribe(handlers, resync) {
+  const token = sessionStorage.getItem('token')
+  if (!token || !window.EventSource) return null
+  const source = new EventSource(`http://localhost:5000/events?token=${encodeURIComponent(token)}`)
+  let opened = false
+  let poller = null
+  source.onopen = () => {
+    if (opened) resync()
+    opened = true
+  }
+  source.onerror = () => {
+    // A refused stream is closed for good; dropped connections are retried by EventSource
+    if (source.readyState === EventSource.CLOSED && !poller) poller = setInterval(resync, POLL_MS)
+  }
+  const close = source.close.bind(source)
+  source.close = () => {
+    clearInterval(poller)
+    close()
+  }
+  for (const [type, handler] of Object.entries(handlers)) {
+    source.addEventListener(type, e => handler(JSON.parse(e.data)))
+  }
+  source.addEventListener('reset', () => resync())
+  return source
+}
+
+// Whether changes will arrive through the stream; otherwise a view refetches after its own writes
+export function isLive(source) {
+  return !!source && source.readyState === EventSource.OPEN
+}
+
+// Insert or replace `item` in `list` by id, keeping the order given by `before`
+export function upsert(list, item, before) {
+  const i = list.findIndex(x => x.id === item.id)
+  if (i >= 0) list.splice(i, 1)
+  const at = list.findIndex(x => before(item, x))
+  list.splice(at < 0 ? list.length : at, 0, item)
+}
+
+// Apply a slot event to grid rows (from slotRows) when its date is shown
+export function applySlot(slots, event, weekDates) {
+  if (!weekDates.some(d => d.dateStr === event.date)) return
+  const i = slots.findIndex(s => s.date === event.date && s.start_time === event.start_time)
+  if (event.removed) {
+    if (i >= 0) slots.splice(i, 1)
+    return
+  }
+  const row = { id: event.id, date: event.date, start_time: event.start_time, end_time: event.end_time, is_booked: event.is_booked }
+  if (i >= 0) slots.splice(i, 1, row)
+  else slots.push(row)
+}
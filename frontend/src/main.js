@@ -4,4 +4,14 @@ import router from './router'
 import 'bootstrap/dist/css/bootstrap.min.css'
 import 'bootstrap'
 
+// Every API route requires the session token; attach it to all requests
+const apiFetch = window.fetch.bind(window)
+window.fetch = (url, options = {}) => {
+  const token = sessionStorage.getItem('token')
+  if (!token) return apiFetch(url, options)
+  const headers = new Headers(options.headers || {})
+  if (!headers.has('Authorization')) headers.set('Authorization', `Bearer ${token}`)
+  return apiFetch(url, { ...options, headers })
+}
+
 createApp(App).use(router).mount('#app')